@@ -1,8 +1,17 @@
 import pygame
-import os
+import struct
 import sys
 
-pygame.init()
+import chess_atlas
+import chess_bitboard
+import chess_book
+import chess_engine
+import chess_pgn
+import chess_record
+import chess_worker
+import text_cache
+from chess_game import Game
+from chess_position import code_color, move_name, piece_code
 
 #SCREEN & BOARD SETTINGS
 SQUARE = 70
@@ -12,83 +21,82 @@ BOTTOM_PANEL = 120
 WIDTH = BOARD_SIZE + RIGHT_PANEL
 HEIGHT = BOARD_SIZE + BOTTOM_PANEL
 
-screen = pygame.display.set_mode([WIDTH, HEIGHT])
-pygame.display.set_caption('Two-Player Pygame Chess!')
-
-font = pygame.font.Font('freesansbold.ttf', 16)
-medium_font = pygame.font.Font('freesansbold.ttf', 32)
-big_font = pygame.font.Font('freesansbold.ttf', 40)
-
-timer = pygame.time.Clock()
 fps = 60
+# Window, fonts, clock and images are created by init_display(), not on import
+screen = font = medium_font = big_font = timer = None
+# Squares, grid, panels and the forfeit button, rendered once by init_display()
+background = None
+STATUS_AREA = (0, BOARD_SIZE, WIDTH, BOTTOM_PANEL)
+CAPTURED_AREA = (BOARD_SIZE, 0, RIGHT_PANEL, HEIGHT)
+# What is on screen, so a frame only redraws what changed (see draw_frame)
+drawn_cells = [None] * 64
+drawn_panels = {}
+drawn_overlay = None
+full_redraw = True
 
 #GAME VARIABLES
-white_pieces = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook'] + ['pawn']*8
-black_pieces = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook'] + ['pawn']*8
-
-# White pieces at bottom
-white_locations = [(0, 7), (1, 7), (2, 7), (3, 7), (4, 7), (5, 7), (6, 7), (7, 7)] + [(i, 6) for i in range(8)]
-# Black pieces at top
-black_locations = [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (5, 0), (6, 0), (7, 0)] + [(i, 1) for i in range(8)]
-
-captured_pieces_white = []
-captured_pieces_black = []
-
-# Castling tracking: [king_moved, left_rook_moved, right_rook_moved]
-white_castling = [False, False, False]
-black_castling = [False, False, False]
-
-# En passant tracking: stores the position where en passant capture is possible
-en_passant_target = None
+# Rules, pieces and the result live in the headless Game and its Position
+def option(name):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv[1:-1] else None
+
+game = Game()
+position = game.position
+SAVE_FILE = 'saved_game.pgn'  # S writes the game here and prints its FEN
+RECORD_FILE = option('--record') or 'games.rec'  # every finished game is appended here
+game_recorded = False
+replay_game = None  # chess_record.GameRecord shown with --replay, stepped through with the arrow keys
+replay_ply = 0
 
 turn_step = 0  # 0-white select, 1-white move, 2-black select, 3-black move
 selection = 100
 valid_moves = []
 counter = 0
-winner = ''
-game_over = False
-promotion_index = None  # Index of pawn to be promoted
-promotion_color = None  # 'white' or 'black'
+pending_promotion = None  # (start, end) of a pawn move waiting for a promotion choice
+
+# Computer opponent: the colour it plays, None for two humans (C cycles it)
+computer_color = option('--computer')
+ENGINE_TIME = 1.0  # seconds per move
+worker = None  # chess_worker.AnalysisWorker, started the first time it is needed
+book = None  # chess_book.Book from --book; the computer plays from it while it can
+engine_job = None  # (kind, hash, ply) of the search the worker is running
+engine_info = ''  # last search summary: depth, score, nodes, nps
+show_hints = False  # H toggles best-move arrows on the human's turn
+hint_info = None  # latest streamed analysis of the current position
 
 piece_list = ['pawn', 'queen', 'king', 'knight', 'rook', 'bishop']
 
 #IMAGE LOADING
-def load_img(filename, size):
-    base = os.path.join(os.path.dirname(__file__), 'assets', 'images')
-    path = os.path.join(base, filename)
-    if not os.path.exists(path):
-        print(f"ERROR: image not found: {path}")
-        sys.exit(1)
-    img = pygame.image.load(path).convert_alpha()
-    return pygame.transform.scale(img, size)
-
-# Load black pieces
-black_queen = load_img('black queen.png', (60, 60))
-black_king = load_img('black king.png', (60, 60))
-black_rook = load_img('black rook.png', (60, 60))
-black_bishop = load_img('black bishop.png', (60, 60))
-black_knight = load_img('black knight.png', (60, 60))
-black_pawn = load_img('black pawn.png', (50, 50))
-
-# Load white pieces
-white_queen = load_img('white queen.png', (60, 60))
-white_king = load_img('white king.png', (60, 60))
-white_rook = load_img('white rook.png', (60, 60))
-white_bishop = load_img('white bishop.png', (60, 60))
-white_knight = load_img('white knight.png', (60, 60))
-white_pawn = load_img('white pawn.png', (50, 50))
-
+# Board piece code -> image, so drawing never searches piece_list
+piece_images = {}
 # Small images for captured pieces
-def make_small(img):
-    return pygame.transform.scale(img, (35, 35))
-
-small_black_images = [make_small(black_pawn), make_small(black_queen), make_small(black_king),
-                      make_small(black_knight), make_small(black_rook), make_small(black_bishop)]
-small_white_images = [make_small(white_pawn), make_small(white_queen), make_small(white_king),
-                      make_small(white_knight), make_small(white_rook), make_small(white_bishop)]
+small_black_images = []
+small_white_images = []
+
+def load_images():
+    """Piece images from the cached sprite atlas (rebuilt when assets/images changes)"""
+    atlas = chess_atlas.Atlas()
+    try:
+        for color, small_images in (('white', small_white_images), ('black', small_black_images)):
+            for piece in piece_list:
+                sizes = chess_atlas.PIECE_SIZES[f'{color} {piece}']
+                piece_images[piece_code(piece, color)] = atlas.sprite(f'{color} {piece}', sizes[0])
+                small_images.append(atlas.sprite(f'{color} {piece}', sizes[1]))
+    except FileNotFoundError as error:
+        print(f"ERROR: image not found: {error.filename}")
+        sys.exit(1)
 
-white_images = [white_pawn, white_queen, white_king, white_knight, white_rook, white_bishop]
-black_images = [black_pawn, black_queen, black_king, black_knight, black_rook, black_bishop]
+def init_display():
+    """Open the window and load fonts and images, once the game is actually run"""
+    global screen, font, medium_font, big_font, timer, background
+    pygame.init()
+    screen = pygame.display.set_mode([WIDTH, HEIGHT])
+    pygame.display.set_caption('Two-Player Pygame Chess!')
+    font = pygame.font.Font('freesansbold.ttf', 16)
+    medium_font = pygame.font.Font('freesansbold.ttf', 32)
+    big_font = pygame.font.Font('freesansbold.ttf', 40)
+    timer = pygame.time.Clock()
+    load_images()
+    background = render_background()
 
 # DRAW FUNCTIONS
 def draw_piece(img, position):
@@ -96,473 +104,443 @@ def draw_piece(img, position):
     y = position[1] * SQUARE + (SQUARE - img.get_height()) // 2
     screen.blit(img, (x, y))
 
-def draw_board():
+def render_background():
+    """Everything that never changes, drawn once to an offscreen surface"""
+    surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+    surface.fill((70, 50, 30))
     # Draw squares - Classic wood theme
     for row in range(8):
         for col in range(8):
             # Light wood and dark wood colors
             color = (240, 217, 181) if (row + col + 1) % 2 == 0 else (181, 136, 99)
-            pygame.draw.rect(screen, color, [col*SQUARE, row*SQUARE, SQUARE, SQUARE])
+            pygame.draw.rect(surface, color, [col*SQUARE, row*SQUARE, SQUARE, SQUARE])
 
     # Panels - Dark wood color
-    pygame.draw.rect(screen, (101, 67, 33), [0, BOARD_SIZE, WIDTH, BOTTOM_PANEL])
-    pygame.draw.rect(screen, (139, 90, 43), [0, BOARD_SIZE, WIDTH, BOTTOM_PANEL], 5)
-    pygame.draw.rect(screen, (139, 90, 43), [BOARD_SIZE, 0, RIGHT_PANEL, HEIGHT], 5)
+    pygame.draw.rect(surface, (101, 67, 33), [0, BOARD_SIZE, WIDTH, BOTTOM_PANEL])
+    pygame.draw.rect(surface, (139, 90, 43), [0, BOARD_SIZE, WIDTH, BOTTOM_PANEL], 5)
+    pygame.draw.rect(surface, (139, 90, 43), [BOARD_SIZE, 0, RIGHT_PANEL, HEIGHT], 5)
 
     # Grid lines
     for i in range(9):
-        pygame.draw.line(screen, 'black', (0, i*SQUARE), (BOARD_SIZE, i*SQUARE), 2)
-        pygame.draw.line(screen, 'black', (i*SQUARE, 0), (i*SQUARE, BOARD_SIZE), 2)
+        pygame.draw.line(surface, 'black', (0, i*SQUARE), (BOARD_SIZE, i*SQUARE), 2)
+        pygame.draw.line(surface, 'black', (i*SQUARE, 0), (i*SQUARE, BOARD_SIZE), 2)
 
-    # Status text
-    status_text = ['White: Select a Piece to Move!', 'White: Select a Destination!',
-                   'Black: Select a Piece to Move!', 'Black: Select a Destination!']
-    screen.blit(font.render(status_text[turn_step], True, 'white'), (20, BOARD_SIZE + 20))
-    
     # Forfeit button with background
     forfeit_rect = pygame.Rect(BOARD_SIZE + 50, BOARD_SIZE + 20, 100, 30)
-    pygame.draw.rect(screen, (139, 69, 19), forfeit_rect)  # Saddle brown
-    pygame.draw.rect(screen, (101, 67, 33), forfeit_rect, 2)
-    screen.blit(font.render('FORFEIT', True, 'white'), (BOARD_SIZE + 60, BOARD_SIZE + 25))
-
-def draw_pieces():
-    for i, piece in enumerate(white_pieces):
-        index = piece_list.index(piece)
-        img = white_pawn if piece=='pawn' else white_images[index]
-        draw_piece(img, white_locations[i])
-        if turn_step < 2 and selection == i:
-            pygame.draw.rect(screen, (218, 165, 32), [white_locations[i][0]*SQUARE+1, white_locations[i][1]*SQUARE+1, SQUARE, SQUARE], 3)
-
-    for i, piece in enumerate(black_pieces):
-        index = piece_list.index(piece)
-        img = black_pawn if piece=='pawn' else black_images[index]
-        draw_piece(img, black_locations[i])
-        if turn_step >= 2 and selection == i:
-            pygame.draw.rect(screen, (184, 134, 11), [black_locations[i][0]*SQUARE+1, black_locations[i][1]*SQUARE+1, SQUARE, SQUARE], 3)
-
-def draw_valid(moves):
+    pygame.draw.rect(surface, (139, 69, 19), forfeit_rect)  # Saddle brown
+    pygame.draw.rect(surface, (101, 67, 33), forfeit_rect, 2)
+    surface.blit(text_cache.render(font, 'FORFEIT', 'white'), (BOARD_SIZE + 60, BOARD_SIZE + 25))
+    return surface
+
+def status_lines():
+    """(text, color, position) of each line of the bottom panel"""
+    if replay_game is not None:
+        return ((f'Replay: ply {replay_ply} of {len(replay_game)}, result {replay_game.result}', 'white', (20, BOARD_SIZE + 20)),
+                ('Left/Right step, PgUp/PgDn 10 plies, Home/End', (240, 217, 181), (20, BOARD_SIZE + 50)))
+    status_text = ['White: Select a Piece to Move!', 'White: Select a Destination!',
+                   'Black: Select a Piece to Move!', 'Black: Select a Destination!']
+    if position.turn == computer_color and not game.game_over:
+        lines = [(f'{computer_color.capitalize()}: Computer is thinking...', 'white', (20, BOARD_SIZE + 20))]
+    else:
+        lines = [(status_text[turn_step], 'white', (20, BOARD_SIZE + 20))]
+    if show_hints and hint_info is not None and position.turn != computer_color:
+        analysis_text = 'Hint: ' + chess_engine.format_info(hint_info)
+    else:
+        analysis_text = engine_info
+    if analysis_text:
+        lines.append((analysis_text, (240, 217, 181), (20, BOARD_SIZE + 50)))
+    opponent_text = f'Computer plays {computer_color}' if computer_color else 'Two players'
+    hint_text = 'H hides hints' if show_hints else 'H shows hints'
+    lines.append((f'{opponent_text} (C to change), {hint_text}, S saves', (240, 217, 181), (20, BOARD_SIZE + 80)))
+    return tuple(lines)
+
+def draw_status(lines):
+    for text, color, pos in lines:
+        screen.blit(text_cache.render(font, text, color), pos)
+
+def cell_marks():
+    """{square: ((kind, color), ...)} for the selection, check flash and valid-move dots"""
+    marks = {}
     color = (218, 165, 32) if turn_step < 2 else (184, 134, 11)
-    for move in moves:
-        pygame.draw.circle(screen, color, (move[0]*SQUARE + SQUARE//2, move[1]*SQUARE + SQUARE//2), 5)
+    side = 'white' if turn_step < 2 else 'black'
+    if selection != 100:
+        marks[chess_bitboard.SQUARE_INDEX[position.locations(side)[selection]]] = (('select', color),)
+    if counter < 15 and position.in_check(side):
+        sq = chess_bitboard.SQUARE_INDEX[position.king_location(side)]
+        marks[sq] = marks.get(sq, ()) + (('check', (178, 34, 34)),)
+    for move in valid_moves:
+        sq = chess_bitboard.SQUARE_INDEX[move]
+        marks[sq] = marks.get(sq, ()) + (('dot', color),)
+    return marks
+
+def draw_cell(sq, code, marks):
+    """Redraw one square over the background; returns its screen rect"""
+    x, y = chess_bitboard.SQUARES[sq]
+    rect = pygame.Rect(x*SQUARE, y*SQUARE, SQUARE, SQUARE)
+    screen.set_clip(rect)
+    screen.blit(background, rect, rect)
+    if code:
+        draw_piece(piece_images[code], (x, y))
+    for kind, color in marks:
+        if kind == 'dot':
+            pygame.draw.circle(screen, color, rect.center, 5)
+        else:
+            pygame.draw.rect(screen, color, [x*SQUARE+1, y*SQUARE+1, SQUARE, SQUARE], 3 if kind == 'select' else 5)
+    screen.set_clip(None)
+    return rect
+
+def draw_area(area, draw, *args):
+    """Redraw a panel over the background, clipped to it; returns its rect"""
+    rect = pygame.Rect(area)
+    screen.set_clip(rect)
+    screen.blit(background, rect, rect)
+    draw(*args)
+    screen.set_clip(None)
+    return rect
+
+def draw_panels(status):
+    """Both panels: status lines can run on under the captured pieces' column"""
+    draw_status(status)
+    draw_captured()
 
 def draw_captured():
-    for i, piece in enumerate(captured_pieces_white):
+    for i, piece in enumerate(position.captured_pieces_white):
         index = piece_list.index(piece)
         screen.blit(small_black_images[index], (BOARD_SIZE + 25, 5 + 50*i))
-    for i, piece in enumerate(captured_pieces_black):
+    for i, piece in enumerate(position.captured_pieces_black):
         index = piece_list.index(piece)
         screen.blit(small_white_images[index], (BOARD_SIZE + 125, 5 + 50*i))
 
-def draw_check():
-    global counter
-    if turn_step < 2 and 'king' in white_pieces:
-        king_index = white_pieces.index('king')
-        king_location = white_locations[king_index]
-        for moves in black_options:
-            if king_location in moves and counter < 15:
-                pygame.draw.rect(screen, (178, 34, 34), [king_location[0]*SQUARE+1, king_location[1]*SQUARE+1, SQUARE, SQUARE], 5)
-    elif turn_step >= 2 and 'king' in black_pieces:
-        king_index = black_pieces.index('king')
-        king_location = black_locations[king_index]
-        for moves in white_options:
-            if king_location in moves and counter < 15:
-                pygame.draw.rect(screen, (178, 34, 34), [king_location[0]*SQUARE+1, king_location[1]*SQUARE+1, SQUARE, SQUARE], 5)
+def draw_arrow(start, end, color, width):
+    sx, sy = start[0]*SQUARE + SQUARE//2, start[1]*SQUARE + SQUARE//2
+    ex, ey = end[0]*SQUARE + SQUARE//2, end[1]*SQUARE + SQUARE//2
+    length = max(((ex - sx)**2 + (ey - sy)**2) ** 0.5, 1)
+    ux, uy = (ex - sx) / length, (ey - sy) / length
+    head = 3 * width
+    base = (ex - ux*head, ey - uy*head)
+    pygame.draw.line(screen, color, (sx, sy), base, width)
+    pygame.draw.polygon(screen, color, [(ex, ey), (base[0] - uy*head*0.7, base[1] + ux*head*0.7),
+                                        (base[0] + uy*head*0.7, base[1] - ux*head*0.7)])
+
+def hint_arrows():
+    """The analysis' best move and the reply it expects, when hints are shown"""
+    if not show_hints or hint_info is None or position.turn == computer_color or game.game_over:
+        return ()
+    return tuple(hint_info['pv'][:2] or [hint_info['move']])
+
+def draw_hints(arrows):
+    if len(arrows) > 1:
+        draw_arrow(arrows[1][0], arrows[1][1], (120, 120, 200), 4)
+    draw_arrow(arrows[0][0], arrows[0][1], (46, 139, 87), 7)
 
 def draw_game_over():
     pygame.draw.rect(screen, (101, 67, 33), [200, 200, 400, 70])
     pygame.draw.rect(screen, (139, 90, 43), [200, 200, 400, 70], 3)
-    screen.blit(font.render(f'{winner} won the game!', True, 'white'), (210, 210))
-    screen.blit(font.render('Press ENTER to Restart!', True, 'white'), (210, 240))
+    if game.winner == 'draw':
+        screen.blit(text_cache.render(font, 'Draw by threefold repetition!', 'white'), (210, 210))
+    else:
+        screen.blit(text_cache.render(font, f'{game.winner} won the game!', 'white'), (210, 210))
+    screen.blit(text_cache.render(font, 'Press ENTER to Restart!', 'white'), (210, 240))
 
 def draw_promotion():
     pygame.draw.rect(screen, (222, 184, 135), [250, 250, 260, 180])
     pygame.draw.rect(screen, (139, 90, 43), [250, 250, 260, 180], 3)
-    screen.blit(font.render('Promote to:', True, (101, 67, 33)), (280, 260))
+    screen.blit(text_cache.render(font, 'Promote to:', (101, 67, 33)), (280, 260))
     
     options = ['Queen', 'Rook', 'Bishop', 'Knight']
     for i, option in enumerate(options):
         y_pos = 290 + i * 40
         pygame.draw.rect(screen, (210, 180, 140), [270, y_pos, 220, 35])
         pygame.draw.rect(screen, (139, 90, 43), [270, y_pos, 220, 35], 2)
-        screen.blit(font.render(option, True, (101, 67, 33)), (320, y_pos + 8))
-
-# MOVE LOGIC FUNCTIONS
-def check_rook(pos, color):
-    moves_list = []
-    friends = white_locations if color=='white' else black_locations
-    enemies = black_locations if color=='white' else white_locations
-    directions = [(0,1),(0,-1),(1,0),(-1,0)]
-    for dx,dy in directions:
-        chain=1
-        while True:
-            t=(pos[0]+dx*chain,pos[1]+dy*chain)
-            if t in friends or not (0<=t[0]<=7 and 0<=t[1]<=7):
-                break
-            moves_list.append(t)
-            if t in enemies:
-                break
-            chain+=1
-    return moves_list
-
-def check_bishop(pos,color):
-    moves_list=[]
-    friends = white_locations if color=='white' else black_locations
-    enemies = black_locations if color=='white' else white_locations
-    directions=[(1,1),(1,-1),(-1,1),(-1,-1)]
-    for dx,dy in directions:
-        chain=1
-        while True:
-            t=(pos[0]+dx*chain,pos[1]+dy*chain)
-            if t in friends or not (0<=t[0]<=7 and 0<=t[1]<=7):
-                break
-            moves_list.append(t)
-            if t in enemies:
-                break
-            chain+=1
-    return moves_list
-
-def check_queen(pos,color):
-    return check_rook(pos,color)+check_bishop(pos,color)
-
-def check_knight(position, color):
-    moves_list = []
-    friends_list = white_locations if color=='white' else black_locations
-    targets = [(1,2),(1,-2),(2,1),(2,-1),(-1,2),(-1,-2),(-2,1),(-2,-1)]
-    for dx,dy in targets:
-        t=(position[0]+dx,position[1]+dy)
-        if t not in friends_list and 0<=t[0]<=7 and 0<=t[1]<=7:
-            moves_list.append(t)
-    return moves_list
-
-def is_square_under_attack(square, color, pieces, locations):
-    """Check if a square is under attack by the opponent"""
-    opponent_pieces = black_pieces if color == 'white' else white_pieces
-    opponent_locations = black_locations if color == 'white' else white_locations
-    
-    for i, piece in enumerate(opponent_pieces):
-        pos = opponent_locations[i]
-        if piece == 'pawn':
-            if color == 'white':
-                if pos[1] < 7 and square in [(pos[0]-1, pos[1]+1), (pos[0]+1, pos[1]+1)]:
-                    return True
-            else:
-                if pos[1] > 0 and square in [(pos[0]-1, pos[1]-1), (pos[0]+1, pos[1]-1)]:
-                    return True
-        elif piece == 'knight':
-            knight_moves = check_knight(pos, 'black' if color == 'white' else 'white')
-            if square in knight_moves:
-                return True
-        elif piece == 'bishop':
-            bishop_moves = check_bishop(pos, 'black' if color == 'white' else 'white')
-            if square in bishop_moves:
-                return True
-        elif piece == 'rook':
-            rook_moves = check_rook(pos, 'black' if color == 'white' else 'white')
-            if square in rook_moves:
-                return True
-        elif piece == 'queen':
-            queen_moves = check_queen(pos, 'black' if color == 'white' else 'white')
-            if square in queen_moves:
-                return True
-        elif piece == 'king':
-            if abs(square[0] - pos[0]) <= 1 and abs(square[1] - pos[1]) <= 1:
-                if square != pos:
-                    return True
-    return False
-
-def check_king(pos, color):
-    moves_list = []
-    friends = white_locations if color=='white' else black_locations
-    enemies = black_locations if color=='white' else white_locations
-    castling_status = white_castling if color=='white' else black_castling
-    
-    # Normal king moves
-    targets = [(1,0),(1,1),(1,-1),(-1,0),(-1,-1),(-1,1),(0,1),(0,-1)]
-    for dx,dy in targets:
-        t = (pos[0]+dx,pos[1]+dy)
-        if t not in friends and 0<=t[0]<=7 and 0<=t[1]<=7:
-            moves_list.append(t)
-    
-    # Castling
-    if not castling_status[0]:
-        row = pos[1]
-        
-        if not is_square_under_attack(pos, color, None, None):
-            # Kingside castling
-            if not castling_status[2]:
-                if ((pos[0]+1, row) not in friends+enemies and 
-                    (pos[0]+2, row) not in friends+enemies):
-                    if (not is_square_under_attack((pos[0]+1, row), color, None, None) and
-                        not is_square_under_attack((pos[0]+2, row), color, None, None)):
-                        moves_list.append((pos[0]+2, row))
-            
-            # Queenside castling
-            if not castling_status[1]:
-                if ((pos[0]-1, row) not in friends+enemies and 
-                    (pos[0]-2, row) not in friends+enemies and
-                    (pos[0]-3, row) not in friends+enemies):
-                    if (not is_square_under_attack((pos[0]-1, row), color, None, None) and
-                        not is_square_under_attack((pos[0]-2, row), color, None, None)):
-                        moves_list.append((pos[0]-2, row))
-    
-    return moves_list
-
-def check_pawn(pos,color):
-    moves_list=[]
-    if color=='white':
-        if (pos[0],pos[1]-1) not in white_locations+black_locations and pos[1]>0:
-            moves_list.append((pos[0],pos[1]-1))
-        if pos[1]==6 and (pos[0],pos[1]-2) not in white_locations+black_locations and (pos[0],pos[1]-1) not in white_locations+black_locations:
-            moves_list.append((pos[0],pos[1]-2))
-        for dx in [-1,1]:
-            t=(pos[0]+dx,pos[1]-1)
-            if t in black_locations:
-                moves_list.append(t)
-        if en_passant_target and pos[1] == 3:
-            if en_passant_target == (pos[0]+1, 3) or en_passant_target == (pos[0]-1, 3):
-                moves_list.append((en_passant_target[0], 2))
+        screen.blit(text_cache.render(font, option, (101, 67, 33)), (320, y_pos + 8))
+
+def draw_frame():
+    """Draw what changed since the last frame; returns the screen rects to update
+
+    Squares and panels are compared with what was drawn last time and only
+    the ones that differ are redrawn over the background. The overlays
+    (hint arrows, promotion choice, game over) span several squares, so
+    while one is up any change redraws the whole window.
+    """
+    global drawn_cells, drawn_panels, drawn_overlay, full_redraw
+    marks = cell_marks()
+    cells = [(code, marks.get(sq, ())) for sq, code in enumerate(position.board)]
+    panels = {'status': status_lines(),
+              'captured': (tuple(position.captured_pieces_white), tuple(position.captured_pieces_black))}
+    overlay = (hint_arrows(), pending_promotion is not None, game.winner)
+    if overlay != drawn_overlay or (any(overlay) and (cells != drawn_cells or panels != drawn_panels)):
+        full_redraw = True
+
+    if full_redraw:
+        screen.blit(background, (0, 0))
+        for sq, (code, cell) in enumerate(cells):
+            draw_cell(sq, code, cell)
+        draw_status(panels['status'])
+        draw_captured()
+        if overlay[0]:
+            draw_hints(overlay[0])
+        if pending_promotion is not None:
+            draw_promotion()
+        if game.game_over:
+            draw_game_over()
+        rects = [screen.get_rect()]
     else:
-        if (pos[0],pos[1]+1) not in white_locations+black_locations and pos[1]<7:
-            moves_list.append((pos[0],pos[1]+1))
-        if pos[1]==1 and (pos[0],pos[1]+2) not in white_locations+black_locations and (pos[0],pos[1]+1) not in white_locations+black_locations:
-            moves_list.append((pos[0],pos[1]+2))
-        for dx in [-1,1]:
-            t=(pos[0]+dx,pos[1]+1)
-            if t in white_locations:
-                moves_list.append(t)
-        if en_passant_target and pos[1] == 4:
-            if en_passant_target == (pos[0]+1, 4) or en_passant_target == (pos[0]-1, 4):
-                moves_list.append((en_passant_target[0], 5))
-    return moves_list
-
-def check_options(pieces, locations, color):
-    all_moves=[]
-    for piece,loc in zip(pieces,locations):
-        if piece=='pawn': moves=check_pawn(loc,color)
-        elif piece=='rook': moves=check_rook(loc,color)
-        elif piece=='bishop': moves=check_bishop(loc,color)
-        elif piece=='queen': moves=check_queen(loc,color)
-        elif piece=='king': moves=check_king(loc,color)
-        elif piece=='knight': moves=check_knight(loc,color)
-        all_moves.append(moves)
-    return all_moves
+        rects = [draw_cell(sq, *cell) for sq, cell in enumerate(cells) if cell != drawn_cells[sq]]
+        if panels != drawn_panels:
+            # The panels overlap in the bottom right corner, so each is redrawn with both
+            rects.append(draw_area(STATUS_AREA, draw_panels, panels['status']))
+            rects.append(draw_area(CAPTURED_AREA, draw_panels, panels['status']))
+    drawn_cells, drawn_panels, drawn_overlay, full_redraw = cells, panels, overlay, False
+    return rects
 
+# MOVE LOGIC FUNCTIONS
 def check_valid_moves():
-    options_list = white_options if turn_step<2 else black_options
-    return options_list[selection]
-
-# INITIAL MOVE OPTIONS
-black_options = check_options(black_pieces, black_locations, 'black')
-white_options = check_options(white_pieces, white_locations, 'white')
+    color = 'white' if turn_step < 2 else 'black'
+    return position.options(color)[selection]
+
+def play_move(start, end, promotion=None):
+    global turn_step, selection, valid_moves
+    game.play(start, end, promotion)
+    turn_step = 0 if position.turn == 'white' else 2
+    selection = 100
+    valid_moves = []
+
+def take_back():
+    """Undo the last move (or a pending promotion) and reopen the game if it had ended"""
+    global turn_step, selection, valid_moves, pending_promotion
+    if pending_promotion is None:
+        # Against the computer, go back to the human's last turn
+        game.take_back(skip=computer_color)
+    else:
+        game.winner = ''
+    pending_promotion = None
+    turn_step = 0 if position.turn == 'white' else 2
+    selection = 100
+    valid_moves = []
+
+def load_game():
+    """--fen "<fen>" starts from any position, --pgn file continues its first game"""
+    try:
+        loaded = Game(fen=option('--fen'))
+    except ValueError as error:
+        print(f"ERROR: bad --fen: {error}")
+        sys.exit(1)
+    if option('--pgn'):
+        try:
+            for headers, movetext in chess_pgn.read_games(option('--pgn')):
+                loaded = Game(fen=headers.get('FEN'))
+                for san in chess_pgn.san_tokens(movetext):
+                    loaded.play(*chess_pgn.parse_san(loaded.position, san))
+                break
+        except (OSError, ValueError) as error:
+            # PGNError is a ValueError and names the move
+            print(f"ERROR: cannot load {option('--pgn')}: {error}")
+            sys.exit(1)
+    return loaded
+
+def save_game():
+    """Write the game so far as PGN and print the current position as FEN"""
+    with open(SAVE_FILE, 'w') as f:
+        f.write(chess_pgn.write_pgn(game.moves(), game.start_fen, result=game.result()))
+    print(f'saved {SAVE_FILE}  FEN {position.to_fen()}')
+
+def record_game():
+    """Append the game to RECORD_FILE once it ends, before a restart can lose it
+
+    A takeback can reopen a finished game, but it is still the same game:
+    game_recorded is only cleared when a new one starts.
+    """
+    global game_recorded
+    if game.game_over and not game_recorded and game.moves():
+        chess_record.append_game(RECORD_FILE, game.moves(), game.start_fen, game.result())
+        print(f'recorded game in {RECORD_FILE}')
+        game_recorded = True
+
+def show_replay(ply):
+    """Show the replayed game after ply moves, from its nearest keyframe"""
+    global replay_ply, turn_step, selection, valid_moves
+    replay_ply = max(0, min(ply, len(replay_game)))
+    replay_game.position_at(replay_ply, position)
+    turn_step = 0 if position.turn == 'white' else 2
+    selection = 100
+    valid_moves = []
+
+# COMPUTER OPPONENT
+def update_engine():
+    """Keep the worker on the current position and act on what it streams back
+
+    On the computer's turn it searches for a move to play; on the human's
+    turn it ponders, which warms its table for the reply and feeds hints.
+    Any change of position (a move, takeback or restart) cancels the old job.
+    """
+    global worker, engine_job, engine_info, hint_info
+    kind = None
+    if not game.game_over and pending_promotion is None:
+        if position.turn == computer_color:
+            kind = 'move'
+        elif computer_color or show_hints:
+            kind = 'ponder'
+    if kind is None:
+        if engine_job is not None:
+            worker.cancel()
+            engine_job = None
+        return
+
+    job = (kind, position.hash, len(position.undo_stack))
+    if worker is None:
+        worker = chess_worker.AnalysisWorker(tablebases=option('--tablebases'))
+    if engine_job != job:
+        move = book.choose(position) if kind == 'move' and book is not None else None
+        if move:
+            engine_info = f'book move {move_name(move)}'
+            play_move(*move)
+            return
+        worker.analyse(position, ENGINE_TIME if kind == 'move' else chess_worker.ANALYSE_FOREVER)
+        engine_job, hint_info = job, None
+    for done, info in worker.poll():
+        if kind == 'ponder':
+            hint_info = info
+        elif done:
+            engine_job = None
+            move = info['move']
+            if move is None:
+                # A search stopped before it had a move: play any move rather than wait forever
+                moves = position.legal_moves() or position.pseudo_legal_moves()
+                if not moves:
+                    # As in chess_tournament, a side without a move draws the game
+                    game.winner = 'draw'
+                    print(f'{computer_color}: no moves, draw')
+                    break
+                move = moves[0]
+                print(f'{computer_color}: search returned no move, playing {move_name(move)}')
+            engine_info = chess_engine.format_info(info)
+            print(f'{computer_color}: {engine_info}')
+            play_move(*move)
+            break
 
 # MAIN LOOP
-run=True
-while run:
-    timer.tick(fps)
-    counter = (counter + 1) % 30
-    screen.fill((70, 50, 30))
-
-    draw_board()
-    draw_pieces()
-    draw_captured()
-    draw_check()
-
-    if selection!=100:
-        valid_moves=check_valid_moves()
-        draw_valid(valid_moves)
-    
-    if promotion_index is not None:
-        draw_promotion()
-
-    for event in pygame.event.get():
-        if event.type==pygame.QUIT:
-            run=False
-        if event.type==pygame.MOUSEBUTTONDOWN and event.button==1:
-            if promotion_index is not None:
-                mouse_x, mouse_y = event.pos
-                if 270 <= mouse_x <= 490:
-                    if 290 <= mouse_y <= 325:
-                        piece_choice = 'queen'
-                    elif 330 <= mouse_y <= 365:
-                        piece_choice = 'rook'
-                    elif 370 <= mouse_y <= 405:
-                        piece_choice = 'bishop'
-                    elif 410 <= mouse_y <= 445:
-                        piece_choice = 'knight'
-                    else:
-                        piece_choice = None
-                    
-                    if piece_choice:
-                        if promotion_color == 'white':
-                            white_pieces[promotion_index] = piece_choice
-                        else:
-                            black_pieces[promotion_index] = piece_choice
-                        promotion_index = None
-                        promotion_color = None
-                        black_options=check_options(black_pieces, black_locations,'black')
-                        white_options=check_options(white_pieces, white_locations,'white')
+if __name__ == '__main__':
+    init_display()
+    game = load_game()
+    position = game.position
+    if option('--book'):
+        book = chess_book.Book(option('--book'))
+    turn_step = 0 if position.turn == 'white' else 2
+    # --replay archive [--game N] shows game N (default the last) instead of playing
+    if option('--replay'):
+        try:
+            archive = chess_record.Archive(option('--replay'))
+        except (OSError, ValueError) as error:
+            print(f"ERROR: cannot read {option('--replay')}: {error}")
+            sys.exit(1)
+        number = option('--game') or str(len(archive))
+        if not len(archive):
+            print(f"ERROR: no games in {option('--replay')}")
+            sys.exit(1)
+        if not number.isdigit() or not 1 <= int(number) <= len(archive):
+            print(f"ERROR: no such game: {number} ({option('--replay')} has games 1 to {len(archive)})")
+            sys.exit(1)
+        replay_game = archive[int(number) - 1]
+        computer_color = None
+        try:
+            show_replay(0)
+        except (ValueError, struct.error) as error:
+            print(f"ERROR: game {number} of {option('--replay')} is damaged: {error}")
+            sys.exit(1)
+    run=True
+    while run:
+        timer.tick(fps)
+        counter = (counter + 1) % 30
+
+        for event in pygame.event.get():
+            if event.type==pygame.QUIT:
+                run=False
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                full_redraw = True
+            if replay_game is not None:
+                if event.type==pygame.KEYDOWN:
+                    steps = {pygame.K_LEFT: -1, pygame.K_RIGHT: 1, pygame.K_PAGEUP: -10, pygame.K_PAGEDOWN: 10}
+                    if event.key in steps:
+                        show_replay(replay_ply + steps[event.key])
+                    elif event.key==pygame.K_HOME:
+                        show_replay(0)
+                    elif event.key==pygame.K_END:
+                        show_replay(len(replay_game))
                 continue
+            if event.type==pygame.MOUSEBUTTONDOWN and event.button==1:
+                if pending_promotion is not None:
+                    mouse_x, mouse_y = event.pos
+                    if 270 <= mouse_x <= 490:
+                        if 290 <= mouse_y <= 325:
+                            piece_choice = 'queen'
+                        elif 330 <= mouse_y <= 365:
+                            piece_choice = 'rook'
+                        elif 370 <= mouse_y <= 405:
+                            piece_choice = 'bishop'
+                        elif 410 <= mouse_y <= 445:
+                            piece_choice = 'knight'
+                        else:
+                            piece_choice = None
+                    
+                        if piece_choice:
+                            start, end = pending_promotion
+                            pending_promotion = None
+                            play_move(start, end, piece_choice)
+                    continue
             
-            if not game_over:
-                x_coord, y_coord = event.pos[0]//SQUARE, event.pos[1]//SQUARE
-                click_coords=(x_coord,y_coord)
+                if not game.game_over and position.turn != computer_color:
+                    x_coord, y_coord = event.pos[0]//SQUARE, event.pos[1]//SQUARE
+                    click_coords=(x_coord,y_coord)
                 
-                if BOARD_SIZE + 50 <= event.pos[0] <= BOARD_SIZE + 150 and BOARD_SIZE + 20 <= event.pos[1] <= BOARD_SIZE + 50:
-                    winner = 'black' if turn_step < 2 else 'white'
-                    game_over = True
+                    if BOARD_SIZE + 50 <= event.pos[0] <= BOARD_SIZE + 150 and BOARD_SIZE + 20 <= event.pos[1] <= BOARD_SIZE + 50:
+                        game.forfeit('white' if turn_step < 2 else 'black')
             
-                if turn_step<=1:
-                    if click_coords in white_locations:
-                        selection=white_locations.index(click_coords)
-                        if turn_step==0: turn_step=1
-                    elif click_coords in valid_moves and selection!=100:
-                        piece = white_pieces[selection]
-                        old_pos = white_locations[selection]
-                        
-                        if piece == 'king' and abs(click_coords[0] - old_pos[0]) == 2:
-                            white_locations[selection] = click_coords
-                            white_castling[0] = True
-                            
-                            if click_coords[0] == 6:
-                                if (7, 7) in white_locations:
-                                    rook_index = white_locations.index((7, 7))
-                                    white_locations[rook_index] = (5, 7)
-                                    white_castling[2] = True
-                            else:
-                                if (0, 7) in white_locations:
-                                    rook_index = white_locations.index((0, 7))
-                                    white_locations[rook_index] = (3, 7)
-                                    white_castling[1] = True
-                            en_passant_target = None
-                        else:
-                            en_passant_capture = False
-                            if piece == 'pawn' and en_passant_target:
-                                if old_pos[1] == 3 and click_coords == (en_passant_target[0], 2):
-                                    captured_pawn_pos = en_passant_target
-                                    if captured_pawn_pos in black_locations:
-                                        idx = black_locations.index(captured_pawn_pos)
-                                        captured_pieces_white.append(black_pieces[idx])
-                                        black_pieces.pop(idx)
-                                        black_locations.pop(idx)
-                                        en_passant_capture = True
-                            
-                            white_locations[selection] = click_coords
-                            
-                            if piece == 'king':
-                                white_castling[0] = True
-                            elif piece == 'rook':
-                                if old_pos == (0, 7):
-                                    white_castling[1] = True
-                                elif old_pos == (7, 7):
-                                    white_castling[2] = True
-                            
-                            if not en_passant_capture and click_coords in black_locations:
-                                idx = black_locations.index(click_coords)
-                                captured_pieces_white.append(black_pieces[idx])
-                                if black_pieces[idx] == 'king':
-                                    winner = 'white'
-                                black_pieces.pop(idx)
-                                black_locations.pop(idx)
-                            
-                            if piece == 'pawn' and old_pos[1] == 6 and click_coords[1] == 4:
-                                en_passant_target = (click_coords[0], 4)
-                            else:
-                                en_passant_target = None
-                            
-                            if piece == 'pawn' and click_coords[1] == 0:
-                                promotion_index = selection
-                                promotion_color = 'white'
-                        
-                        black_options=check_options(black_pieces, black_locations,'black')
-                        white_options=check_options(white_pieces, white_locations,'white')
-                        turn_step=2; selection=100; valid_moves=[]
-                else:
-                    if click_coords in black_locations:
-                        selection=black_locations.index(click_coords)
-                        if turn_step==2: turn_step=3
+                    color = 'white' if turn_step <= 1 else 'black'
+                    code = position.piece_at(click_coords)
+                    if code and code_color(code) == color:
+                        selection = position.index_at(click_coords)
+                        if turn_step in (0, 2): turn_step += 1
                     elif click_coords in valid_moves and selection!=100:
-                        piece = black_pieces[selection]
-                        old_pos = black_locations[selection]
-                        
-                        if piece == 'king' and abs(click_coords[0] - old_pos[0]) == 2:
-                            black_locations[selection] = click_coords
-                            black_castling[0] = True
-                            
-                            if click_coords[0] == 6:
-                                if (7, 0) in black_locations:
-                                    rook_index = black_locations.index((7, 0))
-                                    black_locations[rook_index] = (5, 0)
-                                    black_castling[2] = True
-                            else:
-                                if (0, 0) in black_locations:
-                                    rook_index = black_locations.index((0, 0))
-                                    black_locations[rook_index] = (3, 0)
-                                    black_castling[1] = True
-                            en_passant_target = None
+                        start = position.locations(color)[selection]
+                        if game.is_promotion(start, click_coords):
+                            pending_promotion = (start, click_coords)
                         else:
-                            en_passant_capture = False
-                            if piece == 'pawn' and en_passant_target:
-                                if old_pos[1] == 4 and click_coords == (en_passant_target[0], 5):
-                                    captured_pawn_pos = en_passant_target
-                                    if captured_pawn_pos in white_locations:
-                                        idx = white_locations.index(captured_pawn_pos)
-                                        captured_pieces_black.append(white_pieces[idx])
-                                        white_pieces.pop(idx)
-                                        white_locations.pop(idx)
-                                        en_passant_capture = True
-                            
-                            black_locations[selection] = click_coords
-                            
-                            if piece == 'king':
-                                black_castling[0] = True
-                            elif piece == 'rook':
-                                if old_pos == (0, 0):
-                                    black_castling[1] = True
-                                elif old_pos == (7, 0):
-                                    black_castling[2] = True
-                            
-                            if not en_passant_capture and click_coords in white_locations:
-                                idx = white_locations.index(click_coords)
-                                captured_pieces_black.append(white_pieces[idx])
-                                if white_pieces[idx] == 'king':
-                                    winner = 'black'
-                                white_pieces.pop(idx)
-                                white_locations.pop(idx)
-                            
-                            if piece == 'pawn' and old_pos[1] == 1 and click_coords[1] == 3:
-                                en_passant_target = (click_coords[0], 3)
-                            else:
-                                en_passant_target = None
-                            
-                            if piece == 'pawn' and click_coords[1] == 7:
-                                promotion_index = selection
-                                promotion_color = 'black'
-                        
-                        black_options=check_options(black_pieces, black_locations,'black')
-                        white_options=check_options(white_pieces, white_locations,'white')
-                        turn_step=0; selection=100; valid_moves=[]
-
-        if event.type==pygame.KEYDOWN and game_over:
-            if event.key==pygame.K_RETURN:
-                white_pieces = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook'] + ['pawn']*8
-                white_locations = [(0, 7), (1, 7), (2, 7), (3, 7), (4, 7), (5, 7), (6, 7), (7, 7)] + [(i, 6) for i in range(8)]
-                black_pieces = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook'] + ['pawn']*8
-                black_locations = [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (5, 0), (6, 0), (7, 0)] + [(i, 1) for i in range(8)]
-                captured_pieces_white=[]; captured_pieces_black=[]
-                white_castling = [False, False, False]
-                black_castling = [False, False, False]
-                en_passant_target = None
-                promotion_index = None
-                promotion_color = None
-                turn_step=0; selection=100; valid_moves=[]; winner=''
-                black_options=check_options(black_pieces, black_locations,'black')
-                white_options=check_options(white_pieces, white_locations,'white')
-                game_over=False
-
-    if winner!='':
-        game_over=True
-        draw_game_over()
-
-    pygame.display.flip()
-
-pygame.quit()
\ No newline at end of file
+                            play_move(start, click_coords)
+
+            if event.type==pygame.KEYDOWN:
+                # U or Backspace takes back the last move
+                if event.key in (pygame.K_u, pygame.K_BACKSPACE):
+                    take_back()
+                elif event.key==pygame.K_h:
+                    show_hints = not show_hints
+                elif event.key==pygame.K_s:
+                    save_game()
+                elif event.key==pygame.K_c:
+                    computer_color = {None: 'black', 'black': 'white', 'white': None}[computer_color]
+                    selection=100; valid_moves=[]
+                    turn_step = 0 if position.turn == 'white' else 2
+                elif event.key==pygame.K_RETURN and game.game_over:
+                    game.reset()
+                    game_recorded = False
+                    pending_promotion = None
+                    turn_step = 0 if position.turn == 'white' else 2
+                    selection=100; valid_moves=[]
+
+        if replay_game is None:
+            update_engine()
+            record_game()
+
+        if selection!=100:
+            valid_moves=check_valid_moves()
+        # Only the squares and panels that changed reach the display
+        rects = draw_frame()
+        if rects:
+            pygame.display.update(rects)
+
+    if worker is not None:
+        worker.close()
+    if book is not None:
+        book.close()
+    if replay_game is not None:
+        archive.close()
+    pygame.quit()
@@ -0,0 +1,142 @@
+"""Piece sprites at every size they are drawn, packed into one cached atlas image.
+
+Loading the pieces one by one means decoding twelve full-size PNGs and
+scaling each of them twice on every launch. build() does that work once:
+it scales every sprite to each size it is drawn at, packs them all into a
+single small image under assets/cache and writes a JSON index of sprite
+rectangles along with the size and modification time of every source
+PNG. Atlas reads the index, rebuilds the cache when a source has changed
+(or the index is missing or stale), and decodes the atlas image the first
+time a sprite is asked for; sprites are subsurfaces of it.
+
+    python chess_atlas.py      # rebuild the cache and time a cold load
+"""
+import json
+import os
+import time
+
+import pygame
+
+IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'images')
+CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'cache')
+VERSION = 1
+
+# Sprite name -> sizes it is drawn at; smaller sizes are scaled down from the
+# first, as the captured-piece icons always were
+PIECE_SIZES = {f'{color} {piece}': [(50, 50) if piece == 'pawn' else (60, 60), (35, 35)]
+               for color in ('white', 'black')
+               for piece in ('pawn', 'queen', 'king', 'knight', 'rook', 'bishop')}
+
+
+def _sources(names, image_dir):
+    """{file name: [size, mtime_ns]} for each sprite's source PNG"""
+    sources = {}
+    for name in names:
+        stat = os.stat(os.path.join(image_dir, f'{name}.png'))
+        sources[f'{name}.png'] = [stat.st_size, stat.st_mtime_ns]
+    return sources
+
+
+def _key(size):
+    return f'{size[0]}x{size[1]}'
+
+
+def build(sizes=PIECE_SIZES, image_dir=IMAGES, cache_dir=CACHE, name='pieces'):
+    """Scale and pack every sprite; returns (atlas surface, index)
+
+    The atlas and index are saved to cache_dir when it is writable.
+    Raises FileNotFoundError if a source image is missing.
+    """
+    sources = _sources(sizes, image_dir)
+    scaled = []
+    for sprite, sprite_sizes in sizes.items():
+        image = pygame.image.load(os.path.join(image_dir, f'{sprite}.png'))
+        first = pygame.transform.scale(image, sprite_sizes[0])
+        for size in sprite_sizes:
+            scaled.append((sprite, size, first if size == sprite_sizes[0] else pygame.transform.scale(first, size)))
+
+    # One shelf per distinct height, sprites left to right
+    shelves = {}
+    for item in scaled:
+        shelves.setdefault(item[1][1], []).append(item)
+    width = max(sum(size[0] for _, size, _ in shelf) for shelf in shelves.values())
+    atlas = pygame.Surface((width, sum(shelves.keys())), pygame.SRCALPHA, 32)
+    rects = {}
+    y = 0
+    for height, shelf in sorted(shelves.items(), reverse=True):
+        x = 0
+        for sprite, size, image in shelf:
+            # MAX over the cleared atlas copies pixels exactly, alpha included
+            atlas.blit(image, (x, y), special_flags=pygame.BLEND_RGBA_MAX)
+            rects.setdefault(sprite, {})[_key(size)] = [x, y, size[0], size[1]]
+            x += size[0]
+        y += height
+
+    index = {'version': VERSION, 'image': f'{name}.png', 'sources': sources,
+             'sizes': {sprite: [list(size) for size in sprite_sizes] for sprite, sprite_sizes in sizes.items()},
+             'rects': rects}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        image_path = os.path.join(cache_dir, index['image'])
+        pygame.image.save(atlas, image_path + '.tmp.png')
+        os.replace(image_path + '.tmp.png', image_path)
+        # The index goes last, so it never describes an image that is not there
+        with open(os.path.join(cache_dir, f'{name}.json.tmp'), 'w') as f:
+            json.dump(index, f)
+        os.replace(os.path.join(cache_dir, f'{name}.json.tmp'), os.path.join(cache_dir, f'{name}.json'))
+    except (OSError, pygame.error) as error:
+        print(f'sprite cache not saved: {error}')
+    return atlas, index
+
+
+class Atlas:
+    def __init__(self, sizes=PIECE_SIZES, image_dir=IMAGES, cache_dir=CACHE, name='pieces'):
+        self.sizes, self.image_dir, self.cache_dir, self.name = sizes, image_dir, cache_dir, name
+        self.surface = None
+        self.index = None
+        self.rebuilt = False
+
+    def _stale(self, index):
+        expected = {sprite: [list(size) for size in sprite_sizes] for sprite, sprite_sizes in self.sizes.items()}
+        return (index.get('version') != VERSION or index.get('sizes') != expected
+                or index.get('sources') != _sources(self.sizes, self.image_dir))
+
+    def load(self):
+        """Decode the cached atlas, rebuilding it first if it is missing or stale"""
+        try:
+            with open(os.path.join(self.cache_dir, f'{self.name}.json')) as f:
+                index = json.load(f)
+            if not self._stale(index):
+                surface = pygame.image.load(os.path.join(self.cache_dir, index['image']))
+                self.surface, self.index = self._converted(surface), index
+                return
+        except (OSError, ValueError, KeyError, pygame.error):
+            pass
+        surface, self.index = build(self.sizes, self.image_dir, self.cache_dir, self.name)
+        self.surface = self._converted(surface)
+        self.rebuilt = True
+
+    @staticmethod
+    def _converted(surface):
+        # Match the display's pixel format once there is a display
+        return surface.convert_alpha() if pygame.display.get_surface() is not None else surface
+
+    def sprite(self, name, size):
+        """The sprite scaled to size, as a subsurface of the atlas"""
+        if self.surface is None:
+            self.load()
+        return self.surface.subsurface(self.index['rects'][name][_key(size)])
+
+
+if __name__ == '__main__':
+    started = time.perf_counter()
+    build()
+    built = time.perf_counter() - started
+    started = time.perf_counter()
+    atlas = Atlas()
+    for sprite, sprite_sizes in PIECE_SIZES.items():
+        for size in sprite_sizes:
+            atlas.sprite(sprite, size)
+    loaded = time.perf_counter() - started
+    print(f'built in {built * 1000:.1f} ms, loaded from cache in {loaded * 1000:.1f} ms'
+          f'{" (rebuilt)" if atlas.rebuilt else ""}')
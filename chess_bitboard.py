@@ -0,0 +1,340 @@
+"""Bitboard move generation for chess.py.
+
+Squares are numbered y * 8 + x using the same (x, y) coordinates as chess.py,
+so bit 0 is (0, 0) in the top-left corner (a8) and bit 63 is (7, 7) (h1).
+A board is a plain Python int used as a 64-bit set of squares.
+"""
+
+SQUARES = [(sq % 8, sq // 8) for sq in range(64)]
+BITS = [1 << sq for sq in range(64)]
+SQUARE_INDEX = {pos: sq for sq, pos in enumerate(SQUARES)}
+SQUARE_BITS = {pos: 1 << sq for sq, pos in enumerate(SQUARES)}
+RANKS = [255 << (8 * y) for y in range(8)]
+ALL_SQUARES = (1 << 64) - 1
+
+
+def square(pos):
+    return pos[1] * 8 + pos[0]
+
+
+def occupancy(locations):
+    bb = 0
+    for pos in locations:
+        bb |= SQUARE_BITS[pos]
+    return bb
+
+
+# For each rank, the (x, y) squares set in every possible 8-bit row pattern
+_RANK_SQUARES = [[tuple((x, y) for x in range(8) if row >> x & 1) for row in range(256)]
+                 for y in range(8)]
+# Converted move sets are memoized; the same few thousand bitboards come up
+# over and over, so the cache is simply dropped when it grows past the limit.
+_SQUARES_CACHE = {}
+_SQUARES_CACHE_LIMIT = 1 << 16
+
+
+def squares_of(bb):
+    """Turn a bitboard back into a tuple of the (x, y) squares chess.py uses"""
+    result = _SQUARES_CACHE.get(bb)
+    if result is None:
+        result = ()
+        bits = bb
+        for row_squares in _RANK_SQUARES:
+            if not bits:
+                break
+            result += row_squares[bits & 255]
+            bits >>= 8
+        if len(_SQUARES_CACHE) >= _SQUARES_CACHE_LIMIT:
+            _SQUARES_CACHE.clear()
+        _SQUARES_CACHE[bb] = result
+    return result
+
+
+# PRECOMPUTED TABLES
+def _leaper_table(offsets):
+    table = []
+    for x, y in SQUARES:
+        bb = 0
+        for dx, dy in offsets:
+            if 0 <= x+dx <= 7 and 0 <= y+dy <= 7:
+                bb |= BITS[(y+dy) * 8 + x+dx]
+        table.append(bb)
+    return table
+
+
+def _ray_table(dx, dy):
+    table = []
+    for x, y in SQUARES:
+        bb = 0
+        tx, ty = x+dx, y+dy
+        while 0 <= tx <= 7 and 0 <= ty <= 7:
+            bb |= BITS[ty * 8 + tx]
+            tx, ty = tx+dx, ty+dy
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_table([(1,2),(1,-2),(2,1),(2,-1),(-1,2),(-1,-2),(-2,1),(-2,-1)])
+KING_ATTACKS = _leaper_table([(1,0),(1,1),(1,-1),(-1,0),(-1,-1),(-1,1),(0,1),(0,-1)])
+# Squares a pawn standing on each square attacks (white moves up the board, black down)
+PAWN_ATTACKS = {'white': _leaper_table([(-1,-1),(1,-1)]),
+                'black': _leaper_table([(-1,1),(1,1)])}
+# Single and double pawn pushes from each square (empty where the move is impossible)
+PAWN_PUSHES = {'white': [BITS[sq-8] if sq >= 8 else 0 for sq in range(64)],
+               'black': [BITS[sq+8] if sq < 56 else 0 for sq in range(64)]}
+PAWN_DOUBLE_PUSHES = {'white': [BITS[sq-16] if sq // 8 == 6 else 0 for sq in range(64)],
+                      'black': [BITS[sq+16] if sq // 8 == 1 else 0 for sq in range(64)]}
+
+# Rays whose square numbers increase are cut at their lowest blocker, the
+# others at their highest blocker (classical ray lookup).
+_ROOK_UP = [_ray_table(0, 1), _ray_table(1, 0)]
+_ROOK_DOWN = [_ray_table(0, -1), _ray_table(-1, 0)]
+_BISHOP_UP = [_ray_table(1, 1), _ray_table(-1, 1)]
+_BISHOP_DOWN = [_ray_table(1, -1), _ray_table(-1, -1)]
+LINES = [rays[0][sq] | rays[1][sq] | rays[2][sq] | rays[3][sq]
+         for rays in [_ROOK_UP + _ROOK_DOWN] for sq in range(64)]
+DIAGONALS = [rays[0][sq] | rays[1][sq] | rays[2][sq] | rays[3][sq]
+             for rays in [_BISHOP_UP + _BISHOP_DOWN] for sq in range(64)]
+
+
+def _slide(sq, occ, up_rays, down_rays):
+    attacks = 0
+    for rays in up_rays:
+        ray = rays[sq]
+        blockers = ray & occ
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in down_rays:
+        ray = rays[sq]
+        blockers = ray & occ
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occ):
+    return _slide(sq, occ, _ROOK_UP, _ROOK_DOWN)
+
+
+def bishop_attacks(sq, occ):
+    return _slide(sq, occ, _BISHOP_UP, _BISHOP_DOWN)
+
+
+def queen_attacks(sq, occ):
+    return _slide(sq, occ, _ROOK_UP, _ROOK_DOWN) | _slide(sq, occ, _BISHOP_UP, _BISHOP_DOWN)
+
+
+def piece_attacks(piece, sq, color, occ):
+    """Squares attacked by one piece, including squares held by either side"""
+    if piece == 'pawn':
+        return PAWN_ATTACKS[color][sq]
+    if piece == 'knight':
+        return KNIGHT_ATTACKS[sq]
+    if piece == 'bishop':
+        return bishop_attacks(sq, occ)
+    if piece == 'rook':
+        return rook_attacks(sq, occ)
+    if piece == 'queen':
+        return queen_attacks(sq, occ)
+    return KING_ATTACKS[sq]
+
+
+def attack_map(pieces, locations, color, occ):
+    """Every square one side attacks (the union of piece_attacks)"""
+    attacks = 0
+    index = SQUARE_INDEX
+    pawn_attacks = PAWN_ATTACKS[color]
+    for piece, pos in zip(pieces, locations):
+        sq = index[pos]
+        if piece == 'pawn':
+            attacks |= pawn_attacks[sq]
+        elif piece == 'knight':
+            attacks |= KNIGHT_ATTACKS[sq]
+        elif piece == 'bishop':
+            attacks |= _slide(sq, occ, _BISHOP_UP, _BISHOP_DOWN)
+        elif piece == 'rook':
+            attacks |= _slide(sq, occ, _ROOK_UP, _ROOK_DOWN)
+        elif piece == 'queen':
+            attacks |= _slide(sq, occ, _ROOK_UP, _ROOK_DOWN) | _slide(sq, occ, _BISHOP_UP, _BISHOP_DOWN)
+        else:
+            attacks |= KING_ATTACKS[sq]
+    return attacks
+
+
+# MOVE GENERATION
+def en_passant_moves(pos, color, en_passant_target):
+    x, y = pos
+    if color == 'white':
+        if y == 3 and en_passant_target in ((x+1, 3), (x-1, 3)):
+            return BITS[16 + en_passant_target[0]]
+    elif y == 4 and en_passant_target in ((x+1, 4), (x-1, 4)):
+        return BITS[40 + en_passant_target[0]]
+    return 0
+
+
+def pawn_moves(pos, color, occ, enemies, en_passant_target):
+    sq = pos[1] * 8 + pos[0]
+    moves = PAWN_ATTACKS[color][sq] & enemies
+    push = PAWN_PUSHES[color][sq]
+    if push and not occ & push:
+        moves |= push
+        double = PAWN_DOUBLE_PUSHES[color][sq]
+        if double and not occ & double:
+            moves |= double
+    if en_passant_target:
+        moves |= en_passant_moves(pos, color, en_passant_target)
+    return moves
+
+
+def can_castle_through(pos, castling, occ):
+    """Cheap pre-check: is either castling path empty, so attacks need looking at"""
+    x, y = pos
+    sq = y * 8 + x
+    if not castling[2] and x + 2 <= 7 and not occ & (BITS[sq+1] | BITS[sq+2]):
+        return True
+    return not castling[1] and x - 3 >= 0 and not occ & (BITS[sq-1] | BITS[sq-2] | BITS[sq-3])
+
+
+def castling_moves(pos, castling, occ, enemy_attacks):
+    """Castling destinations for a king on pos, given the squares the enemy attacks"""
+    x, y = pos
+    sq = y * 8 + x
+    moves = 0
+    if castling[0] or enemy_attacks & BITS[sq]:
+        return moves
+    if not castling[2] and x + 2 <= 7:
+        path = BITS[sq+1] | BITS[sq+2]
+        if not occ & path and not enemy_attacks & path:
+            moves |= BITS[sq+2]
+    if not castling[1] and x - 3 >= 0:
+        path = BITS[sq-1] | BITS[sq-2]
+        if not occ & (path | BITS[sq-3]) and not enemy_attacks & path:
+            moves |= BITS[sq-2]
+    return moves
+
+
+def piece_moves(piece, pos, color, friends, enemies, en_passant_target):
+    """Move bitboard for a single piece, not counting castling"""
+    sq = SQUARE_INDEX[pos]
+    if piece == 'pawn':
+        return pawn_moves(pos, color, friends | enemies, enemies, en_passant_target)
+    if piece == 'knight':
+        return KNIGHT_ATTACKS[sq] & ~friends
+    if piece == 'bishop':
+        return _slide(sq, friends | enemies, _BISHOP_UP, _BISHOP_DOWN) & ~friends
+    if piece == 'rook':
+        return _slide(sq, friends | enemies, _ROOK_UP, _ROOK_DOWN) & ~friends
+    if piece == 'queen':
+        occ = friends | enemies
+        return (_slide(sq, occ, _ROOK_UP, _ROOK_DOWN) | _slide(sq, occ, _BISHOP_UP, _BISHOP_DOWN)) & ~friends
+    return KING_ATTACKS[sq] & ~friends
+
+
+def generate_options(pieces, locations, color, enemy_pieces, enemy_locations,
+                     castling, en_passant_target, enemy_attacks=None):
+    """Drop-in replacement for check_options: one tuple of target squares per piece
+
+    enemy_attacks is the enemy's attack map if the caller already has it;
+    it is only computed here when castling actually needs it.
+    """
+    friends = occupancy(locations)
+    enemies = occupancy(enemy_locations)
+    occ = friends | enemies
+    not_friends = ~friends
+    index = SQUARE_INDEX
+    convert = squares_of
+    pawn_attacks = PAWN_ATTACKS[color]
+    pushes = PAWN_PUSHES[color]
+    double_pushes = PAWN_DOUBLE_PUSHES[color]
+    options = []
+    for piece, pos in zip(pieces, locations):
+        sq = index[pos]
+        if piece == 'pawn':
+            bb = pawn_attacks[sq] & enemies
+            push = pushes[sq]
+            if push and not occ & push:
+                bb |= push
+                double = double_pushes[sq]
+                if double and not occ & double:
+                    bb |= double
+            if en_passant_target:
+                bb |= en_passant_moves(pos, color, en_passant_target)
+        elif piece == 'knight':
+            bb = KNIGHT_ATTACKS[sq] & not_friends
+        elif piece == 'bishop':
+            bb = _slide(sq, occ, _BISHOP_UP, _BISHOP_DOWN) & not_friends
+        elif piece == 'rook':
+            bb = _slide(sq, occ, _ROOK_UP, _ROOK_DOWN) & not_friends
+        elif piece == 'queen':
+            bb = (_slide(sq, occ, _ROOK_UP, _ROOK_DOWN) | _slide(sq, occ, _BISHOP_UP, _BISHOP_DOWN)) & not_friends
+        else:
+            bb = KING_ATTACKS[sq] & not_friends
+            if not castling[0] and can_castle_through(pos, castling, occ):
+                if enemy_attacks is None:
+                    enemy_color = 'black' if color == 'white' else 'white'
+                    enemy_attacks = attack_map(enemy_pieces, enemy_locations, enemy_color, occ)
+                bb |= castling_moves(pos, castling, occ, enemy_attacks)
+        options.append(convert(bb))
+    return options
+
+
+# INCREMENTAL UPDATES
+def _invert(table):
+    inverse = [0] * 64
+    for sq, targets in enumerate(table):
+        for target in range(64):
+            if targets & BITS[target]:
+                inverse[target] |= BITS[sq]
+    return inverse
+
+
+# For each square, where a pawn must stand for that square to be one of its
+# push or capture squares (i.e. for the square's contents to affect its options)
+PAWN_WATCHERS = {color: _invert([PAWN_ATTACKS[color][sq] | PAWN_PUSHES[color][sq] |
+                                 PAWN_DOUBLE_PUSHES[color][sq] for sq in range(64)])
+                 for color in ('white', 'black')}
+
+
+def update_options(options, pieces, locations, color, enemy_pieces, enemy_locations,
+                   castling, en_passant_target, changed, en_passant_changed, enemy_attacks=None):
+    """Recompute in place only the option tuples a move can have invalidated
+
+    `changed` is the bitboard of squares whose contents the move altered. A
+    slider is only affected if one of those squares is on its lines, a leaper
+    or pawn if one is among its targets; kings are always redone because
+    castling depends on every enemy attack (enemy_attacks, as for
+    generate_options). Returns the number recomputed.
+    """
+    # Rays are symmetric, so the sliders that could see a changed square are
+    # the ones on its unobstructed lines and diagonals. Ignoring blockers
+    # over-approximates slightly but is far cheaper than tracing each ray.
+    lines = diagonals = knights = pawns = changed
+    watchers = PAWN_WATCHERS[color]
+    for x, y in squares_of(changed):
+        sq = y * 8 + x
+        lines |= LINES[sq]
+        diagonals |= DIAGONALS[sq]
+        knights |= KNIGHT_ATTACKS[sq]
+        pawns |= watchers[sq]
+    if en_passant_changed:
+        pawns |= RANKS[3 if color == 'white' else 4]
+    reach = {'pawn': pawns, 'knight': knights, 'bishop': diagonals, 'rook': lines,
+             'queen': lines | diagonals, 'king': ALL_SQUARES}
+    friends = occupancy(locations)
+    enemies = occupancy(enemy_locations)
+    occ = friends | enemies
+    recomputed = 0
+    for i, (piece, pos) in enumerate(zip(pieces, locations)):
+        if not SQUARE_BITS[pos] & reach[piece]:
+            continue
+        bb = piece_moves(piece, pos, color, friends, enemies, en_passant_target)
+        if piece == 'king' and not castling[0] and can_castle_through(pos, castling, occ):
+            if enemy_attacks is None:
+                enemy_color = 'black' if color == 'white' else 'white'
+                enemy_attacks = attack_map(enemy_pieces, enemy_locations, enemy_color, occ)
+            bb |= castling_moves(pos, castling, occ, enemy_attacks)
+        options[i] = squares_of(bb)
+        recomputed += 1
+    return recomputed
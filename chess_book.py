@@ -0,0 +1,187 @@
+"""Opening book: a sorted binary file of (position key, move, weight) entries.
+
+The file is a 16-byte header followed by fixed-size big-endian entries
+sorted by Zobrist key (chess_hash, so keys are the ones Position.hash
+holds). A Book memory-maps the file and binary-searches it on every probe,
+so opening a book costs the same however many positions it holds.
+
+    python chess_book.py build games.pgn book.bin [--plies 20] [--min-games 2]
+    python chess_book.py probe book.bin e2e4 e7e5
+
+Moves are weighted by how often they were played and how they scored for
+the side that played them (win 2, draw 1, loss 0, plus 1 for being played).
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+from chess_bitboard import SQUARES, SQUARE_INDEX
+from chess_position import START_FEN, Position, move_name, parse_move
+
+MAGIC = b'GKBOOK01'
+HEADER = struct.Struct('>8sQ')  # magic, entry count
+ENTRY = struct.Struct('>QHH')  # key, move, weight
+KEY = struct.Struct('>Q')
+PROMOTION_CODES = {None: 0, 'knight': 1, 'bishop': 2, 'rook': 3, 'queen': 4}
+PROMOTION_PIECES = {code: piece for piece, code in PROMOTION_CODES.items()}
+
+
+def encode_move(move):
+    start, end, promotion = move
+    return SQUARE_INDEX[start] << 6 | SQUARE_INDEX[end] | PROMOTION_CODES[promotion] << 12
+
+
+def decode_move(code):
+    return SQUARES[code >> 6 & 63], SQUARES[code & 63], PROMOTION_PIECES[code >> 12]
+
+
+class Book:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < HEADER.size:
+            self.file.close()
+            raise ValueError(f'{path} is not an opening book')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or size != HEADER.size + self.count * ENTRY.size:
+            self.close()
+            raise ValueError(f'{path} is not an opening book')
+
+    def close(self):
+        if getattr(self, 'data', None) is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def entries(self, key):
+        """[(move, weight)] stored for a position key"""
+        data, lo, hi = self.data, 0, self.count
+        # First entry whose key is >= key
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if KEY.unpack_from(data, HEADER.size + mid * ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        for index in range(lo, self.count):
+            entry_key, move, weight = ENTRY.unpack_from(data, HEADER.size + index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((decode_move(move), weight))
+        return found
+
+    def moves(self, position):
+        """Book moves for the position, heaviest first; key collisions are filtered out"""
+        legal = position.legal_moves()
+        return sorted(((move, weight) for move, weight in self.entries(position.hash) if move in legal),
+                      key=lambda item: item[1], reverse=True)
+
+    def choose(self, position, rng=random):
+        """A book move picked with probability proportional to its weight, or None"""
+        moves = self.moves(position)
+        total = sum(weight for _, weight in moves)
+        if not total:
+            return None
+        pick = rng.randrange(total)
+        for move, weight in moves:
+            pick -= weight
+            if pick < 0:
+                return move
+
+
+# BUILDING
+def collect(pgn_path, plies=20, limit=None):
+    """{(key, move code): [games, score]} from the first plies of every game"""
+    import chess_pgn
+    points = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}
+    stats = {}
+    position = Position()
+    games = 0
+    for headers, movetext in chess_pgn.read_games(pgn_path):
+        if limit is not None and games >= limit:
+            break
+        games += 1
+        white, black = points.get(headers.get('Result'), (0, 0))
+        position.set_fen(headers.get('FEN', START_FEN))
+        try:
+            for ply, san in enumerate(chess_pgn.san_tokens(movetext)):
+                if ply >= plies:
+                    break
+                move = chess_pgn.parse_san(position, san)
+                entry = stats.setdefault((position.hash, encode_move(move)), [0, 0])
+                entry[0] += 1
+                entry[1] += white if position.turn == 'white' else black
+                position.make_move(*move)
+        except chess_pgn.PGNError:
+            continue
+    return stats, games
+
+
+def write_book(path, stats, min_games=1):
+    """Write collected stats as a sorted book; returns the number of entries"""
+    entries = [(key, move, games + score) for (key, move), (games, score) in stats.items() if games >= min_games]
+    entries.sort()
+    # Weights are 16-bit; scale down if the most popular move needs it
+    heaviest = max((weight for _, _, weight in entries), default=0)
+    scale = 65535 / heaviest if heaviest > 65535 else 1
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for key, move, weight in entries:
+            f.write(ENTRY.pack(key, move, max(1, int(weight * scale))))
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or probe an opening book')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from a PGN collection')
+    build.add_argument('pgn')
+    build.add_argument('book')
+    build.add_argument('--plies', type=int, default=20, help='plies of each game to include (default 20)')
+    build.add_argument('--min-games', type=int, default=1, help='drop moves played in fewer games')
+    build.add_argument('--limit', type=int, help='stop after this many games')
+    probe = commands.add_parser('probe', help='list book moves after some moves from the initial position')
+    probe.add_argument('book')
+    probe.add_argument('moves', nargs='*')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        stats, games = collect(args.pgn, args.plies, args.limit)
+        count = write_book(args.book, stats, args.min_games)
+        print(f'{games} games -> {count} entries in {time.perf_counter() - started:.1f}s')
+        return 0
+
+    started = time.perf_counter()
+    book = Book(args.book)
+    opened = time.perf_counter() - started
+    position = Position()
+    for move in args.moves:
+        position.make_move(*parse_move(move))
+    started = time.perf_counter()
+    moves = book.moves(position)
+    probed = time.perf_counter() - started
+    for move, weight in moves:
+        print(f'{move_name(move):6s} {weight}')
+    print(f'{len(book)} entries, opened in {opened * 1000:.2f} ms, probed in {probed * 1000:.2f} ms')
+    book.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
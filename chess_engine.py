@@ -0,0 +1,351 @@
+"""Alpha-beta search for the chess computer opponent.
+
+Negamax with alpha-beta pruning, iterative deepening and a quiescence
+search over captures. Moves are ordered by the transposition table move,
+MVV-LVA for captures, then killer and history heuristics. The game ends
+when a king is captured, so the search works on pseudo-legal moves and
+scores a king capture as a win. Searches stop at a hard time limit and
+report nodes, nodes per second and depth reached. With endgame tablebases
+(chess_tablebase) covered positions are scored exactly without searching.
+
+Run `python chess_engine.py [seconds]` to benchmark a search of the
+initial position.
+"""
+import sys
+import time
+
+from chess_bitboard import SQUARE_INDEX
+from chess_eval import material
+from chess_hash import EXACT, LOWER, UPPER, TranspositionTable
+from chess_position import Position, opponent
+
+MATE = 100000
+INFINITY = 1000000
+MAX_PLY = 64
+# Scores this close to MATE are mates, adjusted by ply in the table; the
+# margin leaves room for tablebase mates found beyond the search horizon
+MATE_BOUND = MATE - 4 * MAX_PLY
+# Nodes between clock checks, minus one; with a full evaluation a node can
+# take 0.2 ms, so checking rarely lets a search run well past its limit
+CHECK_MASK = 31
+
+# Indexed by board code & 7
+CODE_VALUES = [0, 100, 320, 330, 500, 900, 20000, 0]
+KING_CODE = 6
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time limit or stop flag is hit"""
+
+
+class Engine:
+    def __init__(self, table_bits=18, evaluate=material, tablebases=None):
+        """evaluate scores a position for the side to move (see chess_eval);
+        tablebases is an optional chess_tablebase.Tablebases"""
+        self.evaluate = evaluate
+        self.tablebases = tablebases
+        self.tablebase_hits = 0
+        self.table = TranspositionTable(table_bits)
+        self.nodes = 0
+        self.deadline = None
+        self.stop = None
+        self.killers = []
+        self.history = {}
+        self.must_finish = False  # set until the root has a scored move to fall back on
+        self.static_only = False  # out of time while must_finish: quiescence stops at the static score
+        self.root_best = None
+
+    def search(self, position, time_limit=1.0, max_depth=MAX_PLY - 1, stop=None, on_depth=None):
+        """Find a move for the side to move within time_limit seconds
+
+        stop may be a threading/multiprocessing Event to cancel early;
+        on_depth is called with the info dict after every completed depth.
+        Returns a dict with move, score, depth, nodes, time, nps and pv.
+        The position is left exactly as it was passed in.
+        """
+        started = time.perf_counter()
+        self.new_search()
+        self._start(time_limit, stop)
+        base = len(position.undo_stack)
+
+        # The root only considers moves that keep the king safe when any exist
+        moves = position.legal_moves() or position.pseudo_legal_moves()
+        info = self._info(None, 0, 0, started, [])
+        if not moves:
+            return info
+        info['move'] = moves[0]
+        for depth in range(1, max_depth + 1):
+            self.must_finish = depth == 1
+            self.root_best = None
+            try:
+                score = self._root(position, moves, depth)
+            except SearchTimeout:
+                while len(position.undo_stack) > base:
+                    position.unmake_move()
+                # The previous best is searched first, so any improvement found
+                # before the timeout is still worth playing
+                if self.root_best is not None and self.root_best[1] != info['move']:
+                    info = self._info(self.root_best[1], self.root_best[0], depth - 1, started, [self.root_best[1]])
+                break
+            best = self.root_best[1]
+            moves.remove(best)
+            moves.insert(0, best)
+            info = self._info(best, score, depth, started, self._principal_variation(position, depth))
+            if on_depth:
+                on_depth(info)
+            if abs(score) >= MATE_BOUND:
+                break
+            # The next depth would almost certainly not finish in time
+            if time.perf_counter() - started > time_limit / 2:
+                break
+        info['time'] = time.perf_counter() - started
+        info['nodes'] = self.nodes
+        info['nps'] = int(self.nodes / info['time']) if info['time'] > 0 else 0
+        return info
+
+    def search_move(self, position, move, depth, alpha=-INFINITY, beta=INFINITY, time_limit=None, stop=None,
+                    must_finish=False):
+        """Score one root move to depth within (alpha, beta), or None if stopped first
+
+        This is the unit of work when root moves are split across processes.
+        With must_finish the move is always scored, on static scores once
+        time runs out, as the first root move of Engine.search is. The
+        caller calls new_search() once per search, not once per move, so
+        sibling root moves share the table and move ordering.
+        """
+        self._start(time_limit, stop)
+        self.must_finish = must_finish
+        base = len(position.undo_stack)
+        try:
+            # A task taken up after the deadline does no work at all
+            self._check_time()
+            position.make_move(*move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+        except SearchTimeout:
+            score = None
+        while len(position.undo_stack) > base:
+            position.unmake_move()
+        return score
+
+    def new_search(self):
+        """Age the table and reset the killers and history for a new search"""
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = {}
+        self.table.new_search()
+
+    def _start(self, time_limit, stop):
+        self.deadline = time.perf_counter() + (time_limit if time_limit is not None else float('inf'))
+        self.stop = stop
+        self.must_finish = self.static_only = False
+        self.nodes = 0
+        self.tablebase_hits = 0
+
+    def _info(self, move, score, depth, started, pv):
+        elapsed = time.perf_counter() - started
+        return {'move': move, 'score': score, 'depth': depth, 'nodes': self.nodes, 'time': elapsed,
+                'nps': int(self.nodes / elapsed) if elapsed > 0 else 0, 'pv': pv}
+
+    def _check_time(self):
+        if time.perf_counter() > self.deadline or (self.stop is not None and self.stop.is_set()):
+            # The first root move of depth 1 always gets a score, so there is a
+            # move to play; it is finished on static scores rather than abandoned
+            if self.must_finish:
+                self.static_only = True
+                return
+            raise SearchTimeout
+
+    def _root(self, position, moves, depth):
+        alpha, beta = -INFINITY, INFINITY
+        for move in moves:
+            position.make_move(*move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move()
+            if score > alpha:
+                alpha = score
+                self.root_best = (score, move)
+            self.must_finish = False
+            if self.static_only:
+                raise SearchTimeout
+        if self.root_best is None:
+            # Every move loses; play the first one searched
+            self.root_best = (alpha, moves[0])
+        self.table.store(position.hash, depth, alpha, EXACT, self.root_best[1])
+        return alpha
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiesce(position, alpha, beta, ply)
+        self.nodes += 1
+        if not self.nodes & CHECK_MASK:
+            self._check_time()
+        if position.halfmove_clock >= 4 and position.repetition_count() >= 2:
+            return 0
+        if self.tablebases is not None and len(position.white_pieces) + len(position.black_pieces) == 3:
+            score = self._probe_tablebases(position, ply)
+            if score is not None:
+                return score
+
+        key = position.hash
+        entry = self.table.probe(key)
+        table_move = None
+        if entry is not None:
+            table_move = entry[4]
+            if entry[1] >= depth:
+                score = _from_table(entry[2], ply)
+                flag = entry[3]
+                if flag == EXACT:
+                    return score
+                if flag == LOWER and score >= beta:
+                    return score
+                if flag == UPPER and score <= alpha:
+                    return score
+
+        moves = position.pseudo_legal_moves()
+        board = position.board
+        for move in moves:
+            if board[SQUARE_INDEX[move[1]]] & 7 == KING_CODE:
+                return MATE - ply
+
+        alpha_start = alpha
+        best_score, best_move = -INFINITY, None
+        killers = self.killers[ply]
+        for move in self._order(position, moves, table_move, killers):
+            quiet = not board[SQUARE_INDEX[move[1]]] and not move[2]
+            position.make_move(*move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if quiet:
+                            if killers[0] != move:
+                                killers[1], killers[0] = killers[0], move
+                            self.history[move[:2]] = self.history.get(move[:2], 0) + depth * depth
+                        break
+        if best_move is None:
+            return 0
+
+        if best_score <= alpha_start:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, _to_table(best_score, ply), flag, best_move)
+        return best_score
+
+    def _probe_tablebases(self, position, ply):
+        # A king left in check is captured by the search, not looked up
+        if position.in_check(opponent(position.turn)):
+            return None
+        found = self.tablebases.probe(position)
+        if found is None:
+            return None
+        self.tablebase_hits += 1
+        result, plies = found
+        # Mate in plies means the king is captured one ply later
+        if result > 0:
+            return MATE - (ply + plies + 1)
+        if result < 0:
+            return -(MATE - (ply + plies + 1))
+        return 0
+
+    def _quiesce(self, position, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & CHECK_MASK:
+            self._check_time()
+        stand_pat = self.evaluate(position)
+        if stand_pat >= beta or self.static_only:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        board = position.board
+        captures = []
+        for move in position.pseudo_legal_moves():
+            victim = board[SQUARE_INDEX[move[1]]] & 7
+            if victim == KING_CODE:
+                return MATE - ply
+            if victim or move[2] == 'queen':
+                captures.append((CODE_VALUES[victim] * 10 - CODE_VALUES[board[SQUARE_INDEX[move[0]]] & 7] // 100, move))
+        if ply >= MAX_PLY:
+            return stand_pat
+        captures.sort(key=lambda item: item[0], reverse=True)
+        for _, move in captures:
+            position.make_move(*move)
+            score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _order(self, position, moves, table_move, killers):
+        """Table move, then captures by MVV-LVA, promotions, killers, history"""
+        board = position.board
+        history = self.history
+        scored = []
+        for move in moves:
+            if move == table_move:
+                score = 10000000
+            else:
+                victim = board[SQUARE_INDEX[move[1]]] & 7
+                if victim:
+                    score = 1000000 + CODE_VALUES[victim] * 10 - CODE_VALUES[board[SQUARE_INDEX[move[0]]] & 7] // 100
+                elif move[2] == 'queen':
+                    score = 900000
+                elif move == killers[0]:
+                    score = 800000
+                elif move == killers[1]:
+                    score = 700000
+                else:
+                    score = history.get(move[:2], 0)
+            scored.append((score, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+
+    def _principal_variation(self, position, depth):
+        """Follow table moves from the root for up to depth plies"""
+        pv = []
+        for _ in range(depth):
+            entry = self.table.probe(position.hash)
+            if entry is None or entry[4] is None or entry[4] not in position.pseudo_legal_moves():
+                break
+            pv.append(entry[4])
+            position.make_move(*entry[4])
+        for _ in pv:
+            position.unmake_move()
+        return pv
+
+
+def _to_table(score, ply):
+    """Mate scores are stored relative to the node, not the root"""
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def format_info(info):
+    return (f"depth {info['depth']}  score {info['score']}  nodes {info['nodes']}  "
+            f"nps {info['nps']}  time {info['time']:.2f}s")
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    engine = Engine()
+    result = engine.search(Position(), seconds, on_depth=lambda info: print(format_info(info)))
+    print('best', result['move'], format_info(result))
+    print('table', engine.table.stats())
@@ -0,0 +1,321 @@
+"""Static evaluation: material, piece-square tables, mobility and king safety.
+
+Two ways in:
+
+- material(position) is the cheap material and piece-square score the
+  search calls at every leaf.
+- evaluate(position) adds mobility (from the position's option lists) and
+  king safety (pawn shield and attacked squares around the king).
+
+evaluate() first packs a position into a compact feature row,
+encode(position), which is 64 board codes plus side to move, mobility and
+king-zone attack counts as plain bytes. score_row() scores one row in
+Python; evaluate_batch() scores thousands of rows at once with NumPy, and
+the two agree exactly. NumPy is only needed for the batched path.
+
+    python chess_eval.py --bench [N]       # scalar vs batched throughput
+    python chess_eval.py archive.pgn       # score every position of a PGN file
+"""
+import argparse
+import sys
+import time
+
+from chess_bitboard import BITS, KING_ATTACKS, SQUARE_INDEX
+from chess_position import BLACK_PIECE, PIECE_CODES, Position
+
+# NumPy, imported on first batched call so the search never pays for it
+np = None
+
+VALUES = {'pawn': 100, 'knight': 320, 'bishop': 330, 'rook': 500, 'queen': 900, 'king': 20000}
+
+# Piece-square tables from white's point of view, a8 first (square index order)
+PIECE_SQUARE = {
+    'pawn': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0],
+    'knight': [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50],
+    'bishop': [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20],
+    'rook': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0],
+    'queen': [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20],
+    'king': [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20],
+}
+
+# Value plus square bonus per side; black reads the table mirrored top to bottom
+WHITE_SCORES = {piece: [VALUES[piece] + bonus for bonus in table] for piece, table in PIECE_SQUARE.items()}
+BLACK_SCORES = {piece: [VALUES[piece] + table[sq ^ 56] for sq in range(64)] for piece, table in PIECE_SQUARE.items()}
+
+
+MOBILITY_WEIGHT = 4  # per option
+SHIELD_BONUS = 12  # per own pawn in front of the king
+ZONE_PENALTY = 8  # per enemy-attacked square next to the king
+
+# Encoded row layout: board codes, then these bytes
+SIDE, WHITE_MOBILITY, BLACK_MOBILITY, WHITE_ZONE, BLACK_ZONE = range(64, 69)
+ROW_SIZE = 69
+
+PAWN, KING = PIECE_CODES['pawn'], PIECE_CODES['king']
+
+
+def _shield_squares(sq, ahead):
+    x, y = sq % 8, sq // 8 + ahead
+    if not 0 <= y <= 7:
+        return []
+    return [y*8 + fx for fx in (x - 1, x, x + 1) if 0 <= fx <= 7]
+
+
+# Squares in front of a king on each square, for white (moving up) and black
+WHITE_SHIELD = [_shield_squares(sq, -1) for sq in range(64)]
+BLACK_SHIELD = [_shield_squares(sq, 1) for sq in range(64)]
+# Board code -> white-positive value plus square bonus
+CODE_SCORES = [[0] * 64 for _ in range(16)]
+for _piece, _code in PIECE_CODES.items():
+    CODE_SCORES[_code] = WHITE_SCORES[_piece]
+    CODE_SCORES[_code | BLACK_PIECE] = [-score for score in BLACK_SCORES[_piece]]
+
+
+def material(position):
+    """Material and piece-square score from the side to move's point of view"""
+    score = 0
+    for piece, pos in zip(position.white_pieces, position.white_locations):
+        score += WHITE_SCORES[piece][SQUARE_INDEX[pos]]
+    for piece, pos in zip(position.black_pieces, position.black_locations):
+        score -= BLACK_SCORES[piece][SQUARE_INDEX[pos]]
+    return score if position.turn == 'white' else -score
+
+
+def _zone_attacks(position, color, enemy):
+    king = position.king_location(color)
+    if king is None:
+        return 0
+    sq = SQUARE_INDEX[king]
+    return bin((KING_ATTACKS[sq] | BITS[sq]) & position.side_attacks(enemy)).count('1')
+
+
+def encode(position):
+    """Compact feature row of a position: ROW_SIZE bytes"""
+    mobility = [min(sum(len(targets) for targets in position.options(color)), 255)
+                for color in ('white', 'black')]
+    return bytes(position.board) + bytes((
+        0 if position.turn == 'white' else 1, mobility[0], mobility[1],
+        _zone_attacks(position, 'white', 'black'), _zone_attacks(position, 'black', 'white')))
+
+
+def score_row(row):
+    """Score of one encoded row from the side to move's point of view"""
+    score = 0
+    white_king = black_king = None
+    for sq in range(64):
+        code = row[sq]
+        if code:
+            score += CODE_SCORES[code][sq]
+            if code == KING:
+                white_king = sq
+            elif code == KING | BLACK_PIECE:
+                black_king = sq
+    score += MOBILITY_WEIGHT * (row[WHITE_MOBILITY] - row[BLACK_MOBILITY])
+    score -= ZONE_PENALTY * (row[WHITE_ZONE] - row[BLACK_ZONE])
+    if white_king is not None:
+        score += SHIELD_BONUS * sum(row[sq] == PAWN for sq in WHITE_SHIELD[white_king])
+    if black_king is not None:
+        score -= SHIELD_BONUS * sum(row[sq] == PAWN | BLACK_PIECE for sq in BLACK_SHIELD[black_king])
+    return -score if row[SIDE] else score
+
+
+def evaluate(position):
+    """Full static evaluation from the side to move's point of view"""
+    return score_row(encode(position))
+
+
+# BATCHED EVALUATION
+def _require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('batched evaluation needs NumPy (pip install numpy)') from None
+        np = numpy
+
+
+_tables = {}
+
+
+def _numpy_tables():
+    if not _tables:
+        # Flat (code << 6 | square) lookup; take() on it beats 2-D fancy indexing
+        _tables['scores'] = np.array(CODE_SCORES, dtype=np.int32).ravel()
+        for name, shield in (('white_shield', WHITE_SHIELD), ('black_shield', BLACK_SHIELD)):
+            mask = np.zeros((64, 64), dtype=bool)
+            for sq, squares in enumerate(shield):
+                mask[sq, squares] = True
+            _tables[name] = mask
+        _tables['squares'] = np.arange(64, dtype=np.uint16)
+    return _tables
+
+
+def rows_to_array(rows):
+    """Stack encoded rows (an iterable of bytes, or one bytes blob) into an (N, ROW_SIZE) array"""
+    _require_numpy()
+    data = rows if isinstance(rows, (bytes, bytearray)) else b''.join(rows)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, ROW_SIZE)
+
+
+def evaluate_batch(rows):
+    """Scores (int32 array) for many encoded rows at once, same values as score_row"""
+    _require_numpy()
+    tables = _numpy_tables()
+    rows = rows if isinstance(rows, np.ndarray) else rows_to_array(rows)
+    boards = rows[:, :64]
+    index = boards.astype(np.uint16)
+    index <<= 6
+    index |= tables['squares']
+    scores = tables['scores'].take(index, mode='clip').sum(axis=1, dtype=np.int32)
+    features = rows[:, 64:].astype(np.int32)
+    scores += MOBILITY_WEIGHT * (features[:, WHITE_MOBILITY - 64] - features[:, BLACK_MOBILITY - 64])
+    scores -= ZONE_PENALTY * (features[:, WHITE_ZONE - 64] - features[:, BLACK_ZONE - 64])
+    for code, shield, sign in ((KING, 'white_shield', 1), (KING | BLACK_PIECE, 'black_shield', -1)):
+        is_king = boards == code
+        has_king = is_king.any(axis=1)
+        king_squares = is_king.argmax(axis=1)
+        pawns = boards == ((PAWN | BLACK_PIECE) if sign < 0 else PAWN)
+        shield_pawns = (tables[shield][king_squares] & pawns).sum(axis=1)
+        scores += sign * SHIELD_BONUS * np.where(has_king, shield_pawns, 0).astype(np.int32)
+    return np.where(rows[:, SIDE] == 1, -scores, scores)
+
+
+# BENCHMARK AND BULK SCORING
+def random_rows(count, seed=13):
+    """Encoded rows from random games, as sample positions"""
+    import random
+    rng = random.Random(seed)
+    position = Position()
+    rows = []
+    while len(rows) < count:
+        position.reset()
+        for _ in range(rng.randint(10, 120)):
+            moves = position.pseudo_legal_moves()
+            if not moves or position.make_move(*rng.choice(moves)) == 'king':
+                break
+            rows.append(encode(position))
+    return rows[:count]
+
+
+def bench(count):
+    _require_numpy()
+    started = time.perf_counter()
+    rows = random_rows(count)
+    print(f'{count} positions generated and encoded in {time.perf_counter() - started:.2f}s')
+
+    started = time.perf_counter()
+    scalar = [score_row(row) for row in rows]
+    scalar_time = time.perf_counter() - started
+    array = rows_to_array(rows)
+    started = time.perf_counter()
+    batched = evaluate_batch(array)
+    batch_time = time.perf_counter() - started
+    if list(batched) != scalar:
+        raise AssertionError('batched scores differ from scalar scores')
+    print(f'scalar   {count / scalar_time:12.0f} positions/s')
+    print(f'batched  {count / batch_time:12.0f} positions/s  ({scalar_time / batch_time:.0f}x)')
+
+
+def score_pgn(path, limit=None, chunk=10000):
+    """Replay every game of a PGN file and batch-score all positions reached"""
+    import chess_pgn
+    _require_numpy()
+    position = Position()
+    games = positions = failed = 0
+    total = 0
+    pending = bytearray()
+    started = time.perf_counter()
+    for headers, movetext in chess_pgn.read_games(path):
+        if limit is not None and games >= limit:
+            break
+        games += 1
+        position.set_fen(headers.get('FEN', chess_pgn.START_FEN))
+        try:
+            for san in chess_pgn.san_tokens(movetext):
+                position.make_move(*chess_pgn.parse_san(position, san))
+                pending += encode(position)
+        except chess_pgn.PGNError:
+            failed += 1
+        if len(pending) >= chunk * ROW_SIZE:
+            scores = evaluate_batch(pending)
+            positions += len(scores)
+            total += int(np.abs(scores).sum())
+            pending = bytearray()
+    if pending:
+        scores = evaluate_batch(pending)
+        positions += len(scores)
+        total += int(np.abs(scores).sum())
+    elapsed = time.perf_counter() - started
+    print(f'games {games}  positions {positions}  failed {failed}  time {elapsed:.2f}s  '
+          f'{positions / elapsed:.0f} positions/s')
+    if positions:
+        print(f'mean absolute score {total / positions:.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Static evaluation benchmark and bulk scoring')
+    parser.add_argument('pgn', nargs='?', help='PGN file to score')
+    parser.add_argument('--bench', type=int, nargs='?', const=20000, help='compare scalar and batched speed')
+    parser.add_argument('--limit', type=int, help='stop after this many games')
+    args = parser.parse_args()
+    if args.bench:
+        bench(args.bench)
+    elif args.pgn:
+        score_pgn(args.pgn, args.limit)
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""A game of chess on top of a Position: moves, takebacks and the result.
+
+This is everything chess.py needs to run a game apart from drawing and
+input, so scripts, tests and worker processes can play whole games without
+importing pygame. A game is won by capturing the king (or by the other
+side forfeiting) and drawn by threefold repetition.
+"""
+from chess_position import START_FEN, Position, opponent
+
+RESULTS = {'': '*', 'white': '1-0', 'black': '0-1', 'draw': '1/2-1/2'}
+
+
+class Game:
+    def __init__(self, position=None, fen=None):
+        self.position = position if position is not None else Position()
+        # Position the game (and every restart) begins from
+        self.start_fen = fen or START_FEN
+        if fen:
+            self.position.set_fen(fen)
+        # '' while playing, then 'white', 'black' or 'draw'
+        self.winner = ''
+
+    @property
+    def game_over(self):
+        return self.winner != ''
+
+    @property
+    def turn(self):
+        return self.position.turn
+
+    def reset(self):
+        if self.start_fen == START_FEN:
+            self.position.reset()
+        else:
+            self.position.set_fen(self.start_fen)
+        self.winner = ''
+
+    def moves(self):
+        """(start, end, promotion) of every move played since the start"""
+        return [record[:3] for record in self.position.undo_stack]
+
+    def result(self):
+        """PGN result string: 1-0, 0-1, 1/2-1/2 or *"""
+        return RESULTS[self.winner]
+
+    def is_promotion(self, start, end):
+        """Whether moving the piece on start to end needs a promotion choice"""
+        position = self.position
+        piece = position.pieces(position.turn)[position.index_at(start)]
+        return piece == 'pawn' and end[1] == (0 if position.turn == 'white' else 7)
+
+    def play(self, start, end, promotion=None):
+        """Make a move for the side to move, update the result and return any capture"""
+        color = self.position.turn
+        captured = self.position.make_move(start, end, promotion)
+        if captured == 'king':
+            self.winner = color
+        elif self.position.is_threefold_repetition():
+            self.winner = 'draw'
+        return captured
+
+    def take_back(self, skip=None):
+        """Undo the last move and reopen the game if it had ended
+
+        If the side to move is then `skip` (the computer), its move is taken
+        back too, so it is the human's turn again.
+        """
+        position = self.position
+        if position.undo_stack:
+            position.unmake_move()
+            if position.turn == skip and position.undo_stack:
+                position.unmake_move()
+        self.winner = ''
+
+    def forfeit(self, color):
+        self.winner = opponent(color)
@@ -0,0 +1,146 @@
+"""Zobrist position keys and a bounded transposition table.
+
+Keys come from a fixed seed so a position hashes to the same 64-bit value in
+every process and on every run (worker processes and on-disk books rely on
+that). Position keeps its key up to date incrementally in make_move.
+"""
+import random
+
+from chess_bitboard import square
+
+_rng = random.Random(0x5EED_C4E55)
+
+
+def _key():
+    return _rng.getrandbits(64)
+
+
+# PIECE_KEYS[code][sq] for every board piece code (see chess_position.PIECE_CODES)
+PIECE_KEYS = [[_key() for _ in range(64)] for _ in range(16)]
+BLACK_TO_MOVE = _key()
+# One key per castling right lost: K, Q, k, q. Six keys are drawn, as there
+# were when the raw flags were keyed, so every key drawn after them is unchanged
+_LOST_RIGHT_KEYS = [_key() for _ in range(6)][:4]
+EN_PASSANT_KEYS = [_key() for _ in range(8)]
+
+
+def _castling_table():
+    table = []
+    for mask in range(16):
+        key = 0
+        for right in range(4):
+            if mask >> right & 1:
+                key ^= _LOST_RIGHT_KEYS[right]
+        table.append(key)
+    return table
+
+
+CASTLING_KEYS = _castling_table()
+
+
+def castling_key(white_castling, black_castling):
+    """Key for the castling rights the [king moved, left rook moved, right rook moved] flags leave
+
+    Only the rights matter: once the king has moved, whether its rooks have
+    too makes no difference to the position.
+    """
+    mask = 0
+    for shift, (king_moved, left_rook_moved, right_rook_moved) in ((0, white_castling), (2, black_castling)):
+        if king_moved or right_rook_moved:
+            mask |= 1 << shift  # K / k
+        if king_moved or left_rook_moved:
+            mask |= 2 << shift  # Q / q
+    return CASTLING_KEYS[mask]
+
+
+def en_passant_key(board, en_passant_target):
+    """Key for the en passant pawn, only if an enemy pawn is actually beside it
+
+    Otherwise positions that differ only by an unusable en passant target
+    would not count as repetitions.
+    """
+    if not en_passant_target:
+        return 0
+    x, y = en_passant_target
+    code = board[square(en_passant_target)]
+    # The capturing pawn has the opposite color bit (8) to the pawn it takes
+    capturer = code ^ 8
+    if (x > 0 and board[y*8 + x-1] == capturer) or (x < 7 and board[y*8 + x+1] == capturer):
+        return EN_PASSANT_KEYS[x]
+    return 0
+
+
+def compute_hash(position):
+    """Full Zobrist key of a Position, used to seed and to check the incremental one"""
+    key = 0
+    for sq, code in enumerate(position.board):
+        if code:
+            key ^= PIECE_KEYS[code][sq]
+    if position.turn == 'black':
+        key ^= BLACK_TO_MOVE
+    key ^= castling_key(position.white_castling, position.black_castling)
+    key ^= en_passant_key(position.board, position.en_passant_target)
+    return key
+
+
+# TRANSPOSITION TABLE
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results and other per-position data
+
+    Each index holds two slots: a depth-preferred slot that is only replaced
+    by a deeper (or same-depth) result or one from a newer search, and an
+    always-replace slot that catches everything else. Entries are tuples
+    (key, depth, value, flag, move, generation).
+    """
+
+    def __init__(self, size_bits=16):
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.slots = [None] * (2 * self.size)
+        self.generation = 0
+        self.hits = self.misses = self.stores = self.replacements = 0
+
+    def new_search(self):
+        """Age existing entries so the next search may overwrite them freely"""
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * (2 * self.size)
+        self.hits = self.misses = self.stores = self.replacements = 0
+
+    def probe(self, key):
+        index = 2 * (key & self.mask)
+        for entry in (self.slots[index], self.slots[index+1]):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, flag=EXACT, move=None):
+        index = 2 * (key & self.mask)
+        entry = (key, depth, value, flag, move, self.generation)
+        preferred = self.slots[index]
+        self.stores += 1
+        if (preferred is None or preferred[0] == key or depth >= preferred[1]
+                or preferred[5] != self.generation):
+            if preferred is not None and preferred[0] != key:
+                self.replacements += 1
+                # The displaced entry still gets a chance in the other slot
+                self.slots[index+1] = preferred
+            self.slots[index] = entry
+        else:
+            if self.slots[index+1] is not None and self.slots[index+1][0] != key:
+                self.replacements += 1
+            self.slots[index+1] = entry
+
+    def hit_rate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'stores': self.stores,
+                'replacements': self.replacements, 'hit_rate': self.hit_rate()}
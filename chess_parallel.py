@@ -0,0 +1,194 @@
+"""Root-splitting parallel search across a pool of worker processes.
+
+Each iteration of the iterative deepening loop searches the previous best
+move first, on its own, to get a score to beat. The remaining root moves
+are then handed out to the pool with a null window around that score,
+and the few that fail high are searched again with an open window. Every
+worker process keeps its own Engine and transposition table between
+tasks, so later iterations still benefit from earlier ones.
+
+Run `python chess_parallel.py --bench` to time fixed-depth searches of a
+few positions for 1, 2, 4... workers and report the speedup, or
+`python chess_parallel.py --workers 8 --time 10 e2e4 e7e5` to analyse a
+position.
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import time
+
+import chess_engine
+from chess_engine import INFINITY, MATE_BOUND
+from chess_position import Position, move_name, parse_move
+
+# Per-process engine and stop flag, set up by the pool initializer
+_engine = None
+_stop = None
+# The ParallelEngine search the engine's table and move ordering were last reset for
+_search = None
+
+
+def _init_worker(stop, table_bits):
+    global _engine, _stop
+    _engine = chess_engine.Engine(table_bits)
+    _stop = stop
+
+
+def _search_move(task):
+    global _search
+    search, data, move, depth, alpha, beta, deadline, must_finish = task
+    if search != _search:
+        # Once per search, not per root move, or siblings would see each other's entries as stale
+        _search = search
+        _engine.new_search()
+    position = pickle.loads(data)
+    # The deadline is absolute: a task that waited in the queue has less time,
+    # not a fresh budget (perf_counter is the same clock in every process)
+    time_left = max(deadline - time.perf_counter(), 0.0)
+    score = _engine.search_move(position, move, depth, alpha, beta, time_left, _stop, must_finish)
+    return move, score, _engine.nodes
+
+
+class ParallelEngine:
+    def __init__(self, workers=None, table_bits=18):
+        self.workers = workers or os.cpu_count() or 1
+        self.stop = multiprocessing.Event()
+        self.pool = multiprocessing.Pool(self.workers, _init_worker, (self.stop, table_bits))
+        self.nodes = 0
+        self.searches = 0
+
+    def close(self):
+        self.stop.set()
+        self.pool.terminate()
+        self.pool.join()
+
+    def search(self, position, time_limit=1.0, max_depth=chess_engine.MAX_PLY - 1, on_depth=None):
+        """Same contract and result dict as Engine.search, spread over the pool"""
+        started = time.perf_counter()
+        deadline = started + time_limit
+        self.stop.clear()
+        self.nodes = 0
+        self.searches += 1
+        moves = position.legal_moves() or position.pseudo_legal_moves()
+        info = self._info(None, 0, 0, started)
+        if not moves:
+            return info
+        info['move'] = moves[0]
+        data = pickle.dumps(position, pickle.HIGHEST_PROTOCOL)
+        for depth in range(1, max_depth + 1):
+            result = self._iteration(data, moves, depth, deadline)
+            if result is None:
+                break
+            best, score = result
+            moves.remove(best)
+            moves.insert(0, best)
+            info = self._info(best, score, depth, started)
+            if on_depth:
+                on_depth(info)
+            if abs(score) >= MATE_BOUND or time.perf_counter() - started > time_limit / 2:
+                break
+        info['time'] = time.perf_counter() - started
+        info['nodes'] = self.nodes
+        info['nps'] = int(self.nodes / info['time']) if info['time'] > 0 else 0
+        return info
+
+    def _run(self, tasks):
+        results = self.pool.map(_search_move, tasks, chunksize=1)
+        self.nodes += sum(nodes for _, _, nodes in results)
+        return results
+
+    def _iteration(self, data, moves, depth, deadline):
+        """(best move, score) for one depth, or None if time ran out first
+
+        The first move of depth 1 is always scored, so there is a move to play.
+        """
+        if depth > 1 and time.perf_counter() >= deadline:
+            return None
+        search = self.searches
+        [(_, alpha, _)] = self._run([(search, data, moves[0], depth, -INFINITY, INFINITY, deadline, depth == 1)])
+        if alpha is None:
+            return None
+        best = moves[0]
+        rest = moves[1:]
+        if not rest:
+            return best, alpha
+        if time.perf_counter() >= deadline:
+            return (best, alpha) if depth == 1 else None
+        scouted = self._run([(search, data, move, depth, alpha, alpha + 1, deadline, False) for move in rest])
+        if any(score is None for _, score, _ in scouted):
+            return (best, alpha) if depth == 1 else None
+        failed_high = [move for move, score, _ in scouted if score > alpha]
+        if failed_high:
+            for move, score, _ in self._run([(search, data, move, depth, alpha, INFINITY, deadline, False)
+                                             for move in failed_high]):
+                if score is None:
+                    return (best, alpha) if depth == 1 else None
+                if score > alpha:
+                    best, alpha = move, score
+        return best, alpha
+
+    def _info(self, move, score, depth, started):
+        elapsed = time.perf_counter() - started
+        return {'move': move, 'score': score, 'depth': depth, 'nodes': self.nodes, 'time': elapsed,
+                'nps': int(self.nodes / elapsed) if elapsed > 0 else 0, 'pv': [move] if move else []}
+
+
+# Fixed benchmark positions, as moves from the initial position
+BENCH_POSITIONS = [
+    [],
+    'e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5a4 g8f6 e1g1 f8e7'.split(),
+    'd2d4 g8f6 c2c4 e7e6 b1c3 f8b4 e2e3 e8g8 f1d3 d7d5'.split(),
+    'e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3 a7a6 c1e3 e7e5 d4b3 c8e6 f2f3 f8e7'.split(),
+]
+
+
+def position_after(moves):
+    position = Position()
+    for move in moves:
+        position.make_move(*parse_move(move))
+    return position
+
+
+def bench(depth, worker_counts):
+    baseline = None
+    for workers in worker_counts:
+        engine = ParallelEngine(workers)
+        elapsed = nodes = 0
+        for moves in BENCH_POSITIONS:
+            result = engine.search(position_after(moves), time_limit=float('inf'), max_depth=depth)
+            elapsed += result['time']
+            nodes += result['nodes']
+        engine.close()
+        baseline = baseline or elapsed
+        print(f'workers {workers:2d}  time {elapsed:7.2f}s  nodes {nodes:9d}  '
+              f'nps {int(nodes / elapsed):8d}  speedup {baseline / elapsed:5.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('moves', nargs='*', help='moves from the initial position, e.g. e2e4 e7e5')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--time', type=float, default=5.0, help='seconds to analyse')
+    parser.add_argument('--bench', action='store_true', help='report speedup versus worker count')
+    parser.add_argument('--depth', type=int, default=4, help='search depth for --bench')
+    args = parser.parse_args()
+    if args.bench:
+        most = args.workers or os.cpu_count() or 1
+        counts = [1]
+        while counts[-1] * 2 <= most:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != most:
+            counts.append(most)
+        print(f'{len(BENCH_POSITIONS)} positions to depth {args.depth}, {os.cpu_count()} cores')
+        bench(args.depth, counts)
+        return
+    engine = ParallelEngine(args.workers)
+    result = engine.search(position_after(args.moves), args.time,
+                           on_depth=lambda info: print(move_name(info['move']), chess_engine.format_info(info)))
+    engine.close()
+    print('best', move_name(result['move']), chess_engine.format_info(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Perft: count the leaf nodes of the legal move tree to a fixed depth.
+
+Checks the move generator against published node counts for standard test
+positions (castling, en passant, promotions, pins and checks) and reports
+nodes per second. Exits non-zero on any wrong count, so it can gate
+changes to move generation.
+
+    python chess_perft.py                      # every position at its default depth
+    python chess_perft.py --depth 4 --only kiwipete
+    python chess_perft.py --fen "<fen>" --depth 3 --divide
+    python chess_perft.py --save-baseline perft.json
+    python chess_perft.py --baseline perft.json  # also fail if >10% slower
+"""
+import argparse
+import json
+import sys
+import time
+
+from chess_position import START_FEN, Position, move_name
+
+# name, FEN, reference counts for depth 1, 2, 3...
+# (https://www.chessprogramming.org/Perft_Results)
+POSITIONS = [
+    ('initial', START_FEN, [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238, 674624]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379, 2103487]),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+# Depth each position is checked at by default: about ten seconds in total
+DEFAULT_DEPTHS = {'initial': 3, 'kiwipete': 3, 'position3': 4, 'position4': 3, 'position5': 3, 'position6': 3}
+
+
+def perft(position, depth):
+    if depth == 0:
+        return 1
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move(*move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    """Per-root-move counts, for finding where a wrong total comes from"""
+    counts = {}
+    for move in position.legal_moves():
+        position.make_move(*move)
+        counts[move_name(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return counts
+
+
+def run(name, fen, depth, expected=None, show_divide=False):
+    """Run one perft; returns (ok, nodes, seconds)"""
+    position = Position.from_fen(fen)
+    started = time.perf_counter()
+    if show_divide:
+        counts = divide(position, depth)
+        for move, count in sorted(counts.items()):
+            print(f'  {move}: {count}')
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(position, depth)
+    elapsed = time.perf_counter() - started
+    ok = expected is None or nodes == expected
+    status = '' if expected is None else ('ok' if ok else f'WRONG, expected {expected}')
+    print(f'{name:10s} depth {depth}  nodes {nodes:9d}  {elapsed:7.2f}s  '
+          f'{int(nodes / elapsed) if elapsed else 0:8d} nodes/s  {status}')
+    return ok, nodes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--depth', type=int, help='depth for every position (default: per position)')
+    parser.add_argument('--only', action='append', help='run only the named position (repeatable)')
+    parser.add_argument('--fen', help='run a custom position instead (no reference check)')
+    parser.add_argument('--divide', action='store_true', help='print counts per root move')
+    parser.add_argument('--baseline', help='JSON from --save-baseline; fail if nodes/s drops too far')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed nodes/s drop (default 0.10)')
+    parser.add_argument('--save-baseline', help='write the measured nodes/s to this JSON file')
+    args = parser.parse_args()
+
+    if args.fen:
+        run('custom', args.fen, args.depth or 3, show_divide=args.divide)
+        return 0
+
+    failures = 0
+    total_nodes = total_time = 0
+    for name, fen, counts in POSITIONS:
+        if args.only and name not in args.only:
+            continue
+        depth = args.depth or DEFAULT_DEPTHS[name]
+        expected = counts[depth - 1] if depth <= len(counts) else None
+        ok, nodes, elapsed = run(name, fen, depth, expected, args.divide)
+        failures += not ok
+        total_nodes += nodes
+        total_time += elapsed
+    nps = int(total_nodes / total_time) if total_time else 0
+    print(f'total      nodes {total_nodes}  {total_time:.2f}s  {nps} nodes/s')
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'nodes_per_second': nps, 'nodes': total_nodes}, f)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['nodes_per_second']
+        change = nps / baseline - 1
+        print(f'baseline   {baseline} nodes/s  change {change:+.1%}')
+        if change < -args.tolerance:
+            print('SLOWER than the baseline')
+            failures += 1
+    if failures:
+        print(f'{failures} check(s) failed')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
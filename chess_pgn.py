@@ -0,0 +1,276 @@
+"""PGN reading and writing, and a bulk replayer for game archives.
+
+read_games() memory-maps the file and yields one game at a time, so an
+archive of any size is read with memory bounded by its longest game.
+Moves are parsed from SAN and replayed through Position.make_move, one
+Position being reused for every game.
+
+    python chess_pgn.py archive.pgn [--limit N]
+
+replays every game and reports games/second, plies/second and any games
+whose moves do not parse or are not legal.
+"""
+import argparse
+import mmap
+import os
+import re
+import sys
+import time
+
+from chess_position import START_FEN, Position, parse_square, square_name
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SAN_PIECES = {'N': 'knight', 'B': 'bishop', 'R': 'rook', 'Q': 'queen', 'K': 'king'}
+SAN_LETTERS = {piece: letter for letter, piece in SAN_PIECES.items()}
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+_TAG = re.compile(rb'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_ESCAPE = re.compile(r'\\(.)')
+_TOKEN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};$]+')
+_SAN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?')
+
+
+class PGNError(ValueError):
+    """A move that does not parse or cannot be played in the position"""
+
+
+# READING
+def _comment_open(line, inside):
+    """Whether a {...} comment is open at the end of line, given whether one was at its start"""
+    at = 0
+    while True:
+        if inside:
+            at = line.find(b'}', at)
+            if at < 0:
+                return True
+            inside = False
+        else:
+            brace, semicolon = line.find(b'{', at), line.find(b';', at)
+            if brace < 0 or 0 <= semicolon < brace:
+                return False
+            at = brace
+            inside = True
+        at += 1
+
+
+def read_games(path):
+    """Yield (headers, movetext) for every game in a PGN file, via mmap"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            headers, lines = {}, []
+            comment = False  # inside a {...} comment spanning lines
+            for line in iter(data.readline, b''):
+                line = line.strip()
+                if comment:
+                    # Brackets in a comment are not tags
+                    comment = _comment_open(line, True)
+                    lines.append(line.decode('utf-8', 'replace'))
+                elif line.startswith(b'['):
+                    # A tag after movetext starts the next game
+                    if lines:
+                        yield headers, ' '.join(lines)
+                        headers, lines = {}, []
+                    match = _TAG.match(line)
+                    if match:
+                        value = match.group(2).decode('utf-8', 'replace')
+                        headers[match.group(1).decode('ascii')] = _ESCAPE.sub(r'\1', value)
+                elif line and not line.startswith(b'%'):
+                    if b'{' in line:
+                        comment = _comment_open(line, False)
+                    lines.append(line.decode('utf-8', 'replace'))
+            if headers or lines:
+                yield headers, ' '.join(lines)
+
+
+def san_tokens(movetext):
+    """The SAN moves of the main line, skipping numbers, comments, NAGs and variations"""
+    depth = 0
+    for token in _TOKEN.findall(movetext):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth or token[0] in '{;$' or token[0].isdigit() and token[-1] == '.' or token in RESULTS:
+            continue
+        else:
+            yield token
+
+
+def _is_legal(position, move):
+    color = position.turn
+    position.make_move(*move)
+    legal = not position.in_check(color)
+    position.unmake_move()
+    return legal
+
+
+def parse_san(position, san):
+    """SAN ('Nbd7', 'exd8=Q+', 'O-O') -> (start, end, promotion) for the side to move"""
+    color = position.turn
+    text = san.rstrip('+#!?')
+    if text in ('O-O', 'O-O-O', '0-0', '0-0-0'):
+        king = position.king_location(color)
+        if king is None:
+            raise PGNError(f'{san}: no king to castle')
+        end = (king[0] + (2 if len(text) == 3 else -2), king[1])
+        if end not in position.options(color)[position.index_at(king)]:
+            raise PGNError(f'{san}: cannot castle')
+        return king, end, None
+
+    match = _SAN.fullmatch(text)
+    if not match:
+        raise PGNError(f'{san}: not a SAN move')
+    letter, file, rank, target, promotion = match.groups()
+    piece = SAN_PIECES[letter] if letter else 'pawn'
+    end = parse_square(target)
+    candidates = [start for kind, start, targets in zip(position.pieces(color), position.locations(color),
+                                                        position.options(color))
+                  if kind == piece and end in targets
+                  and (file is None or start[0] == ord(file) - ord('a'))
+                  and (rank is None or start[1] == 8 - int(rank))]
+    promotion = SAN_PIECES[promotion] if promotion else None
+    if len(candidates) > 1:
+        # Ambiguity is only resolved by legality (a pinned piece)
+        candidates = [start for start in candidates if _is_legal(position, (start, end, promotion))]
+    if len(candidates) != 1:
+        raise PGNError(f'{san}: {len(candidates)} pieces can make this move')
+    if piece == 'pawn' and end[1] in (0, 7) and promotion is None:
+        raise PGNError(f'{san}: promotion piece missing')
+    return candidates[0], end, promotion
+
+
+def replay(position, headers, movetext):
+    """Set position to the game's start (FEN tag or initial) and play all its moves
+
+    Returns the number of plies played; raises PGNError on a bad move.
+    """
+    position.set_fen(headers.get('FEN', START_FEN))
+    plies = 0
+    for san in san_tokens(movetext):
+        move = parse_san(position, san)
+        if not _is_legal(position, move):
+            raise PGNError(f'{san}: leaves the king in check')
+        position.make_move(*move)
+        plies += 1
+    return plies
+
+
+# WRITING
+def move_san(position, move):
+    """SAN for a move of the side to move, with + or # from playing it out"""
+    start, end, promotion = move
+    color = position.turn
+    piece = position.pieces(color)[position.index_at(start)]
+    if piece == 'king' and abs(end[0] - start[0]) == 2:
+        san = 'O-O' if end[0] > start[0] else 'O-O-O'
+    elif piece == 'pawn':
+        capture = start[0] != end[0]
+        san = (square_name(start)[0] + 'x' if capture else '') + square_name(end)
+        if promotion:
+            san += '=' + SAN_LETTERS[promotion]
+    else:
+        others = [other for kind, other, targets in zip(position.pieces(color), position.locations(color),
+                                                        position.options(color))
+                  if kind == piece and other != start and end in targets and _is_legal(position, (other, end, None))]
+        name = square_name(start)
+        if not others:
+            disambiguation = ''
+        elif all(other[0] != start[0] for other in others):
+            disambiguation = name[0]
+        elif all(other[1] != start[1] for other in others):
+            disambiguation = name[1]
+        else:
+            disambiguation = name
+        san = SAN_LETTERS[piece] + disambiguation + ('x' if position.piece_at(end) else '') + square_name(end)
+    position.make_move(*move)
+    if position.in_check(position.turn):
+        san += '+' if position.legal_moves() else '#'
+    position.unmake_move()
+    return san
+
+
+def _escape_tag(value):
+    """A tag value with backslashes and quotes escaped"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def write_pgn(moves, start_fen=None, headers=None, result='*'):
+    """PGN text for (start, end, promotion) moves played from start_fen (default: initial)"""
+    tags = {'Event': '?', 'Site': '?', 'Date': '????.??.??', 'Round': '?', 'White': '?', 'Black': '?'}
+    tags.update(headers or {})
+    tags['Result'] = result
+    position = Position()
+    if start_fen and start_fen != START_FEN:
+        tags['SetUp'], tags['FEN'] = '1', start_fen
+        position.set_fen(start_fen)
+    tokens = []
+    for move in moves:
+        if position.turn == 'white':
+            tokens.append(f'{position.fullmove_number}.')
+        elif not tokens:
+            tokens.append(f'{position.fullmove_number}...')
+        tokens.append(move_san(position, move))
+        position.make_move(*move)
+    tokens.append(result)
+
+    lines, line = [], ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    lines.append(line)
+    tag_lines = [f'[{name} "{_escape_tag(value)}"]' for name, value in tags.items()]
+    return '\n'.join(tag_lines) + '\n\n' + '\n'.join(lines) + '\n\n'
+
+
+# BULK REPLAY
+def main():
+    parser = argparse.ArgumentParser(description='Replay every game of a PGN file through the move logic')
+    parser.add_argument('path')
+    parser.add_argument('--limit', type=int, help='stop after this many games')
+    parser.add_argument('--errors', type=int, default=10, help='bad games to describe (default 10)')
+    parser.add_argument('--progress', type=int, default=10000, help='report every N games (0 to disable)')
+    args = parser.parse_args()
+
+    position = Position()
+    games = plies = failed = 0
+    results = {}
+    started = time.perf_counter()
+    for headers, movetext in read_games(args.path):
+        if args.limit is not None and games >= args.limit:
+            break
+        games += 1
+        try:
+            plies += replay(position, headers, movetext)
+        except (PGNError, ValueError) as error:
+            failed += 1
+            if failed <= args.errors:
+                print(f'game {games} ({headers.get("White", "?")} - {headers.get("Black", "?")}): {error}')
+        result = headers.get('Result', '*')
+        results[result] = results.get(result, 0) + 1
+        if args.progress and games % args.progress == 0:
+            elapsed = time.perf_counter() - started
+            print(f'{games} games  {games / elapsed:.0f} games/s')
+
+    elapsed = time.perf_counter() - started
+    print(f'games {games}  plies {plies}  failed {failed}  time {elapsed:.2f}s')
+    if elapsed > 0:
+        print(f'{games / elapsed:.1f} games/s  {plies / elapsed:.0f} plies/s')
+    print('results', ' '.join(f'{result}: {count}' for result, count in sorted(results.items())))
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        print(f'peak memory {peak / 1024 if sys.platform != "darwin" else peak / 1024**2:.1f} MB')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,512 @@
+"""Headless chess position for chess.py and scripted callers.
+
+A Position holds the parallel piece lists chess.py has always used, the
+square-indexed board, castling and en-passant state and each piece's move
+options. Moves are applied with make_move() and taken back with
+unmake_move(); every ply pushes one small undo record, so search and
+takebacks never copy the whole state. The position's Zobrist key is kept
+up to date by the same two calls. Nothing here imports pygame.
+"""
+import copy
+import os
+
+import chess_bitboard
+import chess_hash
+from chess_bitboard import SQUARE_BITS, square
+from chess_hash import BLACK_TO_MOVE, PIECE_KEYS, castling_key, en_passant_key
+
+# Compact piece codes for the square-indexed board; black codes have BLACK_PIECE set
+EMPTY = 0
+PIECE_CODES = {'pawn': 1, 'knight': 2, 'bishop': 3, 'rook': 4, 'queen': 5, 'king': 6}
+BLACK_PIECE = 8
+PROMOTIONS = ['queen', 'rook', 'bishop', 'knight']
+
+START_PIECES = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook'] + ['pawn']*8
+# White pieces at bottom, black pieces at top
+WHITE_START = [(0, 7), (1, 7), (2, 7), (3, 7), (4, 7), (5, 7), (6, 7), (7, 7)] + [(i, 6) for i in range(8)]
+BLACK_START = [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (5, 0), (6, 0), (7, 0)] + [(i, 1) for i in range(8)]
+
+# Set CHESS_VERIFY_OPTIONS=1 to cross-check every incremental option update
+# against a full recomputation
+VERIFY_OPTIONS = os.environ.get('CHESS_VERIFY_OPTIONS') == '1'
+
+
+def piece_code(piece, color):
+    return PIECE_CODES[piece] | (BLACK_PIECE if color == 'black' else 0)
+
+
+def code_color(code):
+    return 'black' if code & BLACK_PIECE else 'white'
+
+
+def opponent(color):
+    return 'black' if color == 'white' else 'white'
+
+
+def parse_square(name):
+    """'e2' -> (4, 6); rank 8 is row 0"""
+    return ord(name[0]) - ord('a'), 8 - int(name[1])
+
+
+def square_name(pos):
+    return 'abcdefgh'[pos[0]] + str(8 - pos[1])
+
+
+PROMOTION_LETTERS = {'q': 'queen', 'r': 'rook', 'b': 'bishop', 'n': 'knight'}
+FEN_PIECES = {'p': 'pawn', 'n': 'knight', 'b': 'bishop', 'r': 'rook', 'q': 'queen', 'k': 'king'}
+# Indexed by board code & 7
+FEN_LETTERS = ' pnbrqk'
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def parse_move(text):
+    """Coordinate notation ('e2e4', 'e7e8q') -> (start, end, promotion)"""
+    promotion = PROMOTION_LETTERS[text[4]] if len(text) > 4 else None
+    return parse_square(text[:2]), parse_square(text[2:4]), promotion
+
+
+def move_name(move):
+    start, end, promotion = move
+    letter = {piece: letter for letter, piece in PROMOTION_LETTERS.items()}.get(promotion, '')
+    return square_name(start) + square_name(end) + letter
+
+
+class Position:
+    def __init__(self):
+        self.board = [EMPTY] * 64
+        self.board_slots = [None] * 64
+        self.reset()
+
+    def reset(self):
+        """Back to the initial position with an empty undo stack"""
+        self.white_pieces = list(START_PIECES)
+        self.white_locations = list(WHITE_START)
+        self.black_pieces = list(START_PIECES)
+        self.black_locations = list(BLACK_START)
+        self.captured_pieces_white = []
+        self.captured_pieces_black = []
+        # Castling tracking: [king_moved, left_rook_moved, right_rook_moved]
+        self.white_castling = [False, False, False]
+        self.black_castling = [False, False, False]
+        # En passant tracking: the pawn that may be captured en passant
+        self.en_passant_target = None
+        self.turn = 'white'
+        # Half-moves since the last capture or pawn move (repetitions cannot cross one)
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.undo_stack = []
+        # Zobrist keys of the positions before each move on the undo stack
+        self.hash_history = []
+        # Optional chess_hash.TranspositionTable caching legal_moves() per position
+        self.move_table = None
+        self.setup()
+
+    def setup(self):
+        """Rebuild the board, options and caches from the piece lists"""
+        for sq in range(64):
+            self.board[sq] = EMPTY
+            self.board_slots[sq] = None
+        for color in ('white', 'black'):
+            pieces, locations = self.pieces(color), self.locations(color)
+            for i, (piece, pos) in enumerate(zip(pieces, locations)):
+                self.board[square(pos)] = piece_code(piece, color)
+                self.board_slots[square(pos)] = i
+        # Attack maps of the current position, filled on demand
+        self.attack_cache = {}
+        self.white_options = self.generate_options('white')
+        self.black_options = self.generate_options('black')
+        # Squares changed since the options were last brought up to date
+        self.options_dirty = 0
+        self.options_en_passant = self.en_passant_target
+        self.hash = chess_hash.compute_hash(self)
+
+    @classmethod
+    def from_fen(cls, fen):
+        position = cls()
+        position.set_fen(fen)
+        return position
+
+    def set_fen(self, fen):
+        """Set up the position described by a FEN string, with an empty undo stack"""
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f'not a FEN position: {fen!r}')
+        placement, turn, rights, en_passant = fields[:4]
+        rows = placement.split('/')
+        if len(rows) != 8:
+            raise ValueError(f'FEN board needs 8 ranks: {placement!r}')
+        for color in ('white', 'black'):
+            self.pieces(color).clear()
+            self.locations(color).clear()
+            self.captured(color).clear()
+        for y, row in enumerate(rows):
+            x = 0
+            for char in row:
+                if char.isdigit():
+                    x += int(char)
+                    continue
+                if char.lower() not in FEN_PIECES or x > 7:
+                    raise ValueError(f'bad FEN rank {row!r}')
+                color = 'white' if char.isupper() else 'black'
+                self.pieces(color).append(FEN_PIECES[char.lower()])
+                self.locations(color).append((x, y))
+                x += 1
+            if x != 8:
+                raise ValueError(f'bad FEN rank {row!r}')
+        # A missing right counts as the king or that rook having moved
+        self.white_castling[:] = ['K' not in rights and 'Q' not in rights, 'Q' not in rights, 'K' not in rights]
+        self.black_castling[:] = ['k' not in rights and 'q' not in rights, 'q' not in rights, 'k' not in rights]
+        self.turn = 'white' if turn == 'w' else 'black'
+        # FEN names the square passed over; we track the pawn that can be taken
+        if en_passant == '-':
+            self.en_passant_target = None
+        else:
+            x, y = parse_square(en_passant)
+            self.en_passant_target = (x, y - 1 if y == 5 else y + 1)
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        self.undo_stack = []
+        self.hash_history = []
+        self.setup()
+
+    def to_fen(self):
+        rows = []
+        for y in range(8):
+            row, empty = '', 0
+            for x in range(8):
+                code = self.board[y*8 + x]
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    row, empty = row + str(empty), 0
+                letter = FEN_LETTERS[code & 7]
+                row += letter if code & BLACK_PIECE else letter.upper()
+            rows.append(row + (str(empty) if empty else ''))
+        rights = ''
+        for castling, king_side, queen_side in ((self.white_castling, 'K', 'Q'), (self.black_castling, 'k', 'q')):
+            if not castling[0]:
+                rights += (king_side if not castling[2] else '') + (queen_side if not castling[1] else '')
+        if self.en_passant_target:
+            x, y = self.en_passant_target
+            en_passant = square_name((x, y + 1 if y == 4 else y - 1))
+        else:
+            en_passant = '-'
+        return (f"{'/'.join(rows)} {self.turn[0]} {rights or '-'} {en_passant} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def copy(self):
+        """Independent copy (sharing move_table) to search while this one stays on screen"""
+        table, self.move_table = self.move_table, None
+        clone = copy.deepcopy(self)
+        self.move_table = clone.move_table = table
+        return clone
+
+    # LOOKUPS
+    def pieces(self, color):
+        return self.white_pieces if color == 'white' else self.black_pieces
+
+    def locations(self, color):
+        return self.white_locations if color == 'white' else self.black_locations
+
+    def castling(self, color):
+        return self.white_castling if color == 'white' else self.black_castling
+
+    def captured(self, color):
+        """Pieces `color` has captured"""
+        return self.captured_pieces_white if color == 'white' else self.captured_pieces_black
+
+    def piece_at(self, pos):
+        if 0 <= pos[0] <= 7 and 0 <= pos[1] <= 7:
+            return self.board[square(pos)]
+        return EMPTY
+
+    def index_at(self, pos):
+        """Index of the piece on pos in its side's lists"""
+        return self.board_slots[square(pos)]
+
+    def occupied(self):
+        return chess_bitboard.occupancy(self.white_locations) | chess_bitboard.occupancy(self.black_locations)
+
+    # MOVE OPTIONS AND ATTACKS
+    def generate_options(self, color, enemy_attacks=None):
+        """Full recomputation of one side's options, one tuple of targets per piece"""
+        enemy = opponent(color)
+        return chess_bitboard.generate_options(self.pieces(color), self.locations(color), color,
+                                               self.pieces(enemy), self.locations(enemy),
+                                               self.castling(color), self.en_passant_target, enemy_attacks)
+
+    def options(self, color):
+        """Per-piece option tuples for `color`, brought up to date if moves were made since"""
+        if self.options_dirty or self.options_en_passant != self.en_passant_target:
+            self.refresh_options()
+        return self.white_options if color == 'white' else self.black_options
+
+    def refresh_options(self):
+        """Recompute only the options the moves since the last refresh can have changed"""
+        changed = self.options_dirty
+        en_passant_changed = self.options_en_passant != self.en_passant_target
+        self.options_dirty = 0
+        self.options_en_passant = self.en_passant_target
+        for color, options in (('white', self.white_options), ('black', self.black_options)):
+            enemy = opponent(color)
+            castling = self.castling(color)
+            chess_bitboard.update_options(options, self.pieces(color), self.locations(color), color,
+                                          self.pieces(enemy), self.locations(enemy), castling,
+                                          self.en_passant_target, changed, en_passant_changed,
+                                          None if castling[0] else self.side_attacks(enemy))
+        if VERIFY_OPTIONS:
+            if (self.white_options != self.generate_options('white') or
+                    self.black_options != self.generate_options('black')):
+                raise AssertionError('incremental move options differ from a full recomputation')
+
+    def side_attacks(self, color):
+        """Bitboard of every square `color` attacks in the current position (cached)"""
+        attacks = self.attack_cache.get(color)
+        if attacks is None:
+            attacks = self.attack_cache[color] = chess_bitboard.attack_map(
+                self.pieces(color), self.locations(color), color, self.occupied())
+        return attacks
+
+    def is_square_under_attack(self, pos, color, pieces=None, locations=None):
+        """Check if a square is under attack by the opponent
+
+        Uses the cached attack map of the opponent's pieces unless another set
+        of attacking pieces/locations is passed in.
+        """
+        enemy = opponent(color)
+        if pieces is None:
+            attacks = self.side_attacks(enemy)
+        else:
+            occ = self.occupied() | chess_bitboard.occupancy(locations)
+            attacks = chess_bitboard.attack_map(pieces, locations, enemy, occ)
+        return bool(attacks & SQUARE_BITS[pos])
+
+    def king_location(self, color):
+        pieces = self.pieces(color)
+        if 'king' not in pieces:
+            return None
+        return self.locations(color)[pieces.index('king')]
+
+    def in_check(self, color):
+        king = self.king_location(color)
+        return king is not None and self.is_square_under_attack(king, color)
+
+    # MOVE LISTS
+    def pseudo_legal_moves(self):
+        """(start, end, promotion) for every option of the side to move"""
+        color = self.turn
+        last_row = 0 if color == 'white' else 7
+        moves = []
+        for piece, start, targets in zip(self.pieces(color), self.locations(color), self.options(color)):
+            for end in targets:
+                if piece == 'pawn' and end[1] == last_row:
+                    moves.extend((start, end, promotion) for promotion in PROMOTIONS)
+                else:
+                    moves.append((start, end, None))
+        return moves
+
+    def legal_moves(self):
+        """Pseudo-legal moves that do not leave the mover's own king attacked"""
+        if self.move_table is not None:
+            entry = self.move_table.probe(self.hash)
+            if entry is not None:
+                return list(entry[2])
+        color = self.turn
+        moves = []
+        for move in self.pseudo_legal_moves():
+            self.make_move(*move)
+            if not self.in_check(color):
+                moves.append(move)
+            self.unmake_move()
+        if self.move_table is not None:
+            self.move_table.store(self.hash, 0, tuple(moves))
+        return moves
+
+    # REPETITIONS
+    def repetition_count(self):
+        """How many times the current position has occurred, counting this one"""
+        count = 1
+        history = self.hash_history
+        # Only positions with the same side to move since the last irreversible move
+        for i in range(len(history) - 2, max(len(history) - self.halfmove_clock, 0) - 1, -2):
+            if history[i] == self.hash:
+                count += 1
+        return count
+
+    def is_threefold_repetition(self):
+        return self.repetition_count() >= 3
+
+    # BOARD BOOKKEEPING
+    def _move_piece(self, start, end):
+        """Move the piece on start to the empty square end, in the lists and on the board"""
+        start_sq, end_sq = square(start), square(end)
+        code, index = self.board[start_sq], self.board_slots[start_sq]
+        self.locations(code_color(code))[index] = end
+        self.board[end_sq], self.board_slots[end_sq] = code, index
+        self.board[start_sq], self.board_slots[start_sq] = EMPTY, None
+
+    def _lists(self, color):
+        if color == 'white':
+            return self.white_pieces, self.white_locations, self.white_options
+        return self.black_pieces, self.black_locations, self.black_options
+
+    def _remove_piece(self, pos):
+        """Take the piece on pos off the board; returns (piece, index, options)
+
+        The side's last piece is moved into the freed list slot instead of
+        shifting every later entry down.
+        """
+        sq = square(pos)
+        pieces, locations, options = self._lists(code_color(self.board[sq]))
+        index = self.board_slots[sq]
+        removed = (pieces[index], index, options[index])
+        self.board[sq], self.board_slots[sq] = EMPTY, None
+        last = len(pieces) - 1
+        if index != last:
+            pieces[index], locations[index], options[index] = pieces[last], locations[last], options[last]
+            self.board_slots[square(locations[index])] = index
+        pieces.pop()
+        locations.pop()
+        options.pop()
+        return removed
+
+    def _restore_piece(self, color, pos, piece, index, piece_options):
+        """Exact inverse of _remove_piece"""
+        pieces, locations, options = self._lists(color)
+        if index < len(pieces):
+            pieces.append(pieces[index])
+            locations.append(locations[index])
+            options.append(options[index])
+            self.board_slots[square(locations[-1])] = len(pieces) - 1
+            pieces[index], locations[index], options[index] = piece, pos, piece_options
+        else:
+            pieces.append(piece)
+            locations.append(pos)
+            options.append(piece_options)
+        self.board[square(pos)] = piece_code(piece, color)
+        self.board_slots[square(pos)] = index
+
+    def _set_piece(self, pos, piece):
+        """Change the kind of the piece on pos (promotion and its undo)"""
+        sq = square(pos)
+        color = code_color(self.board[sq])
+        self.pieces(color)[self.board_slots[sq]] = piece
+        self.board[sq] = piece_code(piece, color)
+
+    def _touched(self, changed):
+        self.options_dirty |= changed
+        self.attack_cache.clear()
+
+    # MAKE / UNMAKE
+    def make_move(self, start, end, promotion=None):
+        """Play start -> end for the side to move and return the captured piece, if any
+
+        promotion names the piece a pawn reaching the last rank becomes.
+        """
+        color = self.turn
+        enemy = opponent(color)
+        castling = self.castling(color)
+        piece = self.pieces(color)[self.index_at(start)]
+        code = self.board[square(start)]
+        home = 7 if color == 'white' else 0
+        undo_castling = (tuple(self.white_castling), tuple(self.black_castling))
+        undo_en_passant = self.en_passant_target
+        undo_hash, undo_clock = self.hash, self.halfmove_clock
+        changed = SQUARE_BITS[start] | SQUARE_BITS[end]
+        captured = capture_pos = capture_index = capture_options = None
+        rook_move = None
+        # Zobrist key: take out the old castling/en passant keys and the moving piece
+        key = (self.hash ^ castling_key(self.white_castling, self.black_castling)
+               ^ en_passant_key(self.board, self.en_passant_target) ^ BLACK_TO_MOVE
+               ^ PIECE_KEYS[code][square(start)])
+
+        if piece == 'king' and abs(end[0] - start[0]) == 2:
+            rook_from, rook_to = ((7, home), (5, home)) if end[0] == 6 else ((0, home), (3, home))
+            self._move_piece(start, end)
+            rook = piece_code('rook', color)
+            if self.piece_at(rook_from) == rook:
+                self._move_piece(rook_from, rook_to)
+                rook_move = (rook_from, rook_to)
+                changed |= SQUARE_BITS[rook_from] | SQUARE_BITS[rook_to]
+                key ^= PIECE_KEYS[rook][square(rook_from)] ^ PIECE_KEYS[rook][square(rook_to)]
+            castling[0] = True
+            castling[2 if end[0] == 6 else 1] = True
+            self.en_passant_target = None
+        else:
+            capture_pos = end
+            ep = self.en_passant_target
+            if piece == 'pawn' and ep and start[1] == ep[1] and end[0] == ep[0] and end[0] != start[0]:
+                if self.piece_at(ep) == piece_code('pawn', enemy) and not self.piece_at(end):
+                    capture_pos = ep
+            if self.piece_at(capture_pos):
+                key ^= PIECE_KEYS[self.piece_at(capture_pos)][square(capture_pos)]
+                captured, capture_index, capture_options = self._remove_piece(capture_pos)
+                changed |= SQUARE_BITS[capture_pos]
+                self.captured(color).append(captured)
+                # A rook taken on its corner can no longer castle
+                if captured == 'rook' and capture_pos[1] == 7 - home:
+                    if capture_pos[0] == 0:
+                        self.castling(enemy)[1] = True
+                    elif capture_pos[0] == 7:
+                        self.castling(enemy)[2] = True
+            self._move_piece(start, end)
+
+            if piece == 'king':
+                castling[0] = True
+            elif piece == 'rook':
+                if start == (0, home):
+                    castling[1] = True
+                elif start == (7, home):
+                    castling[2] = True
+
+            if piece == 'pawn' and abs(end[1] - start[1]) == 2:
+                self.en_passant_target = end
+            else:
+                self.en_passant_target = None
+
+            if promotion:
+                self._set_piece(end, promotion)
+
+        key ^= PIECE_KEYS[self.board[square(end)]][square(end)]
+        self.hash = (key ^ castling_key(self.white_castling, self.black_castling)
+                     ^ en_passant_key(self.board, self.en_passant_target))
+        self.halfmove_clock = 0 if piece == 'pawn' or captured else self.halfmove_clock + 1
+        if color == 'black':
+            self.fullmove_number += 1
+        self.hash_history.append(undo_hash)
+        self.undo_stack.append((start, end, promotion, captured, capture_pos, capture_index,
+                                capture_options, rook_move, undo_castling, undo_en_passant,
+                                undo_hash, undo_clock))
+        self.turn = enemy
+        self._touched(changed)
+        return captured
+
+    def unmake_move(self):
+        """Take back the last make_move and return it as (start, end, promotion)"""
+        (start, end, promotion, captured, capture_pos, capture_index,
+         capture_options, rook_move, undo_castling, undo_en_passant,
+         undo_hash, undo_clock) = self.undo_stack.pop()
+        enemy = self.turn
+        color = opponent(enemy)
+        changed = SQUARE_BITS[start] | SQUARE_BITS[end]
+        if promotion:
+            self._set_piece(end, 'pawn')
+        self._move_piece(end, start)
+        if rook_move:
+            self._move_piece(rook_move[1], rook_move[0])
+            changed |= SQUARE_BITS[rook_move[0]] | SQUARE_BITS[rook_move[1]]
+        if captured:
+            self._restore_piece(enemy, capture_pos, captured, capture_index, capture_options)
+            self.captured(color).pop()
+            changed |= SQUARE_BITS[capture_pos]
+        self.white_castling[:] = undo_castling[0]
+        self.black_castling[:] = undo_castling[1]
+        self.en_passant_target = undo_en_passant
+        self.hash, self.halfmove_clock = undo_hash, undo_clock
+        if color == 'black':
+            self.fullmove_number -= 1
+        self.hash_history.pop()
+        self.turn = color
+        self._touched(changed)
+        return start, end, promotion
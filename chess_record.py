@@ -0,0 +1,232 @@
+"""Compact binary game records with keyframes, appended to one archive file.
+
+An archive is an 8-byte magic followed by game records, each written in
+one append:
+
+    GAME header   tag, body size, plies, keyframe count, keyframe interval, result
+    offsets       body offset of every keyframe (uint32 each)
+    moves         2 bytes per ply (chess_book.encode_move)
+    keyframes     the FEN and captured pieces every `interval` plies, from ply 0
+
+Moves are fixed size, so ply n of any game is at a known offset, and
+position_at(n) restores the keyframe at or before n and plays at most
+interval - 1 moves forward, whatever the length of the game. Archives are
+memory-mapped and games found by hopping from header to header, so
+nothing is read but the headers until a game is opened.
+
+    python chess_record.py convert games.pgn games.rec [--limit N]
+    python chess_record.py info games.rec [--bench]
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+from chess_book import decode_move, encode_move
+from chess_position import FEN_PIECES, START_FEN, Position
+
+MAGIC = b'GKREC001'
+GAME = struct.Struct('>4sIIHHB')  # tag, body size, plies, keyframes, interval, result
+TAG = b'GAME'
+MOVE = struct.Struct('>H')
+OFFSET = struct.Struct('>I')
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+INTERVAL = 32
+PIECE_LETTERS = {piece: letter for letter, piece in FEN_PIECES.items()}
+
+
+def _keyframe(position):
+    """FEN, then the captured pieces as letters, each with a length byte"""
+    fields = [position.to_fen(),
+              ''.join(PIECE_LETTERS[piece] for piece in position.captured_pieces_white),
+              ''.join(PIECE_LETTERS[piece] for piece in position.captured_pieces_black)]
+    return b''.join(bytes([len(field)]) + field.encode('ascii') for field in fields)
+
+
+def encode_game(moves, start_fen=None, result='*', interval=INTERVAL):
+    """Bytes of one GAME record for (start, end, promotion) moves from start_fen"""
+    position = Position.from_fen(start_fen or START_FEN)
+    keyframes = [_keyframe(position)]
+    for ply, move in enumerate(moves, 1):
+        position.make_move(*move)
+        if ply % interval == 0:
+            keyframes.append(_keyframe(position))
+    offsets_size = OFFSET.size * len(keyframes)
+    offset = offsets_size + MOVE.size * len(moves)
+    offsets = []
+    for keyframe in keyframes:
+        offsets.append(OFFSET.pack(offset))
+        offset += len(keyframe)
+    body = b''.join(offsets) + b''.join(MOVE.pack(encode_move(move)) for move in moves) + b''.join(keyframes)
+    return GAME.pack(TAG, len(body), len(moves), len(keyframes), interval, RESULTS.index(result)) + body
+
+
+def append_game(path, moves, start_fen=None, result='*', interval=INTERVAL):
+    """Append one game to an archive, creating it if needed"""
+    record = encode_game(moves, start_fen, result, interval)
+    with open(path, 'ab') as f:
+        if f.tell() == 0:
+            f.write(MAGIC)
+        f.write(record)
+
+
+class GameRecord:
+    """One game of an archive, read straight from the mapped file"""
+
+    def __init__(self, data, offset):
+        _, size, self.plies, self.keyframes, self.interval, result = GAME.unpack_from(data, offset)
+        self.result = RESULTS[result] if result < len(RESULTS) else '*'
+        self.data = data
+        self.body = offset + GAME.size
+        self.moves_at = self.body + OFFSET.size * self.keyframes
+
+    def __len__(self):
+        return self.plies
+
+    def move(self, ply):
+        """The move played at ply (0 is the first move)"""
+        return decode_move(MOVE.unpack_from(self.data, self.moves_at + MOVE.size * ply)[0])
+
+    def moves(self):
+        return [self.move(ply) for ply in range(self.plies)]
+
+    def keyframe(self, index):
+        """(fen, captured white, captured black) stored at ply index * interval"""
+        at = self.body + OFFSET.unpack_from(self.data, self.body + OFFSET.size * index)[0]
+        fields = []
+        for _ in range(3):
+            length = self.data[at]
+            fields.append(bytes(self.data[at + 1:at + 1 + length]).decode('ascii'))
+            at += 1 + length
+        fen, white, black = fields
+        return fen, [FEN_PIECES[letter] for letter in white], [FEN_PIECES[letter] for letter in black]
+
+    @property
+    def start_fen(self):
+        return self.keyframe(0)[0]
+
+    def position_at(self, ply, position=None):
+        """The position after ply moves, set up on position (a new one by default)"""
+        ply = max(0, min(ply, self.plies))
+        index = min(ply // self.interval, self.keyframes - 1)
+        fen, white, black = self.keyframe(index)
+        position = position if position is not None else Position()
+        position.set_fen(fen)
+        position.captured_pieces_white[:] = white
+        position.captured_pieces_black[:] = black
+        for played in range(index * self.interval, ply):
+            position.make_move(*self.move(played))
+        return position
+
+
+class Archive:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < len(MAGIC):
+            self.file.close()
+            raise ValueError(f'{path} is not a game archive')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a game archive')
+        self.offsets = self._scan()
+
+    def _scan(self):
+        """Offset of every complete game, reading only the headers"""
+        offsets, at, end = [], len(MAGIC), len(self.data)
+        while at + GAME.size <= end:
+            tag, size = GAME.unpack_from(self.data, at)[:2]
+            # A record cut short by a crash ends the archive
+            if tag != TAG or at + GAME.size + size > end:
+                break
+            offsets.append(at)
+            at += GAME.size + size
+        return offsets
+
+    def close(self):
+        if getattr(self, 'data', None) is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        return GameRecord(self.data, self.offsets[index])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert PGN to binary game records, or inspect an archive')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help='append the games of a PGN file to an archive')
+    convert.add_argument('pgn')
+    convert.add_argument('archive')
+    convert.add_argument('--limit', type=int, help='stop after this many games')
+    convert.add_argument('--interval', type=int, default=INTERVAL, help=f'plies between keyframes (default {INTERVAL})')
+    info = commands.add_parser('info', help='summarise an archive')
+    info.add_argument('archive')
+    info.add_argument('--bench', action='store_true', help='time seeks against replaying from the start')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        import chess_pgn
+        started = time.perf_counter()
+        games = plies = 0
+        position = Position()
+        with open(args.archive, 'ab') as f:
+            if f.tell() == 0:
+                f.write(MAGIC)
+            for headers, movetext in chess_pgn.read_games(args.pgn):
+                if args.limit is not None and games >= args.limit:
+                    break
+                try:
+                    chess_pgn.replay(position, headers, movetext)
+                except chess_pgn.PGNError:
+                    continue
+                moves = [record[:3] for record in position.undo_stack]
+                result = headers.get('Result', '*')
+                f.write(encode_game(moves, headers.get('FEN'), result if result in RESULTS else '*', args.interval))
+                games += 1
+                plies += len(moves)
+        print(f'{games} games, {plies} plies in {time.perf_counter() - started:.1f}s')
+        return 0
+
+    started = time.perf_counter()
+    archive = Archive(args.archive)
+    opened = time.perf_counter() - started
+    plies = sum(len(archive[index]) for index in range(len(archive)))
+    size = os.path.getsize(args.archive)
+    print(f'{len(archive)} games, {plies} plies, {size} bytes ({size / max(plies, 1):.2f} bytes/ply), '
+          f'indexed in {opened * 1000:.1f} ms')
+    if args.bench and len(archive):
+        game = max((archive[index] for index in range(len(archive))), key=len)
+        position = Position()
+        started = time.perf_counter()
+        for ply in range(game.plies + 1):
+            game.position_at(ply, position)
+        seek = (time.perf_counter() - started) / (game.plies + 1)
+        started = time.perf_counter()
+        for ply in range(0, game.plies + 1, max(1, game.plies // 20)):
+            position.set_fen(game.start_fen)
+            for played in range(ply):
+                position.make_move(*game.move(played))
+        replays = len(range(0, game.plies + 1, max(1, game.plies // 20)))
+        replay = (time.perf_counter() - started) / replays
+        print(f'longest game {game.plies} plies: seek {seek * 1000:.2f} ms per ply, '
+              f'replaying from the start {replay * 1000:.2f} ms on average')
+    archive.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
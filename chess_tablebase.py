@@ -0,0 +1,297 @@
+"""Endgame tablebases for king and one piece against a lone king (KQK, KRK, KPK).
+
+Tables follow this game's rules, not standard chess: the game is won by
+capturing the king, so a side whose every move leaves its king to be
+captured has lost, in check or not. "Mated" below covers stalemate too,
+and in KPK a strong side boxed in by its own pawn can be mated by the
+lone king.
+
+Tables are built offline by retrograde analysis: start from the mated
+positions and walk the move graph backwards, one ply per layer, with
+NumPy doing the layer updates. Each table is a uint8 array over a simple
+index
+
+    ((side_to_move * 64 + strong_king) * 64 + lone_king) * 64 + piece
+
+holding 0 for draws (and unreachable indices) or plies-to-mate + 1. The
+side to move wins when plies-to-mate is odd and is mated when it is even.
+Positions where the lone king is in check with the strong side to move
+are not covered (the king is simply captured). KPK is built after KQK
+and KRK, which it continues into after promotion to a queen or a rook.
+
+Tables are saved as .npy files and probed through np.load(mmap_mode='r'),
+so a probe is a single array read with nothing loaded up front.
+
+    python chess_tablebase.py build [directory]      # writes KQK.npy, KRK.npy, KPK.npy
+    python chess_tablebase.py probe directory "<fen>"
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from chess_bitboard import KING_ATTACKS, SQUARE_INDEX, squares_of
+
+TABLES = ('KQK', 'KRK', 'KPK')
+PIECES = {'KQK': 'queen', 'KRK': 'rook', 'KPK': 'pawn'}
+SIZE = 2 * 64 * 64 * 64
+WHITE, BLACK = 0, 1
+
+KING_MOVES = [[y*8 + x for x, y in squares_of(KING_ATTACKS[sq])] for sq in range(64)]
+ROOK_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def _rays(directions):
+    table = []
+    for sq in range(64):
+        rays = []
+        for dx, dy in directions:
+            x, y, ray = sq % 8 + dx, sq // 8 + dy, []
+            while 0 <= x <= 7 and 0 <= y <= 7:
+                ray.append(y*8 + x)
+                x, y = x + dx, y + dy
+            rays.append(ray)
+        table.append(rays)
+    return table
+
+
+RAYS = {'queen': _rays(QUEEN_DIRECTIONS), 'rook': _rays(ROOK_DIRECTIONS)}
+
+
+def index(side, strong_king, lone_king, piece):
+    return ((side * 64 + strong_king) * 64 + lone_king) * 64 + piece
+
+
+def _adjacent(a, b):
+    return abs(a % 8 - b % 8) <= 1 and abs(a // 8 - b // 8) <= 1
+
+
+def _piece_targets(piece, sq, blockers):
+    """Squares the strong piece moves to (or attacks), stopping at blockers"""
+    if piece == 'pawn':
+        # The strong side moves up the board (towards row 0)
+        return [sq - 8] if sq - 8 not in blockers else []
+    targets = []
+    for ray in RAYS[piece][sq]:
+        for target in ray:
+            targets.append(target)
+            if target in blockers:
+                break
+    return targets
+
+
+def _attacks(piece, sq, target, blockers):
+    if piece == 'pawn':
+        return sq // 8 - 1 == target // 8 and abs(sq % 8 - target % 8) == 1
+    return target in _piece_targets(piece, sq, blockers)
+
+
+def _squares(piece):
+    return range(8, 56) if piece == 'pawn' else range(64)
+
+
+def _build_graph(piece):
+    """Forward move graph as edge arrays, plus per-position move counts
+
+    Returns (legal, moves, edges, promotions): moves counts the moves of the
+    side to move that keep its king safe; edges is a (from, to) pair of
+    index arrays over all of them except captures of the strong piece (which
+    leave bare kings, a draw) and promotions; promotions lists (white index,
+    lone-king-to-move index after promoting), each standing for a queen and
+    a rook promotion.
+    """
+    legal = np.zeros(SIZE, dtype=bool)
+    moves = np.zeros(SIZE, dtype=np.int16)
+    edges_from, edges_to = [], []
+    promotions = []
+    for wk in range(64):
+        for bk in range(64):
+            if _adjacent(wk, bk):
+                continue
+            for x in _squares(piece):
+                if x == wk or x == bk:
+                    continue
+                # Lone king to move: it may be in check
+                b = index(BLACK, wk, bk, x)
+                legal[b] = True
+                for target in KING_MOVES[bk]:
+                    if _adjacent(target, wk) or (target != x and _attacks(piece, x, target, {wk})):
+                        continue
+                    moves[b] += 1
+                    if target != x:
+                        edges_from.append(b)
+                        edges_to.append(index(WHITE, wk, target, x))
+                    # Taking the piece (when it is undefended) leaves a bare-kings draw
+
+                # Strong side to move: a lone king in check would just be captured
+                if _attacks(piece, x, bk, {wk}):
+                    continue
+                w = index(WHITE, wk, bk, x)
+                legal[w] = True
+                for target in KING_MOVES[wk]:
+                    if target != x and not _adjacent(target, bk):
+                        moves[w] += 1
+                        edges_from.append(w)
+                        edges_to.append(index(BLACK, target, bk, x))
+                targets = _piece_targets(piece, x, {wk, bk})
+                if piece == 'pawn' and x // 8 == 6 and targets and x - 16 not in (wk, bk):
+                    targets.append(x - 16)
+                for target in targets:
+                    if target == wk or target == bk:
+                        continue
+                    if piece == 'pawn' and target < 8:
+                        moves[w] += 2
+                        promotions.append((w, index(BLACK, wk, bk, target)))
+                    else:
+                        moves[w] += 1
+                        edges_from.append(w)
+                        edges_to.append(index(BLACK, wk, bk, target))
+    edges = (np.array(edges_from, dtype=np.int32), np.array(edges_to, dtype=np.int32))
+    return legal, moves, edges, promotions
+
+
+def _predecessors(edges):
+    """CSR lists of move origins per destination"""
+    origins, destinations = edges
+    order = np.argsort(destinations, kind='stable')
+    pointers = np.zeros(SIZE + 1, dtype=np.int64)
+    np.cumsum(np.bincount(destinations, minlength=SIZE), out=pointers[1:])
+    return pointers, origins[order]
+
+
+def _gather(csr, frontier):
+    pointers, origins = csr
+    starts, lengths = pointers[frontier], pointers[frontier + 1] - pointers[frontier]
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int32)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+    return origins[offsets]
+
+
+def build(name, directory='.'):
+    """Generate one table (KPK needs KQK and KRK in directory) and save it"""
+    piece = PIECES[name]
+    legal, moves, edges, promotions = _build_graph(piece)
+    into = _predecessors(edges)  # position -> positions moving there
+
+    plies = np.full(SIZE, -1, dtype=np.int16)
+    # Promotions continue into the finished tables, where the lone king to
+    # move is mated (value - 1 even) or mates (odd) in value - 1 plies; the
+    # promoting position is then one ply further from the same end
+    wins, losses = {}, {}
+    if promotions:
+        after = [np.load(os.path.join(directory, f'{table}.npy'), mmap_mode='r') for table in ('KQK', 'KRK')]
+        for w, b in promotions:
+            for table in after:
+                value = int(table[b])
+                if value:
+                    (wins if (value - 1) % 2 == 0 else losses).setdefault(value, []).append(w)
+    wins = {depth: np.array(sorted(set(found)), dtype=np.int32) for depth, found in wins.items()}
+    losses = {depth: np.array(found, dtype=np.int32) for depth, found in losses.items()}
+
+    # The game is won by capturing the king, so a side with no safe move is
+    # lost whether or not it is in check: stalemate is mate here
+    remaining = moves.astype(np.int32)
+    frontier = np.flatnonzero(legal & (moves == 0)).astype(np.int32)
+    plies[frontier] = 0
+    depth = 0
+    while len(frontier) or any(d > depth for d in (*wins, *losses)):
+        depth += 1
+        origins = _gather(into, frontier)
+        if depth % 2:
+            # Wins: any move reaching a position lost for the side to move there
+            if depth in wins:
+                origins = np.concatenate([origins, wins[depth]])
+            origins = np.unique(origins)
+            frontier = origins[plies[origins] < 0]
+        else:
+            # Losses: once every safe move reaches a win for the other side
+            if depth in losses:
+                origins = np.concatenate([origins, losses[depth]])
+            np.subtract.at(remaining, origins, 1)
+            origins = np.unique(origins)
+            frontier = origins[(remaining[origins] == 0) & (plies[origins] < 0)]
+        plies[frontier] = depth
+
+    table = np.where(plies >= 0, plies + 1, 0).astype(np.uint8)
+    np.save(os.path.join(directory, f'{name}.npy'), table)
+    return table
+
+
+# PROBING
+class Tablebases:
+    """Memory-mapped tables from a directory, probed straight from a Position"""
+
+    def __init__(self, directory):
+        self.tables = {}
+        for name in TABLES:
+            path = os.path.join(directory, f'{name}.npy')
+            if os.path.exists(path):
+                self.tables[PIECES[name]] = np.load(path, mmap_mode='r')
+
+    def probe(self, position):
+        """(result, plies) for the side to move, or None if not covered
+
+        result is 1 (wins, mating in plies), 0 (draw) or -1 (mated in plies).
+        A lone king left in check reads as a draw: the caller should capture it.
+        """
+        if len(position.white_pieces) + len(position.black_pieces) != 3:
+            return None
+        strong = 'white' if len(position.white_pieces) == 2 else 'black'
+        lone = 'black' if strong == 'white' else 'white'
+        pieces = position.pieces(strong)
+        piece = pieces[0] if pieces[0] != 'king' else pieces[1]
+        table = self.tables.get(piece)
+        castling = position.castling(strong)
+        if table is None or (not castling[0] and not (castling[1] and castling[2])):
+            return None
+        locations = position.locations(strong)
+        king = SQUARE_INDEX[locations[pieces.index('king')]]
+        other = SQUARE_INDEX[locations[1 - pieces.index('king')]]
+        lone_king = SQUARE_INDEX[position.locations(lone)[0]]
+        if strong == 'black':
+            # Mirror top to bottom so the strong side moves up the board
+            king, other, lone_king = king ^ 56, other ^ 56, lone_king ^ 56
+        value = int(table[index(WHITE if position.turn == strong else BLACK, king, lone_king, other)])
+        if not value:
+            return 0, 0
+        plies = value - 1
+        return (1 if plies % 2 else -1), plies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or probe the endgame tablebases')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_command = commands.add_parser('build', help='generate KQK, KRK and KPK')
+    build_command.add_argument('directory', nargs='?', default='tablebases')
+    probe_command = commands.add_parser('probe', help='look up a FEN position')
+    probe_command.add_argument('directory')
+    probe_command.add_argument('fen')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        os.makedirs(args.directory, exist_ok=True)
+        for name in TABLES:
+            started = time.perf_counter()
+            table = build(name, args.directory)
+            decisive = table[table > 0]
+            print(f'{name}: {np.count_nonzero(table)} decisive positions, longest mate {int(decisive.max()) - 1} plies, '
+                  f'{time.perf_counter() - started:.1f}s')
+        return 0
+
+    from chess_position import Position
+    result = Tablebases(args.directory).probe(Position.from_fen(args.fen))
+    if result is None:
+        print('not covered')
+    else:
+        outcome, plies = result
+        print({1: f'win, mate in {plies} plies', 0: 'draw', -1: f'loss, mated in {plies} plies'}[outcome])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""Engine-versus-engine self-play across a pool of processes, with SPRT stopping.
+
+Two players, A and B, are engine settings (time per move, depth, which
+evaluation, tablebases). Games are played in pairs from the same opening
+with colours swapped, the openings drawn at random from a position list
+and optionally pushed on by a few random moves. Every finished game is
+appended to a JSON-lines file as it arrives, and after each one a
+sequential probability ratio test weighs "A is elo1 stronger than B"
+against "A is only elo0 stronger"; the run stops as soon as one wins.
+
+    python chess_tournament.py --a eval=evaluate --b eval=material --time 0.1 --games 400
+    python chess_tournament.py --openings openings.fen --random-plies 4 --output results.jsonl
+
+Games end on king capture like in chess.py, and are drawn by threefold
+repetition, the fifty-move rule, bare kings or the --max-plies limit.
+Throughput (games/minute) and per-move search times are reported at the end.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+import chess_engine
+import chess_eval
+from chess_game import Game
+from chess_position import START_FEN, move_name
+
+# Openings used when no --openings file is given, as FENs
+OPENINGS = [
+    START_FEN,
+    'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+    'rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+    'rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+    'rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+    'rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 0 2',
+    'rnbqkb1r/pppppppp/5n2/8/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 1 2',
+    'rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR b KQkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R b KQkq - 1 1',
+    'r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',
+    'rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5',
+    'rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 0 4',
+]
+
+# Player settings and their defaults; a --a/--b spec overrides some of them
+PLAYER_DEFAULTS = {'time': 0.1, 'depth': chess_engine.MAX_PLY - 1, 'eval': 'material', 'table': 16,
+                   'tablebases': None}
+
+# Per-process engines for A and B, set up by the pool initializer
+_players = None
+
+
+def parse_player(spec, time_limit):
+    """'eval=evaluate,depth=4' -> settings dict, starting from the defaults"""
+    player = dict(PLAYER_DEFAULTS, time=time_limit)
+    for item in filter(None, (spec or '').split(',')):
+        name, _, value = item.partition('=')
+        if name not in PLAYER_DEFAULTS:
+            raise ValueError(f'unknown player setting {name!r} (expected one of {", ".join(PLAYER_DEFAULTS)})')
+        if name == 'eval' and not callable(getattr(chess_eval, value, None)):
+            raise ValueError(f'chess_eval has no evaluation {value!r}')
+        player[name] = {'time': float, 'depth': int, 'table': int}.get(name, str)(value)
+    return player
+
+
+def _make_engine(player):
+    tablebases = None
+    if player['tablebases']:
+        import chess_tablebase
+        tablebases = chess_tablebase.Tablebases(player['tablebases'])
+    return chess_engine.Engine(player['table'], getattr(chess_eval, player['eval']), tablebases)
+
+
+def _init_worker(players):
+    global _players
+    _players = {name: (player, _make_engine(player)) for name, player in players.items()}
+
+
+def play_game(task):
+    """Play one game; returns the record written to the results file"""
+    number, fen, white, max_plies = task
+    game = Game(fen=fen)
+    position = game.position
+    sides = {'white': white, 'black': 'B' if white == 'A' else 'A'}
+    for _, engine in _players.values():
+        engine.table.clear()
+    times = {'A': [], 'B': []}
+    moves = []
+    reason = ''
+    started = time.perf_counter()
+    while not game.game_over:
+        if position.halfmove_clock >= 100:
+            game.winner, reason = 'draw', 'fifty moves'
+        elif len(position.white_pieces) + len(position.black_pieces) == 2:
+            game.winner, reason = 'draw', 'bare kings'
+        elif len(moves) >= max_plies:
+            game.winner, reason = 'draw', 'move limit'
+        if game.game_over:
+            break
+        name = sides[position.turn]
+        player, engine = _players[name]
+        info = engine.search(position, player['time'], player['depth'])
+        times[name].append(info['time'])
+        if info['move'] is None:
+            game.winner, reason = 'draw', 'no moves'
+            break
+        moves.append(move_name(info['move']))
+        if game.play(*info['move']) == 'king':
+            reason = 'king captured'
+        elif game.winner == 'draw':
+            reason = 'repetition'
+    return {'game': number, 'opening': fen, 'white': sides['white'], 'black': sides['black'],
+            'result': game.result(), 'winner': sides.get(game.winner, 'draw'), 'reason': reason,
+            'plies': len(moves), 'seconds': round(time.perf_counter() - started, 3),
+            'moves': ' '.join(moves), 'times': times}
+
+
+# OPENINGS
+def load_openings(path):
+    """FENs from a file, one per line; blank lines and # comments are skipped"""
+    with open(path) as f:
+        return [line.split('#')[0].strip() for line in f if line.split('#')[0].strip()]
+
+
+def randomise(fen, plies, rng):
+    """fen after up to plies random legal moves"""
+    game = Game(fen=fen)
+    for _ in range(plies):
+        moves = game.position.legal_moves()
+        if not moves:
+            break
+        game.play(*rng.choice(moves))
+    return game.position.to_fen()
+
+
+def schedule(openings, games, random_plies, max_plies, seed):
+    """Game tasks in pairs: the same opening with A as white, then as black"""
+    rng = random.Random(seed)
+    pool = []
+    tasks = []
+    for number in range(0, games, 2):
+        if not pool:
+            pool = openings[:]
+            rng.shuffle(pool)
+        fen = randomise(pool.pop(), random_plies, rng)
+        tasks.append((number + 1, fen, 'A', max_plies))
+        if number + 1 < games:
+            tasks.append((number + 2, fen, 'B', max_plies))
+    return tasks
+
+
+# STATISTICS
+def score(wins, losses, draws):
+    games = wins + losses + draws
+    return (wins + draws / 2) / games if games else 0.5
+
+
+def elo(points):
+    """Elo difference for an expected score"""
+    if points <= 0 or points >= 1:
+        return math.copysign(math.inf, points - 0.5)
+    return 400 * math.log10(points / (1 - points))
+
+
+def expected_score(elo_difference):
+    return 1 / (1 + 10 ** (-elo_difference / 400))
+
+
+def sprt_llr(wins, losses, draws, elo0, elo1):
+    """Log-likelihood ratio of elo1 against elo0 for A's results (GSPRT approximation)"""
+    if not wins + losses + draws:
+        return 0.0
+    if not wins + draws or not losses + draws or not wins + losses:
+        # Every game had the same result, so there is no variance to scale by;
+        # half a win and half a loss regularise it without moving the score much
+        wins, losses = wins + 0.5, losses + 0.5
+    games = wins + losses + draws
+    points = score(wins, losses, draws)
+    variance = (wins * (1 - points) ** 2 + draws * (0.5 - points) ** 2 + losses * points ** 2) / games
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    return games * (s1 - s0) * (2 * points - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def time_summary(times):
+    if not times:
+        return 'no moves'
+    ordered = sorted(times)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f'{len(times)} moves  mean {statistics.fmean(times) * 1000:.1f} ms  '
+            f'median {statistics.median(times) * 1000:.1f} ms  p95 {p95 * 1000:.1f} ms  '
+            f'max {ordered[-1] * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--a', default='', help='settings for player A, e.g. eval=evaluate,depth=4')
+    parser.add_argument('--b', default='', help='settings for player B')
+    parser.add_argument('--time', type=float, default=0.1, help='seconds per move for both players (default 0.1)')
+    parser.add_argument('--games', type=int, default=200, help='most games to play (default 200)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--openings', help='file of opening FENs (default: a built-in list)')
+    parser.add_argument('--random-plies', type=int, default=0, help='random moves added to each opening')
+    parser.add_argument('--max-plies', type=int, default=300, help='adjudicate a draw after this many plies')
+    parser.add_argument('--output', default='tournament.jsonl', help='results file, appended to')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the opening order')
+    parser.add_argument('--elo0', type=float, default=0.0, help='SPRT null hypothesis (default 0)')
+    parser.add_argument('--elo1', type=float, default=20.0, help='SPRT alternative hypothesis (default 20)')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--no-sprt', action='store_true', help='play every game')
+    args = parser.parse_args()
+
+    try:
+        players = {'A': parse_player(args.a, args.time), 'B': parse_player(args.b, args.time)}
+        openings = load_openings(args.openings) if args.openings else OPENINGS
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    if not openings:
+        parser.error('no openings')
+    tasks = schedule(openings, args.games, args.random_plies, args.max_plies, args.seed)
+    workers = args.workers or os.cpu_count() or 1
+    lower, upper = sprt_bounds(args.alpha, args.beta)
+    for name, player in players.items():
+        print(f'{name}: ' + ', '.join(f'{key}={value}' for key, value in player.items()))
+    print(f'{len(tasks)} games on {workers} workers, SPRT elo0 {args.elo0:g} elo1 {args.elo1:g} '
+          f'bounds [{lower:.2f}, {upper:.2f}], results to {args.output}')
+
+    wins = losses = draws = 0
+    times = {'A': [], 'B': []}
+    decision = None
+    started = time.perf_counter()
+    pool = multiprocessing.Pool(workers, _init_worker, (players,))
+    try:
+        with open(args.output, 'a') as output:
+            for record in pool.imap_unordered(play_game, tasks):
+                output.write(json.dumps(record) + '\n')
+                output.flush()
+                wins += record['winner'] == 'A'
+                losses += record['winner'] == 'B'
+                draws += record['winner'] == 'draw'
+                for name in times:
+                    times[name].extend(record['times'][name])
+                played = wins + losses + draws
+                llr = sprt_llr(wins, losses, draws, args.elo0, args.elo1)
+                elapsed = time.perf_counter() - started
+                print(f'game {record["game"]:4d} {record["result"]:7s} {record["reason"]:13s} '
+                      f'A +{wins} -{losses} ={draws}  score {score(wins, losses, draws):.1%}  '
+                      f'elo {elo(score(wins, losses, draws)):+.0f}  LLR {llr:+.2f}  '
+                      f'{played / elapsed * 60:.1f} games/min')
+                if not args.no_sprt:
+                    if llr >= upper:
+                        decision = f'H1 accepted: A is stronger by at least {args.elo1:g} elo'
+                    elif llr <= lower:
+                        decision = f'H0 accepted: A is not stronger by {args.elo1:g} elo'
+                    if decision:
+                        break
+    except KeyboardInterrupt:
+        decision = 'interrupted'
+    finally:
+        pool.terminate()
+        pool.join()
+
+    elapsed = time.perf_counter() - started
+    played = wins + losses + draws
+    print(decision or f'SPRT inconclusive after {played} games')
+    print(f'{played} games in {elapsed:.1f}s  {played / elapsed * 60 if elapsed else 0:.1f} games/min')
+    for name, player_times in times.items():
+        print(f'{name} move times: {time_summary(player_times)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
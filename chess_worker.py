@@ -0,0 +1,86 @@
+"""Engine analysis in a separate process, so the pygame loop never waits on a search.
+
+An AnalysisWorker owns one long-lived process with its own Engine (and so
+its own transposition table, which pondering keeps warm for the next
+search). Positions go in through a job queue; every completed depth and
+the final result come back through a result queue. Each job has an id,
+and cancel() stops the running search and drops anything older.
+"""
+import multiprocessing
+import pickle
+import queue
+
+import chess_engine
+
+# Pondering and hints run until cancelled
+ANALYSE_FOREVER = 24 * 60 * 60
+
+
+class _JobStop:
+    """Engine stop flag that is set once the job, or a newer one, is cancelled"""
+
+    def __init__(self, cancelled, job):
+        self.cancelled = cancelled
+        self.job = job
+
+    def is_set(self):
+        return self.cancelled.value >= self.job
+
+
+def _run(jobs, results, cancelled, table_bits, tablebases):
+    if tablebases is not None:
+        import chess_tablebase
+        tablebases = chess_tablebase.Tablebases(tablebases)
+    engine = chess_engine.Engine(table_bits, tablebases=tablebases)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, data, time_limit = job
+        if cancelled.value >= job_id:
+            continue
+        position = pickle.loads(data)
+        info = engine.search(position, time_limit, stop=_JobStop(cancelled, job_id),
+                             on_depth=lambda info: results.put((job_id, False, info)))
+        results.put((job_id, True, info))
+
+
+class AnalysisWorker:
+    def __init__(self, table_bits=18, tablebases=None):
+        """tablebases is a directory of chess_tablebase tables, opened in the worker"""
+        self.jobs = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.cancelled = multiprocessing.Value('l', 0)
+        self.job = 0
+        self.process = multiprocessing.Process(target=_run, daemon=True,
+                                               args=(self.jobs, self.results, self.cancelled, table_bits, tablebases))
+        self.process.start()
+
+    def analyse(self, position, time_limit=ANALYSE_FOREVER):
+        """Cancel the running search and start one on position; returns the job id"""
+        self.cancel()
+        self.job += 1
+        # Pickled now, as the caller keeps playing on this Position
+        self.jobs.put((self.job, pickle.dumps(position, pickle.HIGHEST_PROTOCOL), time_limit))
+        return self.job
+
+    def cancel(self):
+        self.cancelled.value = self.job
+
+    def poll(self):
+        """(done, info) updates for the current job since the last poll, without blocking"""
+        updates = []
+        while True:
+            try:
+                job, done, info = self.results.get_nowait()
+            except queue.Empty:
+                return updates
+            if job == self.job and job > self.cancelled.value:
+                updates.append((done, info))
+
+    def close(self):
+        self.cancel()
+        self.jobs.put(None)
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
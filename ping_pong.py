@@ -1,136 +1,73 @@
 import pygame
+import random
 import sys
 
-# --- Initialization ---
-pygame.init()
+import pong_ai
+import pong_record
+import pong_sim
+from pong_sim import BALL_SIZE, PADDLE_HEIGHT, PADDLE_MARGIN, PADDLE_WIDTH
+
+def option(name):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv[1:-1] else None
 
 # --- Constants ---
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
+SCREEN_WIDTH = pong_sim.WIDTH
+SCREEN_HEIGHT = pong_sim.HEIGHT
 SCREEN_SIZE = (SCREEN_WIDTH, SCREEN_HEIGHT)
 CAPTION = "Simple Pong"
-FPS = 60
+# Frames per second only; the game itself always runs at pong_sim.TICK_RATE
+FPS = int(option('--fps') or 60)
+# Longest stretch of real time simulated after a stall, so a hiccup is not followed by a burst
+MAX_FRAME_TIME = 0.25
+# --cpu LEVEL puts the computer on the right paddle (easy, normal, hard or perfect)
+CPU_LEVEL = option('--cpu')
+# --seed N replays the same serves; --record PATH saves the match's moves when the window closes
+SEED = pong_record.reduce_seed(int(option('--seed'))) if option('--seed') else random.randrange(2 ** 32)
+RECORD_FILE = option('--record')
+# --replay PATH re-plays a recorded match at display speed, starting --from SECONDS in
+REPLAY_FILE = option('--replay')
+REPLAY_FROM = float(option('--from') or 0)
 
 # Colors
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 
-# Paddle properties
-PADDLE_WIDTH = 15
-PADDLE_HEIGHT = 100
-PADDLE_SPEED = 7
-
-# Ball properties
-BALL_SIZE = 15
-BALL_SPEED_X = 5
-BALL_SPEED_Y = 5
-
-# --- Setup Screen and Clock ---
-screen = pygame.display.set_mode(SCREEN_SIZE)
-pygame.display.set_caption(CAPTION)
-clock = pygame.time.Clock()
-
-# --- Game Objects (Rectangles) ---
-
-# Paddles
-player1_paddle = pygame.Rect(50, SCREEN_HEIGHT // 2 - PADDLE_HEIGHT // 2, PADDLE_WIDTH, PADDLE_HEIGHT)
-player2_paddle = pygame.Rect(SCREEN_WIDTH - 50 - PADDLE_WIDTH, SCREEN_HEIGHT // 2 - PADDLE_HEIGHT // 2, PADDLE_WIDTH, PADDLE_HEIGHT)
-
-# Ball
-ball = pygame.Rect(SCREEN_WIDTH // 2 - BALL_SIZE // 2, SCREEN_HEIGHT // 2 - BALL_SIZE // 2, BALL_SIZE, BALL_SIZE)
-
-# Initial ball direction/velocity
-ball_speed_x = BALL_SPEED_X * (1 if pygame.time.get_ticks() % 2 == 0 else -1) # Start in a random horizontal direction
-ball_speed_y = BALL_SPEED_Y * (1 if pygame.time.get_ticks() % 3 != 0 else -1) # Start in a random vertical direction
-
-# Score (Not fully implemented for display, just variables)
-score1 = 0
-score2 = 0
+# --- Game State ---
+# Ball, paddles and score live in the simulation; this file only reads keys and draws
+if REPLAY_FILE:
+    recording = pong_record.Recording.load(REPLAY_FILE)
+    game = recording.new_game()
+    replay_moves = recording.moves()
+else:
+    game = pong_sim.Pong(random.Random(SEED))
+    replay_moves = None
+cpu = pong_ai.PaddleAI(2, CPU_LEVEL) if CPU_LEVEL and not REPLAY_FILE else None
+recorder = pong_record.Recorder(SEED)
 
 # --- Functions ---
 
-def move_paddles():
-    """Handles keyboard input for moving paddles."""
+def read_paddles():
+    """Reads the keyboard into a move (-1 up, 0, 1 down) for each paddle."""
     keys = pygame.key.get_pressed()
-    
-    # Player 1 controls (W/S)
-    if keys[pygame.K_w] and player1_paddle.top > 0:
-        player1_paddle.y -= PADDLE_SPEED
-    if keys[pygame.K_s] and player1_paddle.bottom < SCREEN_HEIGHT:
-        player1_paddle.y += PADDLE_SPEED
-
-    # Player 2 controls (Up/Down Arrows)
-    if keys[pygame.K_UP] and player2_paddle.top > 0:
-        player2_paddle.y -= PADDLE_SPEED
-    if keys[pygame.K_DOWN] and player2_paddle.bottom < SCREEN_HEIGHT:
-        player2_paddle.y += PADDLE_SPEED
-
-def move_ball():
-    """Updates the ball's position and handles wall collisions."""
-    global ball_speed_x, ball_speed_y
-    
-    ball.x += ball_speed_x
-    ball.y += ball_speed_y
-
-    # Collision with top/bottom walls
-    if ball.top <= 0 or ball.bottom >= SCREEN_HEIGHT:
-        ball_speed_y *= -1  # Reverse vertical direction
-
-    # Collision with left/right boundaries (Scoring)
-    if ball.left <= 0:
-        # Player 2 scores
-        global score2
-        score2 += 1
-        reset_ball()
-    
-    if ball.right >= SCREEN_WIDTH:
-        # Player 1 scores
-        global score1
-        score1 += 1
-        reset_ball()
-
-def check_paddle_collision():
-    """Handles ball collision with paddles and reverses horizontal direction."""
-    global ball_speed_x
-    
-    if ball.colliderect(player1_paddle) or ball.colliderect(player2_paddle):
-        # Only reverse if the ball is moving towards the paddle it hit
-        if ball_speed_x < 0 and ball.colliderect(player1_paddle):
-            ball_speed_x *= -1
-        elif ball_speed_x > 0 and ball.colliderect(player2_paddle):
-            ball_speed_x *= -1
-
-def reset_ball():
-    """Resets the ball to the center after a score."""
-    global ball_speed_x, ball_speed_y
-    ball.x = SCREEN_WIDTH // 2 - BALL_SIZE // 2
-    ball.y = SCREEN_HEIGHT // 2 - BALL_SIZE // 2
-    
-    # Optional: Slightly increase speed or change direction after reset
-    ball_speed_x *= (1 if pygame.time.get_ticks() % 2 == 0 else -1) * 1.05 # Increase speed slightly
-    ball_speed_y *= (1 if pygame.time.get_ticks() % 3 != 0 else -1) * 1.05
 
+    # Player 1 controls (W/S), Player 2 controls (Up/Down Arrows) unless the computer has it
+    move1 = keys[pygame.K_s] - keys[pygame.K_w]
+    move2 = keys[pygame.K_DOWN] - keys[pygame.K_UP]
+    return move1, move2
+
+def draw(previous, current, alpha):
+    """Draws the game between the last two ticks, alpha of the way to the newer one."""
+    ball_x, ball_y, paddle1_y, paddle2_y = (old + (new - old) * alpha for old, new in zip(previous, current))
+    # A point resets the ball to the centre; jump there rather than sliding across
+    if abs(current[0] - previous[0]) > SCREEN_WIDTH / 2:
+        ball_x, ball_y = current[:2]
 
-# --- Main Game Loop ---
-running = True
-while running:
-    # 1. Event Handling
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    # 2. Game Logic Updates
-    move_paddles()
-    move_ball()
-    check_paddle_collision()
-    
-    # 3. Drawing/Rendering
     screen.fill(BLACK) # Clear screen
 
     # Draw Paddles and Ball
-    pygame.draw.rect(screen, WHITE, player1_paddle)
-    pygame.draw.rect(screen, WHITE, player2_paddle)
-    pygame.draw.ellipse(screen, WHITE, ball) # Draw ball as a circle/ellipse
+    pygame.draw.rect(screen, WHITE, (PADDLE_MARGIN, round(paddle1_y), PADDLE_WIDTH, PADDLE_HEIGHT))
+    pygame.draw.rect(screen, WHITE, (SCREEN_WIDTH - PADDLE_MARGIN - PADDLE_WIDTH, round(paddle2_y), PADDLE_WIDTH, PADDLE_HEIGHT))
+    pygame.draw.ellipse(screen, WHITE, (round(ball_x), round(ball_y), BALL_SIZE, BALL_SIZE)) # Draw ball as a circle/ellipse
 
     # Optional: Draw center line
     pygame.draw.aaline(screen, WHITE, (SCREEN_WIDTH // 2, 0), (SCREEN_WIDTH // 2, SCREEN_HEIGHT))
@@ -138,9 +75,61 @@ while running:
     # Update the display
     pygame.display.flip()
 
-    # Control frame rate
-    clock.tick(FPS)
 
-# --- Cleanup ---
-pygame.quit()
-sys.exit()
+# --- Main Game Loop ---
+if __name__ == '__main__':
+    # --- Initialization ---
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    pygame.display.set_caption(CAPTION)
+    clock = pygame.time.Clock()
+
+    # Jump to the highlight without drawing the ticks before it
+    if replay_moves is not None:
+        for _ in range(round(REPLAY_FROM * pong_sim.TICK_RATE)):
+            moves = next(replay_moves, None)
+            if moves is None:
+                break
+            game.step(*moves)
+
+    previous = current = game.positions()
+    accumulator = 0.0
+    running = True
+    while running:
+        # 1. Event Handling
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+        # 2. Game Logic Updates, in fixed ticks covering the real time since the last frame
+        accumulator += min(clock.tick(FPS) / 1000, MAX_FRAME_TIME)
+        move1, move2 = read_paddles()
+        while accumulator >= pong_sim.DT:
+            previous = game.positions()
+            if replay_moves is not None:
+                moves = next(replay_moves, None)
+                if moves is None:
+                    running = False
+                    break
+                move1, move2 = moves
+            # The computer decides every tick, like a player holding a key would
+            elif cpu:
+                move2 = cpu.move(game)
+            recorder.record(move1, move2)
+            game.step(move1, move2)
+            current = game.positions()
+            accumulator -= pong_sim.DT
+
+        # 3. Drawing/Rendering
+        draw(previous, current, accumulator / pong_sim.DT)
+
+    # --- Cleanup ---
+    if REPLAY_FILE:
+        exact = pong_record.state_digest(game) == recording.digest
+        print(f'replay {"ended exactly as recorded" if exact else "stopped early or differs from the recording"}')
+    else:
+        print(f'seed {SEED}: {game.score1}-{game.score2} after {game.ticks} ticks')
+        if RECORD_FILE:
+            recorder.save(RECORD_FILE, game)
+    pygame.quit()
+    sys.exit()
@@ -0,0 +1,125 @@
+"""A computer paddle that works out where the ball will arrive instead of chasing it.
+
+Between bounces the ball's path is a straight line folded back and forth
+between the top and bottom walls, so the height at which it reaches a
+paddle's face follows in closed form: unfold the walls, move the ball
+straight to the face, and fold the height back into the court. That only
+changes when the ball's velocity does (a paddle hit, a wall bounce, a
+serve), so PaddleAI predicts once per change and otherwise just steers
+towards the answer, a comparison or two per tick.
+
+Difficulty comes from being human about it: a reaction time before a
+new prediction is acted on, and an error, drawn once per prediction,
+in where the ball is expected.
+
+    python pong_ai.py [--left hard] [--right normal] [--games 200] [--points 5]
+"""
+import argparse
+import random
+import sys
+import time
+
+import pong_sim
+from pong_sim import BALL_SIZE, DT, HEIGHT, LEFT_FACE, PADDLE_HEIGHT, PADDLE_SPEED, RIGHT_FACE, TICK_RATE
+
+# Level -> (reaction time in seconds, standard deviation of the aim in px)
+LEVELS = {
+    'easy': (0.4, 80),
+    'normal': (0.25, 45),
+    'hard': (0.12, 25),
+    'perfect': (0.0, 0),
+}
+# Heights the ball's top edge moves between
+SPAN = HEIGHT - BALL_SIZE
+
+
+def intercept(ball_x, ball_y, ball_vx, ball_vy, x):
+    """(ball y, seconds) when the ball's left edge reaches x, bouncing off the walls on the way"""
+    seconds = max((x - ball_x) / ball_vx, 0.0) if ball_vx else 0.0
+    y = (ball_y + ball_vy * seconds) % (2 * SPAN)
+    return (y if y <= SPAN else 2 * SPAN - y), seconds
+
+
+class PaddleAI:
+    def __init__(self, side, level='normal', rng=None):
+        self.side = side
+        self.level = level
+        self.reaction, self.error = LEVELS[level]
+        self.rng = rng if rng is not None else random.Random()
+        self.velocity = None
+        self.target = HEIGHT / 2  # where the paddle's centre is heading
+        self.next_target = None  # a prediction not yet reacted to
+        self.wait = 0
+        self.predictions = 0
+
+    def _aim(self, game):
+        """Where to put the paddle's centre for the ball as it is moving now"""
+        if (game.ball_vx < 0) != (self.side == 1):
+            # Going away: wait in the middle
+            return HEIGHT / 2
+        face = LEFT_FACE if self.side == 1 else RIGHT_FACE - BALL_SIZE
+        y, _ = intercept(game.ball_x, game.ball_y, game.ball_vx, game.ball_vy, face)
+        aim = y + BALL_SIZE / 2
+        return aim + self.rng.gauss(0, self.error) if self.error else aim
+
+    def move(self, game):
+        """-1 (up), 0 or 1 (down) for this tick"""
+        velocity = (game.ball_vx, game.ball_vy)
+        if velocity != self.velocity:
+            self.velocity = velocity
+            self.predictions += 1
+            self.next_target = self._aim(game)
+            self.wait = round(self.reaction * TICK_RATE)
+        if self.next_target is not None:
+            if self.wait > 0:
+                self.wait -= 1
+            else:
+                self.target, self.next_target = self.next_target, None
+        paddle_y = game.paddle1_y if self.side == 1 else game.paddle2_y
+        distance = self.target - (paddle_y + PADDLE_HEIGHT / 2)
+        # Within a tick's travel is close enough; stepping past it would only shake
+        if abs(distance) < PADDLE_SPEED * DT:
+            return 0
+        return 1 if distance > 0 else -1
+
+
+def play(left, right, points=5, max_ticks=None, rng=None):
+    """Play one game between two PaddleAIs; returns (score 1, score 2, ticks)"""
+    game = pong_sim.Pong(rng)
+    while game.score1 < points and game.score2 < points:
+        if max_ticks is not None and game.ticks >= max_ticks:
+            break
+        game.step(left.move(game), right.move(game))
+    return game.score1, game.score2, game.ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless matches between computer paddles')
+    parser.add_argument('--left', choices=LEVELS, default='hard')
+    parser.add_argument('--right', choices=LEVELS, default='normal')
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--points', type=int, default=5, help='points to win a game (default 5)')
+    parser.add_argument('--max-ticks', type=int, default=5 * 60 * TICK_RATE,
+                        help='ticks before a game is called a draw (default five minutes)')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    wins = [0, 0, 0]  # left, right, unfinished
+    ticks = predictions = 0
+    started = time.perf_counter()
+    for _ in range(args.games):
+        left, right = PaddleAI(1, args.left, rng), PaddleAI(2, args.right, rng)
+        score1, score2, played = play(left, right, args.points, args.max_ticks, rng)
+        wins[0 if score1 >= args.points else 1 if score2 >= args.points else 2] += 1
+        ticks += played
+        predictions += left.predictions + right.predictions
+    elapsed = time.perf_counter() - started
+    print(f'{args.left} (left) {wins[0]} - {wins[1]} {args.right} (right), {wins[2]} unfinished')
+    print(f'{ticks} ticks ({ticks / TICK_RATE / 60:.0f} minutes of play) in {elapsed:.2f}s: '
+          f'{ticks / elapsed:.0f} ticks/s, {predictions / (2 * ticks):.4f} predictions per paddle per tick')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
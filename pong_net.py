@@ -0,0 +1,542 @@
+"""Pong for two machines: an authoritative server and clients over asyncio UDP.
+
+The server owns the game (a pong_sim.Pong ticking at TICK_RATE) and is
+the only place the ball moves. Each client sends its paddle moves, one per
+tick and numbered, and the server applies every move exactly once, in
+order. Packets are small and self-contained:
+
+    HELLO      client -> server   ask for a side
+    WELCOME    server -> client   side (1 left, 2 right) and send rate
+    INPUT      client -> server   the last moves not yet acknowledged (so a
+                                  lost packet is covered by the next ones), the
+                                  newest snapshot received, a timestamp
+    SNAPSHOT   server -> client   every SEND_EVERY ticks: ball, paddles and
+                                  scores, only the fields that differ from the
+                                  snapshot the client last acknowledged, plus
+                                  the last move applied and the echoed timestamp
+
+The client predicts its own paddle: it moves it as soon as a key is read,
+and on every snapshot rebuilds it from the server's position plus the
+moves the server has not applied yet. The ball and the other paddle are
+drawn INTERPOLATION ticks in the past, between the two snapshots around
+that moment, so they move smoothly whatever the send rate and jitter.
+
+Both ends count packets and bytes, round-trip time, lost and out-of-order
+snapshots and prediction corrections, and print them on exit. --lag,
+--jitter and --loss pass every outgoing packet through a simulated link,
+which is enough to try it all on one machine:
+
+    python pong_net.py server [--port 5005]
+    python pong_net.py client HOST [--port 5005] [--bot] [--headless]
+    python pong_net.py loopback [--seconds 10] --lag 60 --jitter 15 --loss 0.05
+"""
+import argparse
+import asyncio
+import random
+import struct
+import sys
+import time
+from collections import deque
+
+import pong_sim
+from pong_sim import BALL_SIZE, DT, HEIGHT, PADDLE_HEIGHT, PADDLE_MARGIN, PADDLE_WIDTH, RIGHT_FACE, TICK_RATE, WIDTH
+
+PORT = 5005
+SEND_EVERY = 4  # ticks between snapshots: 30 a second
+INTERPOLATION = 2 * SEND_EVERY + 4  # ticks the ball and the other paddle are drawn behind the server
+REDUNDANCY = 16  # moves repeated in each INPUT packet until acknowledged
+TIMEOUT = 5.0  # seconds of silence before a player's side is given up
+HISTORY = 2 * TICK_RATE  # ticks of snapshots kept as delta baselines
+MAX_FRAME_TIME = 0.25
+
+HELLO, WELCOME, INPUT, SNAPSHOT = 1, 2, 3, 4
+WELCOME_PACKET = struct.Struct('>BBB')  # type, side, send every
+INPUT_HEADER = struct.Struct('>BIBII')  # type, first move's number, moves, snapshot acknowledged, time (ms)
+SNAPSHOT_HEADER = struct.Struct('>BIIIIHB')  # type, tick, baseline tick, last move applied, echoed time, held (ms), fields
+FIELD = struct.Struct('>H')
+# Snapshot fields, positions in 1/16 px
+FIELDS = ('ball_x', 'ball_y', 'paddle1_y', 'paddle2_y', 'score1', 'score2')
+SCALE = 16
+
+
+def _state(game):
+    """The snapshot fields of a game, quantised"""
+    return (round(game.ball_x * SCALE), round(game.ball_y * SCALE), round(game.paddle1_y * SCALE),
+            round(game.paddle2_y * SCALE), game.score1 & 0xFFFF, game.score2 & 0xFFFF)
+
+
+def encode_snapshot(tick, state, baseline_tick, baseline, ack, echo, held):
+    """A SNAPSHOT packet carrying the fields of state that differ from baseline (all of them without one)"""
+    mask, values = 0, []
+    for field, value in enumerate(state):
+        if baseline is None or baseline[field] != value:
+            mask |= 1 << field
+            values.append(FIELD.pack(value))
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT, tick, baseline_tick if baseline is not None else 0, ack, echo, held, mask)
+    return header + b''.join(values)
+
+
+def decode_snapshot(packet, baselines):
+    """(tick, baseline tick, state, ack, echo, held) of a SNAPSHOT packet, or None if its baseline is not in baselines"""
+    _, tick, baseline_tick, ack, echo, held, mask = SNAPSHOT_HEADER.unpack_from(packet)
+    if baseline_tick:
+        baseline = baselines.get(baseline_tick)
+        if baseline is None:
+            return None
+        state = list(baseline)
+    else:
+        state = [0] * len(FIELDS)
+    at = SNAPSHOT_HEADER.size
+    for field in range(len(FIELDS)):
+        if mask >> field & 1:
+            state[field] = FIELD.unpack_from(packet, at)[0]
+            at += FIELD.size
+    return tick, baseline_tick, tuple(state), ack, echo, held
+
+
+class Link:
+    """Sends datagrams, through a simulated lag, jitter and packet loss when asked"""
+
+    def __init__(self, metrics, lag=0.0, jitter=0.0, loss=0.0, seed=None):
+        self.metrics = metrics
+        self.lag, self.jitter, self.loss = lag, jitter, loss
+        self.rng = random.Random(seed)
+        self.transport = None
+
+    def send(self, data, addr=None):
+        self.metrics.sent(len(data))
+        if self.loss and self.rng.random() < self.loss:
+            self.metrics.simulated_losses += 1
+            return
+        delay = self.lag + self.rng.uniform(-self.jitter, self.jitter) if self.lag or self.jitter else 0
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._send, data, addr)
+        else:
+            self._send(data, addr)
+
+    def _send(self, data, addr):
+        if not self.transport.is_closing():
+            self.transport.sendto(data, addr)
+
+
+class Metrics:
+    def __init__(self, client):
+        self.client = client  # clients receive snapshots, the server sends them
+        self.started = time.perf_counter()
+        self.packets_out = self.bytes_out = self.packets_in = self.bytes_in = 0
+        self.simulated_losses = 0
+        self.rtts = deque(maxlen=1000)
+        self.snapshots = self.deltas = self.lost_snapshots = self.late_snapshots = self.undecodable = 0
+        self.full_bytes = self.snapshot_bytes = 0
+        self.corrections = 0
+        self.correction_total = 0.0
+        self.skipped_moves = 0
+
+    def sent(self, size):
+        self.packets_out += 1
+        self.bytes_out += size
+
+    def received(self, size):
+        self.packets_in += 1
+        self.bytes_in += size
+
+    def rtt(self):
+        """(mean, 95th percentile) round trip in ms, or None before the first sample"""
+        if not self.rtts:
+            return None
+        ordered = sorted(self.rtts)
+        return sum(ordered) / len(ordered), ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        lines = [f'{elapsed:.1f}s: out {self.packets_out} packets, {self.bytes_out * 8 / elapsed / 1000:.1f} kbit/s; '
+                 f'in {self.packets_in} packets, {self.bytes_in * 8 / elapsed / 1000:.1f} kbit/s'
+                 + (f'; {self.simulated_losses} dropped by the simulated link' if self.simulated_losses else '')]
+        if self.snapshots:
+            lines.append(f'snapshots {self.snapshots} ({self.deltas} deltas), {self.snapshot_bytes / self.snapshots:.1f} '
+                         f'bytes each against {self.full_bytes / self.snapshots:.1f} sent whole'
+                         + (f'; {self.lost_snapshots} lost, {self.late_snapshots} out of order, '
+                            f'{self.undecodable} without their baseline' if self.client else ''))
+        rtt = self.rtt()
+        if rtt:
+            lines.append(f'round trip {rtt[0]:.1f} ms mean, {rtt[1]:.1f} ms 95th percentile')
+        if self.client:
+            mean = self.correction_total / self.corrections if self.corrections else 0.0
+            lines.append(f'prediction corrections {self.corrections} (mean {mean:.2f} px)')
+        if self.skipped_moves:
+            lines.append(f'moves never received {self.skipped_moves}')
+        return '\n'.join(lines)
+
+
+class Player:
+    def __init__(self, side, addr, now):
+        self.side = side
+        self.addr = addr
+        self.heard = now
+        self.moves = {}  # move number -> move, waiting to be applied
+        self.newest = 0  # highest move number received
+        self.applied = 0  # last move number applied
+        self.snapshot_ack = 0
+        self.echo = 0
+        self.echo_heard = now
+
+
+class Server(asyncio.DatagramProtocol):
+    def __init__(self, link, send_every=SEND_EVERY):
+        self.link = link
+        self.metrics = link.metrics
+        self.send_every = send_every
+        self.game = pong_sim.Pong()
+        self.players = {}  # addr -> Player
+        self.history = {}  # tick -> state
+        self.tick = 0
+
+    def connection_made(self, transport):
+        self.link.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.metrics.received(len(data))
+        now = time.perf_counter()
+        kind = data[0] if data else None
+        player = self.players.get(addr)
+        if kind == HELLO:
+            if player is None:
+                taken = {other.side for other in self.players.values()}
+                free = [side for side in (1, 2) if side not in taken]
+                if not free:
+                    return
+                player = self.players[addr] = Player(free[0], addr, now)
+                print(f'player {player.side} joined from {addr[0]}:{addr[1]}')
+            player.heard = now
+            self.link.send(WELCOME_PACKET.pack(WELCOME, player.side, self.send_every), addr)
+        elif kind == INPUT and player is not None and len(data) >= INPUT_HEADER.size:
+            _, first, count, snapshot_ack, echo = INPUT_HEADER.unpack_from(data)
+            moves = struct.unpack_from(f'>{count}b', data, INPUT_HEADER.size)
+            player.heard = now
+            for number, move in enumerate(moves, first):
+                if number > player.applied:
+                    player.moves[number] = max(-1, min(1, move))
+            player.newest = max(player.newest, first + count - 1)
+            player.snapshot_ack = max(player.snapshot_ack, snapshot_ack)
+            if echo != player.echo:
+                player.echo, player.echo_heard = echo, now
+
+    def _next_moves(self, player):
+        """The moves to apply this tick: the next one in order, and one more if they are piling up"""
+        moves = []
+        while len(moves) < 2:
+            number = player.applied + 1
+            if number in player.moves:
+                moves.append(player.moves.pop(number))
+            elif player.newest >= number + REDUNDANCY:
+                # Every packet that carried it is lost or late; it is never coming
+                self.metrics.skipped_moves += 1
+            else:
+                break
+            player.applied = number
+            if player.newest - player.applied <= 2:
+                break
+        return moves
+
+    def step(self):
+        now = time.perf_counter()
+        for addr, player in list(self.players.items()):
+            if now - player.heard > TIMEOUT:
+                print(f'player {player.side} timed out')
+                del self.players[addr]
+                self.game = pong_sim.Pong()
+        self.tick += 1
+        playing = len(self.players) == 2
+        for player in self.players.values():
+            for move in self._next_moves(player):
+                if player.side == 1:
+                    self.game.paddle1_y = pong_sim.move_paddle(self.game.paddle1_y, move)
+                else:
+                    self.game.paddle2_y = pong_sim.move_paddle(self.game.paddle2_y, move)
+        # The ball waits in the middle for both players
+        if playing:
+            self.game.step()
+        if self.tick % self.send_every:
+            return
+        state = _state(self.game)
+        self.history[self.tick] = state
+        for old in [old for old in self.history if old <= self.tick - HISTORY]:
+            del self.history[old]
+        for player in self.players.values():
+            baseline = self.history.get(player.snapshot_ack)
+            held = min(int((now - player.echo_heard) * 1000), 0xFFFF)
+            packet = encode_snapshot(self.tick, state, player.snapshot_ack, baseline, player.applied, player.echo, held)
+            self.metrics.snapshots += 1
+            self.metrics.deltas += baseline is not None
+            self.metrics.snapshot_bytes += len(packet)
+            self.metrics.full_bytes += SNAPSHOT_HEADER.size + FIELD.size * len(FIELDS)
+            self.link.send(packet, player.addr)
+
+    async def run(self, seconds=None):
+        loop = asyncio.get_running_loop()
+        started = next_tick = loop.time()
+        while seconds is None or loop.time() - started < seconds:
+            self.step()
+            next_tick += DT
+            # After a stall, carry on from now rather than racing to catch up
+            next_tick = max(next_tick, loop.time() - MAX_FRAME_TIME)
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+
+class Client(asyncio.DatagramProtocol):
+    def __init__(self, link):
+        self.link = link
+        self.metrics = link.metrics
+        self.side = None
+        self.send_every = SEND_EVERY
+        self.started = time.perf_counter()
+        self.waiting = 0  # ticks spent asking for a side
+        self.number = 0  # last move number sent
+        self.moves = {}  # move number -> move, until the server has applied it
+        self.predictions = {}  # move number -> where the paddle was predicted to be after it
+        self.applied = 0
+        self.paddle_y = (HEIGHT - PADDLE_HEIGHT) / 2
+        self.snapshots = {}  # tick -> state
+        self.first = self.newest = 0  # first and newest snapshot ticks
+        self.offset = None  # server tick minus local time in ticks, smoothed
+
+    def connection_made(self, transport):
+        self.link.transport = transport
+
+    def _ms(self):
+        return int((time.perf_counter() - self.started) * 1000) & 0xFFFFFFFF
+
+    def datagram_received(self, data, addr):
+        self.metrics.received(len(data))
+        if not data:
+            return
+        if data[0] == WELCOME and len(data) >= WELCOME_PACKET.size and self.side is None:
+            _, self.side, self.send_every = WELCOME_PACKET.unpack_from(data)
+        elif data[0] == SNAPSHOT and len(data) >= SNAPSHOT_HEADER.size:
+            self._snapshot(data)
+
+    def _snapshot(self, data):
+        decoded = decode_snapshot(data, self.snapshots)
+        if decoded is None:
+            self.metrics.undecodable += 1
+            return
+        tick, baseline_tick, state, ack, echo, held = decoded
+        self.metrics.snapshots += 1
+        self.metrics.snapshot_bytes += len(data)
+        self.metrics.full_bytes += SNAPSHOT_HEADER.size + FIELD.size * len(FIELDS)
+        self.metrics.deltas += baseline_tick != 0
+        if echo:
+            self.metrics.rtts.append(max(0, self._ms() - echo - held))
+        self.snapshots[tick] = state
+        self.first = self.first or tick
+        self.metrics.lost_snapshots = max(0, (max(tick, self.newest) - self.first) // self.send_every + 1
+                                          - self.metrics.snapshots)
+        if tick < self.newest:
+            self.metrics.late_snapshots += 1
+            return
+        self.newest = tick
+        for old in [old for old in self.snapshots if old < tick - HISTORY]:
+            del self.snapshots[old]
+        sample = tick - time.perf_counter() * TICK_RATE
+        self.offset = sample if self.offset is None else self.offset + (sample - self.offset) * 0.05
+        if self.side is not None and ack >= self.applied:
+            self._reconcile(state[1 + self.side] / SCALE, ack)
+
+    def _reconcile(self, server_y, ack):
+        """Restart the prediction from the server's paddle and replay the moves it has not applied"""
+        predicted = self.predictions.get(ack)
+        if predicted is not None and abs(predicted - server_y) > 0.5 / SCALE:
+            self.metrics.corrections += 1
+            self.metrics.correction_total += abs(predicted - server_y)
+        for number in [number for number in self.moves if number <= ack]:
+            del self.moves[number]
+            self.predictions.pop(number, None)
+        self.applied = ack
+        self.paddle_y = server_y
+        for number in sorted(self.moves):
+            self.paddle_y = pong_sim.move_paddle(self.paddle_y, self.moves[number])
+            self.predictions[number] = self.paddle_y
+
+    def tick(self, move):
+        """One tick of local play: predict the paddle and send the move"""
+        if self.side is None:
+            if self.waiting % (TICK_RATE // 10) == 0:
+                self.link.send(bytes([HELLO]))
+            self.waiting += 1
+            return
+        self.number += 1
+        self.moves[self.number] = move
+        self.paddle_y = pong_sim.move_paddle(self.paddle_y, move)
+        self.predictions[self.number] = self.paddle_y
+        first = max(self.applied + 1, self.number - REDUNDANCY + 1)
+        moves = [self.moves[number] for number in range(first, self.number + 1)]
+        self.link.send(INPUT_HEADER.pack(INPUT, first, len(moves), self.newest, self._ms())
+                       + struct.pack(f'>{len(moves)}b', *moves))
+
+    def view(self):
+        """(ball x, ball y, paddle 1 y, paddle 2 y, score 1, score 2) to draw now, or None before any snapshot"""
+        if not self.snapshots:
+            return None
+        target = time.perf_counter() * TICK_RATE + self.offset - INTERPOLATION
+        ticks = sorted(self.snapshots)
+        older = max((tick for tick in ticks if tick <= target), default=ticks[0])
+        newer = min((tick for tick in ticks if tick > target), default=older)
+        a, b = self.snapshots[older], self.snapshots[newer]
+        alpha = (target - older) / (newer - older) if newer > older else 0.0
+        # A point resets the ball to the centre; jump there rather than sliding across
+        if abs(b[0] - a[0]) > WIDTH * SCALE / 2:
+            alpha = 1.0 if alpha > 0.5 else 0.0
+        x, y, paddle1_y, paddle2_y = ((old + (new - old) * alpha) / SCALE for old, new in zip(a[:4], b[:4]))
+        if self.side == 1:
+            paddle1_y = self.paddle_y
+        elif self.side == 2:
+            paddle2_y = self.paddle_y
+        latest = self.snapshots[self.newest]
+        return x, y, paddle1_y, paddle2_y, latest[4], latest[5]
+
+    def bot_move(self):
+        """Follow the ball as it is drawn"""
+        view = self.view()
+        if view is None or self.side is None:
+            return 0
+        target = view[1] + (BALL_SIZE - PADDLE_HEIGHT) / 2
+        distance = target - self.paddle_y
+        return 0 if abs(distance) < 4 else (1 if distance > 0 else -1)
+
+    async def run(self, bot=False, headless=False, seconds=None):
+        if not headless:
+            import pygame
+            import text_cache
+            pygame.init()
+            screen = pygame.display.set_mode((WIDTH, HEIGHT))
+            pygame.display.set_caption('Pong (network)')
+            font = pygame.font.SysFont(None, 24)
+        loop = asyncio.get_running_loop()
+        started = last = loop.time()
+        accumulator = 0.0
+        running = True
+        while running and (seconds is None or loop.time() - started < seconds):
+            now = loop.time()
+            accumulator += min(now - last, MAX_FRAME_TIME)
+            last = now
+            move = 0
+            if not headless:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        running = False
+                keys = pygame.key.get_pressed()
+                move = (keys[pygame.K_s] or keys[pygame.K_DOWN]) - (keys[pygame.K_w] or keys[pygame.K_UP])
+            while accumulator >= DT:
+                self.tick(self.bot_move() if bot else move)
+                accumulator -= DT
+            if not headless:
+                self.draw(screen, font, pygame, text_cache)
+            await asyncio.sleep(max(0.0, DT - accumulator))
+        if not headless:
+            pygame.quit()
+
+    def draw(self, screen, font, pygame, text_cache):
+        white = (255, 255, 255)
+        screen.fill((0, 0, 0))
+        view = self.view()
+        if view is not None:
+            x, y, paddle1_y, paddle2_y, score1, score2 = view
+            pygame.draw.rect(screen, white, (PADDLE_MARGIN, round(paddle1_y), PADDLE_WIDTH, PADDLE_HEIGHT))
+            pygame.draw.rect(screen, white, (RIGHT_FACE, round(paddle2_y), PADDLE_WIDTH, PADDLE_HEIGHT))
+            pygame.draw.ellipse(screen, white, (round(x), round(y), BALL_SIZE, BALL_SIZE))
+            screen.blit(text_cache.render(font, f'{score1}   {score2}', white), (WIDTH // 2 - 24, 10))
+        pygame.draw.aaline(screen, white, (WIDTH // 2, 0), (WIDTH // 2, HEIGHT))
+        rtt = self.metrics.rtt()
+        status = (f'player {self.side}' if self.side else 'connecting...') + (f'  rtt {rtt[0]:.0f} ms' if rtt else '')
+        screen.blit(text_cache.render(font, status, (128, 128, 128)), (10, HEIGHT - 24))
+        pygame.display.flip()
+
+
+def link_options(parser):
+    parser.add_argument('--lag', type=float, default=0, help='simulated one-way delay of every packet sent, in ms')
+    parser.add_argument('--jitter', type=float, default=0, help='random +/- variation of the delay, in ms')
+    parser.add_argument('--loss', type=float, default=0, help='fraction of packets sent that are dropped')
+    parser.add_argument('--seed', type=int, help='seed for the simulated link')
+
+
+def make_link(args, client, seed_offset=0):
+    seed = None if args.seed is None else args.seed + seed_offset
+    return Link(Metrics(client), args.lag / 1000, args.jitter / 1000, args.loss, seed)
+
+
+async def serve(args):
+    loop = asyncio.get_running_loop()
+    server = Server(make_link(args, False))
+    transport, _ = await loop.create_datagram_endpoint(lambda: server, local_addr=(args.bind, args.port))
+    print(f'serving on {args.bind}:{args.port}')
+    try:
+        await server.run(args.seconds)
+    finally:
+        transport.close()
+        print('server\n' + server.metrics.summary())
+
+
+async def connect(args):
+    loop = asyncio.get_running_loop()
+    client = Client(make_link(args, True))
+    transport, _ = await loop.create_datagram_endpoint(lambda: client, remote_addr=(args.host, args.port))
+    try:
+        await client.run(args.bot, args.headless, args.seconds)
+    finally:
+        transport.close()
+        print(f'player {client.side}\n' + client.metrics.summary())
+
+
+async def loopback(args):
+    """A server and two bots on this machine, every link simulated"""
+    loop = asyncio.get_running_loop()
+    server = Server(make_link(args, False))
+    transport, _ = await loop.create_datagram_endpoint(lambda: server, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    clients, transports = [], [transport]
+    for index in range(2):
+        client = Client(make_link(args, True, index + 1))
+        client_transport, _ = await loop.create_datagram_endpoint(lambda: client, remote_addr=('127.0.0.1', port))
+        clients.append(client)
+        transports.append(client_transport)
+    try:
+        await asyncio.gather(server.run(args.seconds),
+                             *(client.run(bot=True, headless=index or not args.watch, seconds=args.seconds)
+                               for index, client in enumerate(clients)))
+    finally:
+        for each in transports:
+            each.close()
+    print(f'score {server.game.score1}-{server.game.score2} after {server.tick} ticks')
+    print('server\n' + server.metrics.summary())
+    for client in clients:
+        print(f'player {client.side}\n' + client.metrics.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Two-player Pong over UDP with an authoritative server')
+    commands = parser.add_subparsers(dest='command', required=True)
+    server = commands.add_parser('server', help='run the game for two clients')
+    server.add_argument('--bind', default='0.0.0.0')
+    server.add_argument('--port', type=int, default=PORT)
+    client = commands.add_parser('client', help='join a server')
+    client.add_argument('host')
+    client.add_argument('--port', type=int, default=PORT)
+    client.add_argument('--bot', action='store_true', help='let the computer play')
+    client.add_argument('--headless', action='store_true', help='no window (with --bot)')
+    test = commands.add_parser('loopback', help='a server and two bots on this machine')
+    test.add_argument('--watch', action='store_true', help="draw the first bot's view")
+    for command, seconds in ((server, None), (client, None), (test, 10.0)):
+        link_options(command)
+        command.add_argument('--seconds', type=float, default=seconds, help='stop after this long')
+    args = parser.parse_args()
+    if args.command == 'client' and args.headless and not args.bot:
+        parser.error('--headless needs --bot')
+    try:
+        asyncio.run({'server': serve, 'client': connect, 'loopback': loopback}[args.command](args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Pong matches recorded as a seed and the paddle moves of every tick.
+
+pong_sim is deterministic: the same seed and the same moves, tick for
+tick, give the same game down to the last bit of every float. So a match
+is saved as just that, and replaying it re-simulates it exactly. A
+recording is a header followed by the moves, run-length encoded:
+
+    header   magic, seed, ticks, final scores, CRC-32 of the final state
+    runs     one unsigned LEB128 varint per run of identical ticks:
+             run length << 4 | (move1 + 1) * 3 + (move2 + 1)
+
+Paddles sit still or hold a key for many ticks at a time, so a run of
+up to 7 ticks takes one byte and a run of up to 1023 two. The checksum
+of the final state lets a replay prove it ended where the match did.
+
+    python pong_record.py info match.pongrec
+    python pong_record.py check match.pongrec [...]     # re-simulate headless
+    python pong_record.py record match.pongrec [--left hard] [--right normal] [--seconds 60] [--seed N]
+"""
+import argparse
+import random
+import struct
+import sys
+import time
+import zlib
+
+import pong_ai
+import pong_sim
+
+MAGIC = b'PONGREC1'
+HEADER = struct.Struct('>8sQIHHI')  # magic, seed, ticks, score 1, score 2, final state CRC-32
+STATE = struct.Struct('>6dHHI')
+
+
+def reduce_seed(seed):
+    """The seed as stored in a recording (64 bits, unsigned); seed the game with this, not the raw value"""
+    return seed % 2 ** 64
+
+
+def state_digest(game):
+    """CRC-32 of everything that moves in a game, floats bit for bit"""
+    return zlib.crc32(STATE.pack(game.ball_x, game.ball_y, game.ball_vx, game.ball_vy, game.paddle1_y,
+                                 game.paddle2_y, game.score1 & 0xFFFF, game.score2 & 0xFFFF, game.ticks))
+
+
+class Recorder:
+    """Collects the moves of every tick as runs"""
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.runs = []  # [combined move, ticks]
+
+    def record(self, move1, move2):
+        combined = (move1 + 1) * 3 + move2 + 1
+        if self.runs and self.runs[-1][0] == combined:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([combined, 1])
+
+    @property
+    def ticks(self):
+        return sum(length for _, length in self.runs)
+
+    def encode(self, game):
+        """Bytes of the recording, ending at game's current state"""
+        out = bytearray(HEADER.pack(MAGIC, self.seed, self.ticks, game.score1 & 0xFFFF, game.score2 & 0xFFFF,
+                                    state_digest(game)))
+        for combined, length in self.runs:
+            value = length << 4 | combined
+            while value >= 0x80:
+                out.append(value & 0x7F | 0x80)
+                value >>= 7
+            out.append(value)
+        return bytes(out)
+
+    def save(self, path, game):
+        with open(path, 'wb') as f:
+            f.write(self.encode(game))
+
+
+class Recording:
+    def __init__(self, data):
+        if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a Pong recording')
+        _, self.seed, self.ticks, self.score1, self.score2, self.digest = HEADER.unpack_from(data)
+        self.runs = []
+        value = shift = 0
+        for byte in data[HEADER.size:]:
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                self.runs.append((value & 0xF, value >> 4))
+                value = shift = 0
+        if shift or sum(length for _, length in self.runs) != self.ticks:
+            raise ValueError('Pong recording is truncated')
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def moves(self):
+        """(move1, move2) for every tick, in order"""
+        for combined, length in self.runs:
+            move = (combined // 3 - 1, combined % 3 - 1)
+            for _ in range(length):
+                yield move
+
+    def new_game(self):
+        return pong_sim.Pong(random.Random(self.seed))
+
+
+def replay(recording):
+    """Re-simulate a recording as fast as possible; returns (game, True if it ended bit-exactly as recorded)"""
+    game = recording.new_game()
+    step = game.step
+    for move1, move2 in recording.moves():
+        step(move1, move2)
+    return game, state_digest(game) == recording.digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect, check or make Pong recordings')
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info', help='summarise a recording')
+    info.add_argument('recording')
+    check = commands.add_parser('check', help='replay recordings headless and compare their final states')
+    check.add_argument('recordings', nargs='+')
+    record = commands.add_parser('record', help='record a match between computer paddles')
+    record.add_argument('recording')
+    record.add_argument('--left', choices=pong_ai.LEVELS, default='hard')
+    record.add_argument('--right', choices=pong_ai.LEVELS, default='normal')
+    record.add_argument('--seconds', type=float, default=60)
+    record.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        recording = Recording.load(args.recording)
+        with open(args.recording, 'rb') as f:
+            size = len(f.read())
+        print(f'seed {recording.seed}, {recording.ticks} ticks ({recording.ticks / pong_sim.TICK_RATE:.1f}s), '
+              f'score {recording.score1}-{recording.score2}, {len(recording.runs)} runs in {size} bytes')
+        return 0
+
+    if args.command == 'record':
+        seed = reduce_seed(args.seed) if args.seed is not None else random.randrange(2 ** 32)
+        game = pong_sim.Pong(random.Random(seed))
+        left, right = pong_ai.PaddleAI(1, args.left), pong_ai.PaddleAI(2, args.right)
+        recorder = Recorder(seed)
+        for _ in range(round(args.seconds * pong_sim.TICK_RATE)):
+            move1, move2 = left.move(game), right.move(game)
+            recorder.record(move1, move2)
+            game.step(move1, move2)
+        recorder.save(args.recording, game)
+        print(f'seed {seed}: {game.ticks} ticks, score {game.score1}-{game.score2}')
+        return 0
+
+    failed = 0
+    for path in args.recordings:
+        recording = Recording.load(path)
+        started = time.perf_counter()
+        game, exact = replay(recording)
+        elapsed = time.perf_counter() - started
+        failed += not exact
+        print(f'{path}: {"ok" if exact else "DIFFERS"}, score {game.score1}-{game.score2}, '
+              f'{recording.ticks} ticks in {elapsed:.2f}s ({recording.ticks / max(elapsed, 1e-9):.0f} ticks/s)')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
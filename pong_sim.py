@@ -0,0 +1,130 @@
+"""Pong rules as a fixed-timestep simulation, separate from input and rendering.
+
+The game advances in ticks of DT seconds whatever the frame rate: the
+window (ping_pong.py) runs as many ticks as real time calls for between
+frames and draws whatever state results, so a slow or fast display
+changes nothing about play. Positions and speeds are floats, in pixels
+and pixels per second.
+
+Within a tick the ball is swept along its path: the first wall or paddle
+face it would reach is found in closed form, the ball bounces there and
+the rest of the tick continues from that point. A fast ball therefore
+cannot pass through a 15 px paddle between two ticks.
+"""
+import random
+
+WIDTH = 800
+HEIGHT = 600
+PADDLE_WIDTH = 15
+PADDLE_HEIGHT = 100
+PADDLE_MARGIN = 50
+BALL_SIZE = 15
+
+TICK_RATE = 120
+DT = 1 / TICK_RATE
+# The original game moved 7 and 5 pixels per frame at 60 FPS
+PADDLE_SPEED = 7 * 60
+BALL_SPEED = 5 * 60
+SPEEDUP = 1.05  # the ball gets faster after every point
+
+# Paddle faces the ball can hit
+LEFT_FACE = PADDLE_MARGIN + PADDLE_WIDTH
+RIGHT_FACE = WIDTH - PADDLE_MARGIN - PADDLE_WIDTH
+# Bounces handled within one tick before the rest of it is dropped
+MAX_BOUNCES = 4
+
+
+class Pong:
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else random.Random()
+        self.paddle1_y = self.paddle2_y = (HEIGHT - PADDLE_HEIGHT) / 2
+        self.score1 = self.score2 = 0
+        self.ticks = 0
+        self.ball_vx = BALL_SPEED * self.rng.choice((-1, 1))
+        self.ball_vy = BALL_SPEED * self.rng.choice((-1, 1))
+        self.center_ball()
+
+    def center_ball(self):
+        self.ball_x = (WIDTH - BALL_SIZE) / 2
+        self.ball_y = (HEIGHT - BALL_SIZE) / 2
+
+    def reset_ball(self):
+        """Back to the centre after a point, faster and in a random direction"""
+        self.center_ball()
+        self.ball_vx *= self.rng.choice((-1, 1)) * SPEEDUP
+        self.ball_vy *= self.rng.choice((-1, 1)) * SPEEDUP
+
+    def positions(self):
+        """(ball x, ball y, paddle 1 y, paddle 2 y), what a frame needs to draw"""
+        return self.ball_x, self.ball_y, self.paddle1_y, self.paddle2_y
+
+    def step(self, move1=0, move2=0):
+        """Advance one tick; move1/move2 are -1 (up), 0 or 1 (down) for each paddle
+
+        Returns 1 or 2 if that player scored during the tick, else 0.
+        """
+        self.ticks += 1
+        self.paddle1_y = move_paddle(self.paddle1_y, move1)
+        self.paddle2_y = move_paddle(self.paddle2_y, move2)
+        self._push_out()
+        self._sweep()
+
+        if self.ball_x <= 0:
+            self.score2 += 1
+            self.reset_ball()
+            return 2
+        if self.ball_x + BALL_SIZE >= WIDTH:
+            self.score1 += 1
+            self.reset_ball()
+            return 1
+        return 0
+
+    def _beside(self, paddle_y, ball_y):
+        return paddle_y - BALL_SIZE < ball_y < paddle_y + PADDLE_HEIGHT
+
+    def _push_out(self):
+        # A paddle that moved onto the ball sends it back, like a hit on its face
+        if self.ball_vx < 0 and PADDLE_MARGIN - BALL_SIZE < self.ball_x < LEFT_FACE \
+                and self._beside(self.paddle1_y, self.ball_y):
+            self.ball_x, self.ball_vx = LEFT_FACE, -self.ball_vx
+        elif self.ball_vx > 0 and RIGHT_FACE - BALL_SIZE < self.ball_x < RIGHT_FACE + PADDLE_WIDTH \
+                and self._beside(self.paddle2_y, self.ball_y):
+            self.ball_x, self.ball_vx = RIGHT_FACE - BALL_SIZE, -self.ball_vx
+
+    def _sweep(self):
+        remaining = DT
+        for _ in range(MAX_BOUNCES):
+            dx, dy = self.ball_vx * remaining, self.ball_vy * remaining
+            # Fraction of this move at which the ball first touches something
+            hit, surface = 1.0, None
+            if dy < 0:
+                hit, surface = _earliest(hit, surface, -self.ball_y / dy, 'wall')
+            elif dy > 0:
+                hit, surface = _earliest(hit, surface, (HEIGHT - BALL_SIZE - self.ball_y) / dy, 'wall')
+            if dx < 0 and self.ball_x >= LEFT_FACE:
+                t = (LEFT_FACE - self.ball_x) / dx
+                if t < hit and self._beside(self.paddle1_y, self.ball_y + dy * t):
+                    hit, surface = t, 'paddle'
+            elif dx > 0 and self.ball_x + BALL_SIZE <= RIGHT_FACE:
+                t = (RIGHT_FACE - BALL_SIZE - self.ball_x) / dx
+                if t < hit and self._beside(self.paddle2_y, self.ball_y + dy * t):
+                    hit, surface = t, 'paddle'
+
+            self.ball_x += dx * hit
+            self.ball_y += dy * hit
+            if surface is None:
+                return
+            if surface == 'wall':
+                self.ball_vy = -self.ball_vy
+            else:
+                self.ball_vx = -self.ball_vx
+            remaining *= 1 - hit
+
+
+def move_paddle(paddle_y, move):
+    """Where a paddle at paddle_y ends up after one tick of move (-1, 0 or 1)"""
+    return min(max(paddle_y + move * PADDLE_SPEED * DT, 0), HEIGHT - PADDLE_HEIGHT)
+
+
+def _earliest(hit, surface, t, name):
+    return (max(t, 0.0), name) if t < hit else (hit, surface)
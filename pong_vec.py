@@ -0,0 +1,233 @@
+"""Many games of Pong at once, headless, stepped together with NumPy.
+
+VecPong holds N games as arrays (ball position and velocity, paddle
+positions, scores, ticks) and advances all of them one tick per step()
+with the rules of pong_sim: the same tick length, speeds, swept bounces
+off walls and paddle faces and push-out by a moving paddle. It is meant
+for training and evaluating paddle controllers, so it follows the usual
+vectorised-environment shape:
+
+    env = VecPong(4096, seed=1)
+    observations = env.reset()
+    observations, rewards, terminated, truncated, info = env.step(actions)
+
+actions is an (N, 2) array of moves, -1 (up), 0 or 1 (down), for the left
+and right paddles. Observations are (N, 6) float32 rows of ball x, ball y,
+ball x speed, ball y speed, left paddle y and right paddle y, in pixels
+and pixels per second. rewards is (N, 2): +1 to the player who scored in
+the tick, -1 to the other. A game terminates when a player reaches
+`points` and is truncated after `max_ticks`; either way it is reset
+straight away and its final scores are left in info, as vector
+environments do. render() draws one chosen game in a window.
+
+    python pong_vec.py [--games N] [--steps S]   # time random play
+    python pong_vec.py --watch [--game I]         # watch one game of tracking paddles
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from pong_sim import (BALL_SIZE, BALL_SPEED, DT, HEIGHT, LEFT_FACE, MAX_BOUNCES, PADDLE_HEIGHT, PADDLE_MARGIN,
+                      PADDLE_SPEED, PADDLE_WIDTH, RIGHT_FACE, SPEEDUP, TICK_RATE, WIDTH)
+
+OBSERVATION_SIZE = 6
+
+
+class VecPong:
+    def __init__(self, games, seed=None, points=11, max_ticks=None):
+        self.games = games
+        self.points = points
+        self.max_ticks = max_ticks
+        self.rng = np.random.default_rng(seed)
+        self.ball_x = np.empty(games)
+        self.ball_y = np.empty(games)
+        self.ball_vx = np.empty(games)
+        self.ball_vy = np.empty(games)
+        self.paddle1_y = np.empty(games)
+        self.paddle2_y = np.empty(games)
+        self.score1 = np.zeros(games, dtype=np.int32)
+        self.score2 = np.zeros(games, dtype=np.int32)
+        self.ticks = np.zeros(games, dtype=np.int64)
+        self.screen = None
+        self.reset()
+
+    def _signs(self, count):
+        return self.rng.integers(0, 2, count) * 2 - 1.0
+
+    def reset(self, games=None):
+        """Start the given games (a mask or indices; all by default) afresh; returns all observations"""
+        games = np.arange(self.games) if games is None else games
+        count = len(self.ball_x[games])
+        self.paddle1_y[games] = self.paddle2_y[games] = (HEIGHT - PADDLE_HEIGHT) / 2
+        self.score1[games] = self.score2[games] = 0
+        self.ticks[games] = 0
+        self.ball_vx[games] = BALL_SPEED * self._signs(count)
+        self.ball_vy[games] = BALL_SPEED * self._signs(count)
+        self.ball_x[games] = (WIDTH - BALL_SIZE) / 2
+        self.ball_y[games] = (HEIGHT - BALL_SIZE) / 2
+        return self.observations()
+
+    def observations(self):
+        return np.stack((self.ball_x, self.ball_y, self.ball_vx, self.ball_vy, self.paddle1_y, self.paddle2_y),
+                        axis=1).astype(np.float32)
+
+    def step(self, actions):
+        """Advance every game one tick; returns (observations, rewards, terminated, truncated, info)"""
+        actions = np.clip(np.asarray(actions), -1, 1)
+        top = HEIGHT - PADDLE_HEIGHT
+        self.ticks += 1
+        np.clip(self.paddle1_y + actions[:, 0] * (PADDLE_SPEED * DT), 0, top, out=self.paddle1_y)
+        np.clip(self.paddle2_y + actions[:, 1] * (PADDLE_SPEED * DT), 0, top, out=self.paddle2_y)
+        self._push_out()
+        self._sweep()
+
+        scored2 = self.ball_x <= 0
+        scored1 = ~scored2 & (self.ball_x + BALL_SIZE >= WIDTH)
+        self.score1 += scored1
+        self.score2 += scored2
+        rewards = np.zeros((self.games, 2), dtype=np.float32)
+        rewards[:, 0] = scored1.astype(np.float32) - scored2
+        rewards[:, 1] = -rewards[:, 0]
+        scored = scored1 | scored2
+        if scored.any():
+            self._reset_balls(scored)
+
+        terminated = (self.score1 >= self.points) | (self.score2 >= self.points)
+        truncated = ~terminated & (self.ticks >= self.max_ticks) if self.max_ticks else np.zeros(self.games, bool)
+        info = {}
+        done = terminated | truncated
+        if done.any():
+            info = {'final_score1': self.score1[done], 'final_score2': self.score2[done],
+                    'final_ticks': self.ticks[done]}
+            self.reset(done)
+        return self.observations(), rewards, terminated, truncated, info
+
+    def _reset_balls(self, games):
+        """Back to the centre after a point, faster and in a random direction"""
+        count = int(games.sum())
+        self.ball_x[games] = (WIDTH - BALL_SIZE) / 2
+        self.ball_y[games] = (HEIGHT - BALL_SIZE) / 2
+        self.ball_vx[games] *= self._signs(count) * SPEEDUP
+        self.ball_vy[games] *= self._signs(count) * SPEEDUP
+
+    @staticmethod
+    def _beside(paddle_y, ball_y):
+        return (paddle_y - BALL_SIZE < ball_y) & (ball_y < paddle_y + PADDLE_HEIGHT)
+
+    def _push_out(self):
+        # A paddle that moved onto the ball sends it back, like a hit on its face
+        x, y = self.ball_x, self.ball_y
+        left = ((self.ball_vx < 0) & (PADDLE_MARGIN - BALL_SIZE < x) & (x < LEFT_FACE)
+                & self._beside(self.paddle1_y, y))
+        right = (~left & (self.ball_vx > 0) & (RIGHT_FACE - BALL_SIZE < x) & (x < RIGHT_FACE + PADDLE_WIDTH)
+                 & self._beside(self.paddle2_y, y))
+        self.ball_x[left] = LEFT_FACE
+        self.ball_x[right] = RIGHT_FACE - BALL_SIZE
+        np.negative(self.ball_vx, out=self.ball_vx, where=left | right)
+
+    def _sweep(self):
+        # pong_sim's sweep for every game at once; games that have finished
+        # their tick drop out of `moving`
+        remaining = np.full(self.games, DT)
+        moving = np.ones(self.games, bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for _ in range(MAX_BOUNCES):
+                x, y = self.ball_x, self.ball_y
+                dx, dy = self.ball_vx * remaining, self.ball_vy * remaining
+                # Fraction of this move at which the ball first touches something
+                wall_t = np.where(dy < 0, -y / dy, (HEIGHT - BALL_SIZE - y) / dy)
+                wall = (dy != 0) & (wall_t < 1)
+                hit = np.where(wall, np.maximum(wall_t, 0), 1.0)
+                left_t = (LEFT_FACE - x) / dx
+                left = ((dx < 0) & (x >= LEFT_FACE) & (left_t < hit)
+                        & self._beside(self.paddle1_y, y + dy * left_t))
+                right_t = (RIGHT_FACE - BALL_SIZE - x) / dx
+                right = ((dx > 0) & (x + BALL_SIZE <= RIGHT_FACE) & (right_t < hit)
+                         & self._beside(self.paddle2_y, y + dy * right_t))
+                paddle = (left | right) & moving
+                hit = np.where(left, left_t, np.where(right, right_t, hit))
+                wall &= moving & ~paddle
+
+                hit = np.where(moving, hit, 0.0)
+                self.ball_x += dx * hit
+                self.ball_y += dy * hit
+                np.negative(self.ball_vy, out=self.ball_vy, where=wall)
+                np.negative(self.ball_vx, out=self.ball_vx, where=paddle)
+                moving = wall | paddle
+                if not moving.any():
+                    return
+                remaining *= 1 - hit
+
+    def render(self, game=0):
+        """Draw one game in a window, opening it on first use"""
+        import pygame
+        if self.screen is None:
+            pygame.init()
+            self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+            pygame.display.set_caption(f'Pong {game} of {self.games}')
+        pygame.event.pump()
+        self.screen.fill((0, 0, 0))
+        white = (255, 255, 255)
+        pygame.draw.rect(self.screen, white, (PADDLE_MARGIN, round(self.paddle1_y[game]), PADDLE_WIDTH, PADDLE_HEIGHT))
+        pygame.draw.rect(self.screen, white, (RIGHT_FACE, round(self.paddle2_y[game]), PADDLE_WIDTH, PADDLE_HEIGHT))
+        pygame.draw.ellipse(self.screen, white, (round(self.ball_x[game]), round(self.ball_y[game]),
+                                                 BALL_SIZE, BALL_SIZE))
+        pygame.draw.aaline(self.screen, white, (WIDTH // 2, 0), (WIDTH // 2, HEIGHT))
+        pygame.display.flip()
+
+    def close(self):
+        if self.screen is not None:
+            import pygame
+            pygame.quit()
+            self.screen = None
+
+
+def track(observations):
+    """Actions that move each paddle towards the ball's height"""
+    target = observations[:, 1:2] + (BALL_SIZE - PADDLE_HEIGHT) / 2
+    return np.sign(target - observations[:, 4:6]).astype(np.int8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time many headless Pong games, or watch one')
+    parser.add_argument('--games', type=int, default=4096, help='games stepped together (default 4096)')
+    parser.add_argument('--steps', type=int, default=2000, help='ticks to run (default 2000)')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--watch', action='store_true', help='draw one game, at real speed, with tracking paddles')
+    parser.add_argument('--game', type=int, default=0, help='game to draw with --watch')
+    args = parser.parse_args()
+
+    env = VecPong(args.games, seed=args.seed)
+    observations = env.reset()
+    if args.watch:
+        import pygame
+        clock = pygame.time.Clock()
+        running = True
+        try:
+            while running:
+                observations, *_ = env.step(track(observations))
+                env.render(args.game)
+                running = not pygame.event.get(pygame.QUIT)
+                clock.tick(TICK_RATE)
+        finally:
+            env.close()
+        return 0
+
+    rng = np.random.default_rng(args.seed)
+    actions = rng.integers(-1, 2, (args.steps, args.games, 2), dtype=np.int8)
+    points = finished = 0
+    started = time.perf_counter()
+    for step in range(args.steps):
+        observations, rewards, terminated, truncated, info = env.step(actions[step])
+        points += int(np.count_nonzero(rewards[:, 0]))
+        finished += int(np.count_nonzero(terminated | truncated))
+    elapsed = time.perf_counter() - started
+    print(f'{args.games} games x {args.steps} ticks in {elapsed:.2f}s: '
+          f'{args.games * args.steps / elapsed / 1e6:.2f}M game ticks/s, {points} points, {finished} games finished')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
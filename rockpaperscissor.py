@@ -2,6 +2,8 @@ import pygame
 import sys
 import random
 
+import text_cache
+
 pygame.init()
 WIDTH, HEIGHT = 600, 400
 WIN = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -41,20 +43,20 @@ def draw_screen():
     
     for rect, text in BUTTONS:
         pygame.draw.rect(WIN, GRAY, rect)
-        txt = FONT.render(text, True, BLACK)
+        txt = text_cache.render(FONT, text, BLACK)
         txt_rect = txt.get_rect(center=rect.center)
         WIN.blit(txt, txt_rect)
 
     if player_choice:
-        p_txt = BIG_FONT.render(f"Player: {player_choice}", True, BLUE)
+        p_txt = text_cache.render(BIG_FONT, f"Player: {player_choice}", BLUE)
         WIN.blit(p_txt, (50, 50))
     if computer_choice:
-        c_txt = BIG_FONT.render(f"Computer: {computer_choice}", True, RED)
+        c_txt = text_cache.render(BIG_FONT, f"Computer: {computer_choice}", RED)
         WIN.blit(c_txt, (50, 120))
     
     # Display result
     if result:
-        r_txt = BIG_FONT.render(result, True, GREEN)
+        r_txt = text_cache.render(BIG_FONT, result, GREEN)
         WIN.blit(r_txt, (50, 200))
     
     pygame.display.update()
@@ -3,6 +3,8 @@ import numpy as np
 import random
 import sys
 
+import text_cache
+
 # --- Initialize pygame ---
 pygame.init()
 
@@ -89,7 +91,7 @@ def draw_grid():
 
 def draw_ui():
     ui_y = HEIGHT + 20
-    text = font.render(f"Score: {score}   Health: {health}   Moves: {moves}", True, TEXT_COLOR)
+    text = text_cache.render(font, f"Score: {score}   Health: {health}   Moves: {moves}", TEXT_COLOR)
     screen.blit(text, (20, ui_y))
 
 def move_player(dx, dy):
@@ -137,10 +139,10 @@ def move_player(dx, dy):
 
 def show_game_over():
     screen.fill(BLACK)
-    over_text = font.render("GAME OVER ", True, (255, 80, 80))
-    score_text = font.render(f"Final Score: {score}", True, TEXT_COLOR)
-    moves_text = font.render(f"Total Moves: {moves}", True, TEXT_COLOR)
-    tip_text = font.render("Press any key to exit", True, TEXT_COLOR)
+    over_text = text_cache.render(font, "GAME OVER ", (255, 80, 80))
+    score_text = text_cache.render(font, f"Final Score: {score}", TEXT_COLOR)
+    moves_text = text_cache.render(font, f"Total Moves: {moves}", TEXT_COLOR)
+    tip_text = text_cache.render(font, "Press any key to exit", TEXT_COLOR)
 
     screen.blit(over_text, (WIDTH // 2 - 100, HEIGHT // 2 - 70))
     screen.blit(score_text, (WIDTH // 2 - 100, HEIGHT // 2 - 30))
@@ -0,0 +1,52 @@
+import random
+
+import chess_pgn
+from chess_position import Position
+
+
+def _random_game(rng, plies):
+    position = Position()
+    moves = []
+    for _ in range(plies):
+        legal = position.legal_moves()
+        if not legal:
+            break
+        move = rng.choice(legal)
+        moves.append(move)
+        position.make_move(*move)
+    return moves, position.to_fen()
+
+
+def test_write_read_round_trip(tmp_path):
+    rng = random.Random(1)
+    games = [_random_game(rng, rng.randint(1, 120)) for _ in range(30)]
+    path = tmp_path / 'games.pgn'
+    path.write_text(''.join(chess_pgn.write_pgn(moves) for moves, _ in games))
+
+    position = Position()
+    read = list(chess_pgn.read_games(str(path)))
+    assert len(read) == len(games)
+    for (headers, movetext), (moves, fen) in zip(read, games):
+        assert chess_pgn.replay(position, headers, movetext) == len(moves)
+        assert position.to_fen() == fen
+
+
+def test_tag_values_are_escaped(tmp_path):
+    tags = {'White': 'Ann "The Rook" O\\Neil', 'Black': 'back\\slash\\', 'Event': '"quoted"'}
+    path = tmp_path / 'tags.pgn'
+    path.write_text(chess_pgn.write_pgn([((4, 6), (4, 4), None)], headers=tags))
+
+    (headers, movetext), = chess_pgn.read_games(str(path))
+    for name, value in tags.items():
+        assert headers[name] == value
+    assert list(chess_pgn.san_tokens(movetext)) == ['e4']
+
+
+def test_brackets_in_comments_are_not_tags(tmp_path):
+    path = tmp_path / 'comment.pgn'
+    path.write_text('[White "A"]\n\n1. e4 {a comment\n[Black "not a tag"] still the comment} e5 *\n\n'
+                    '[White "B"]\n\n1. d4 *\n')
+
+    games = list(chess_pgn.read_games(str(path)))
+    assert [headers for headers, _ in games] == [{'White': 'A'}, {'White': 'B'}]
+    assert list(chess_pgn.san_tokens(games[0][1])) == ['e4', 'e5']
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+import chess_record
+from chess_position import Position
+
+
+def _random_game(rng, plies):
+    position = Position()
+    moves, fens = [], [position.to_fen()]
+    for _ in range(plies):
+        legal = position.legal_moves()
+        if not legal:
+            break
+        move = rng.choice(legal)
+        moves.append(move)
+        position.make_move(*move)
+        fens.append(position.to_fen())
+    return moves, fens
+
+
+def test_position_at_every_ply(tmp_path):
+    rng = random.Random(2)
+    path = str(tmp_path / 'games.rec')
+    games = [_random_game(rng, plies) for plies in (0, 1, 7, 8, 9, 60)]
+    for moves, _ in games:
+        chess_record.append_game(path, moves, interval=8)
+
+    with chess_record.Archive(path) as archive:
+        assert len(archive) == len(games)
+        position = Position()
+        for record, (moves, fens) in zip(archive, games):
+            assert record.moves() == moves
+            for ply, fen in enumerate(fens):
+                assert record.position_at(ply, position).to_fen() == fen
+
+
+def test_truncated_record_ends_the_archive(tmp_path):
+    path = tmp_path / 'games.rec'
+    moves, _ = _random_game(random.Random(3), 20)
+    chess_record.append_game(str(path), moves)
+    chess_record.append_game(str(path), moves)
+    path.write_bytes(path.read_bytes()[:-5])
+
+    with chess_record.Archive(str(path)) as archive:
+        assert len(archive) == 1
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / 'games.rec'
+    path.write_bytes(b'[Event "?"]\n')
+    with pytest.raises(ValueError):
+        chess_record.Archive(str(path))
@@ -0,0 +1,45 @@
+import random
+
+import numpy as np
+
+import pong_sim
+import pong_vec
+
+
+def test_matches_pong_sim():
+    """Every game of a VecPong plays exactly as a pong_sim.Pong given the same moves and serves"""
+    games = 64
+    env = pong_vec.VecPong(games, seed=3, points=10 ** 9)
+    singles = []
+    for i in range(games):
+        game = pong_sim.Pong(random.Random(i))
+        game.ball_vx, game.ball_vy = float(env.ball_vx[i]), float(env.ball_vy[i])
+        singles.append(game)
+
+    rng = np.random.default_rng(5)
+    points = 0
+    for _ in range(3000):
+        actions = rng.integers(-1, 2, (games, 2))
+        env.step(actions)
+        for i, game in enumerate(singles):
+            if game.step(int(actions[i, 0]), int(actions[i, 1])):
+                # Serves are random, so take VecPong's
+                points += 1
+                game.ball_vx, game.ball_vy = float(env.ball_vx[i]), float(env.ball_vy[i])
+            assert (game.ball_x, game.ball_y, game.ball_vx, game.ball_vy) == (
+                env.ball_x[i], env.ball_y[i], env.ball_vx[i], env.ball_vy[i])
+            assert (game.paddle1_y, game.paddle2_y) == (env.paddle1_y[i], env.paddle2_y[i])
+            assert (game.score1, game.score2) == (env.score1[i], env.score2[i])
+    assert points > 0
+
+
+def test_finished_games_reset():
+    env = pong_vec.VecPong(8, seed=1, points=1)
+    finished = 0
+    for _ in range(5000):
+        _, rewards, terminated, truncated, info = env.step(np.zeros((8, 2), dtype=np.int8))
+        if terminated.any():
+            finished += int(terminated.sum())
+            assert (np.maximum(info['final_score1'], info['final_score2']) == 1).all()
+            assert (env.score1[terminated] == 0).all() and (env.score2[terminated] == 0).all()
+    assert finished > 0
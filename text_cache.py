@@ -0,0 +1,57 @@
+"""Rendered text surfaces, cached so unchanged labels are not re-rendered every frame.
+
+Font.render is one of the most expensive calls in a frame, and most UI
+text (status lines, scores, buttons, banners) is the same string frame
+after frame. TextCache keeps the surfaces keyed by font, text, colour and
+background, evicting the least recently used once it is full. Games share
+the module-level cache through render():
+
+    import text_cache
+    screen.blit(text_cache.render(font, f'Score: {score}', 'white'), (20, 20))
+
+Cached surfaces are shared, so callers must not draw on them.
+"""
+from collections import OrderedDict
+
+
+class TextCache:
+    def __init__(self, size=256):
+        self.size = size
+        self.surfaces = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def render(self, font, text, color, antialias=True, background=None):
+        """font.render(text, antialias, color, background), from the cache when possible"""
+        key = (font, text, antialias, color, background)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color, background)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.size:
+            self.surfaces.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def hit_rate(self):
+        renders = self.hits + self.misses
+        return self.hits / renders if renders else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.surfaces), 'hit_rate': self.hit_rate()}
+
+
+CACHE = TextCache()
+
+
+def render(font, text, color, antialias=True, background=None):
+    """Render through the shared cache"""
+    return CACHE.render(font, text, color, antialias, background)